@@ -0,0 +1 @@
+"""Local benchmarking tools (fake Gmail API server, sync throughput benchmark)"""
@@ -0,0 +1,388 @@
+"""
+Fake Gmail API Server
+Local stand-in for the Gmail REST API over a synthetic mailbox, with
+configurable latency and error injection
+
+Implements the endpoints the sync path uses: getProfile, messages.list,
+messages.get (full/metadata/minimal), messages.modify, attachments.get,
+history.list, watch and the multipart/mixed HTTP batch endpoint (/batch).
+
+Run standalone:
+    python -m app.benchmarks.fake_gmail_server --messages 1000 --latency-ms 20
+
+Point the backend at it with GMAIL_API_ROOT_URL=http://127.0.0.1:8765/
+"""
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+import uvicorn
+
+from app.utils.mime import b64url_encode, message_to_payload
+
+SENDERS = [
+    "lab@cityhospital.org", "radiology@cityhospital.org", "billing@cityhospital.org",
+    "claims@healthinsure.com", "dr.mehta@cityhospital.org", "appointments@cityhospital.org",
+    "admin@cityhospital.org", "pharmacy@cityhospital.org", "newsletter@medweekly.com",
+]
+
+SUBJECTS = [
+    ("Lab Results for patient {n}", "Blood test results attached. Hemoglobin 13.{d} g/dL, WBC normal."),
+    ("URGENT: Critical ECG finding - bed {n}", "STAT review needed for ECG showing ST elevation in Cardiology."),
+    ("Invoice INV-{n} payment due", "Amount due: $1,{d}50.00 for services at Radiology. Please pay by Friday."),
+    ("Insurance claim CLM-{n} update", "Your claim CLM-{n} has been approved for $2,{d}00."),
+    ("Appointment scheduled for patient {n}", "Follow-up appointment scheduled on Monday 10:{d}0 AM with Dr. Mehta."),
+    ("Prescription refill request {n}", "Patient requests refill of medication, dosage 5{d} mg."),
+    ("Hospital policy notice {n}", "New infection control policy announcement for all departments."),
+    ("Weekly newsletter #{n}", "FYI: this week's updates. No action required. Unsubscribe anytime."),
+]
+
+# Quoted reply and signature noise so the normalizer has work to do
+BODY_TAIL = "\n\nRegards,\nHospital Staff\n--\nCONFIDENTIALITY NOTICE: This e-mail is confidential.\n\nOn Mon, someone wrote:\n> earlier message\n> more quoted text\n"
+
+
+def make_pdf(text: str) -> bytes:
+    """Build a minimal one-page PDF containing ``text``"""
+    text = text.replace("(", "[").replace(")", "]")
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+class FakeMailbox:
+    """Synthetic mailbox stored as Gmail API message resources"""
+
+    def __init__(
+        self,
+        message_count: int = 1000,
+        seed: int = 7,
+        attachment_ratio: float = 0.05,
+        promotions_ratio: float = 0.15,
+        spam_ratio: float = 0.02,
+        history_retention: int = 100000
+    ):
+        self.random = random.Random(seed)
+        self.attachment_ratio = attachment_ratio
+        self.promotions_ratio = promotions_ratio
+        self.spam_ratio = spam_ratio
+        self.history_retention = history_retention
+        self.email_address = "benchmark@cityhospital.org"
+        self.messages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.attachments: Dict[Tuple[str, str], bytes] = {}
+        self.history: List[Tuple[int, str]] = []
+        self.history_id = 1000
+        self._lock = threading.Lock()
+        self.add_messages(message_count)
+
+    def _build_mime(self, n: int) -> EmailMessage:
+        subject, body = self.random.choice(SUBJECTS)
+        digit = self.random.randint(0, 9)
+        message = EmailMessage()
+        message["From"] = self.random.choice(SENDERS)
+        message["To"] = self.email_address
+        message["Subject"] = subject.format(n=n, d=digit)
+        message["Date"] = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S +0000")
+        text = body.format(n=n, d=digit) + BODY_TAIL
+        message.set_content(text)
+        message.add_alternative(f"<html><body><p>{body.format(n=n, d=digit)}</p></body></html>", subtype="html")
+        if self.random.random() < self.attachment_ratio:
+            message.add_attachment(
+                make_pdf(f"Lab Report {n} Hemoglobin 13.{digit} g/dL Cardiology"),
+                maintype="application", subtype="pdf", filename=f"report-{n}.pdf"
+            )
+        return message
+
+    def _store_attachment(self, message_id: str):
+        def store(part, data: bytes, part_number: int) -> str:
+            attachment_id = f"att-{message_id}-{part_number}"
+            self.attachments[(message_id, attachment_id)] = data
+            return attachment_id
+        return store
+
+    def add_messages(self, count: int) -> List[str]:
+        """Deliver ``count`` new messages (each gets a history record)"""
+        added = []
+        with self._lock:
+            for _ in range(count):
+                n = len(self.messages) + 1
+                message_id = f"{n:016x}"
+                mime = self._build_mime(n)
+                roll = self.random.random()
+                if roll < self.spam_ratio:
+                    labels = ["SPAM"]
+                elif roll < self.spam_ratio + self.promotions_ratio:
+                    labels = ["INBOX", "CATEGORY_PROMOTIONS"]
+                else:
+                    labels = ["INBOX", "UNREAD"] + (["IMPORTANT"] if "URGENT" in mime["Subject"] else [])
+                self.history_id += 1
+                raw = mime.as_bytes()
+                self.messages[message_id] = {
+                    "id": message_id,
+                    "threadId": message_id,
+                    "labelIds": labels,
+                    "snippet": mime.get_body(("plain",)).get_content()[:100].replace("\n", " "),
+                    "historyId": str(self.history_id),
+                    "internalDate": str(int(time.time() * 1000) - (count - len(added)) * 1000),
+                    "sizeEstimate": len(raw),
+                    "payload": message_to_payload(mime, self._store_attachment(message_id)),
+                }
+                self.history.append((self.history_id, message_id))
+                added.append(message_id)
+        return added
+
+    def render(self, message_id: str, format: str = "full", metadata_headers: Optional[List[str]] = None):
+        """A message resource in the requested format"""
+        message = self.messages[message_id]
+        if format == "full":
+            return message
+        result = {k: v for k, v in message.items() if k != "payload"}
+        if format == "metadata":
+            wanted = {h.lower() for h in metadata_headers or []}
+            headers = message["payload"]["headers"]
+            result["payload"] = {
+                "mimeType": message["payload"]["mimeType"],
+                "headers": [h for h in headers if not wanted or h["name"].lower() in wanted],
+            }
+        return result
+
+
+class FakeGmailServer:
+    """FastAPI app serving a FakeMailbox, with latency and error injection"""
+
+    def __init__(
+        self,
+        mailbox: FakeMailbox,
+        latency_ms: float = 0.0,
+        batch_item_latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 11
+    ):
+        self.mailbox = mailbox
+        self.latency_ms = latency_ms
+        self.batch_item_latency_ms = batch_item_latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.app = self._build_app()
+        self._server: Optional[uvicorn.Server] = None
+
+    # -- request handling -------------------------------------------------
+
+    def _injected_error(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        if self.error_rate and self.random.random() < self.error_rate:
+            if self.random.random() < 0.7:
+                return 429, {"error": {"code": 429, "message": "User-rate limit exceeded",
+                                       "errors": [{"reason": "rateLimitExceeded"}]}}
+            return 503, {"error": {"code": 503, "message": "Backend Error"}}
+        return None
+
+    @staticmethod
+    def _not_found(what: str) -> Tuple[int, Dict[str, Any]]:
+        return 404, {"error": {"code": 404, "message": f"{what} not found"}}
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]]) -> Tuple[int, Dict[str, Any]]:
+        """Route one (possibly batched) API request to the mailbox"""
+        error = self._injected_error()
+        if error:
+            self.calls["injected_errors"] += 1
+            return error
+
+        mailbox = self.mailbox
+        match = re.match(r"^/gmail/v1/users/[^/]+/(.*)$", path)
+        if not match:
+            return self._not_found(path)
+        route = match.group(1)
+
+        if route == "profile":
+            self.calls["getProfile"] += 1
+            return 200, {"emailAddress": mailbox.email_address, "messagesTotal": len(mailbox.messages),
+                         "historyId": str(mailbox.history_id)}
+
+        if route == "messages" and method == "GET":
+            self.calls["messages.list"] += 1
+            page_size = min(int(query.get("maxResults", ["100"])[0]), 500)
+            offset = int(query.get("pageToken", ["0"])[0] or 0)
+            ids = list(reversed(mailbox.messages))  # newest first, like Gmail
+            page = ids[offset:offset + page_size]
+            response = {"messages": [{"id": i, "threadId": i} for i in page], "resultSizeEstimate": len(ids)}
+            if offset + page_size < len(ids):
+                response["nextPageToken"] = str(offset + page_size)
+            return 200, response
+
+        attachment = re.match(r"^messages/([^/]+)/attachments/([^/]+)$", route)
+        if attachment:
+            self.calls["attachments.get"] += 1
+            data = mailbox.attachments.get((attachment.group(1), attachment.group(2)))
+            if data is None:
+                return self._not_found("Attachment")
+            return 200, {"size": len(data), "data": b64url_encode(data)}
+
+        modify = re.match(r"^messages/([^/]+)/modify$", route)
+        if modify:
+            self.calls["messages.modify"] += 1
+            message = mailbox.messages.get(modify.group(1))
+            if not message:
+                return self._not_found("Message")
+            message["labelIds"] = [label for label in message["labelIds"] if label != "UNREAD"]
+            return 200, mailbox.render(modify.group(1), "minimal")
+
+        get = re.match(r"^messages/([^/]+)$", route)
+        if get:
+            self.calls["messages.get"] += 1
+            if get.group(1) not in mailbox.messages:
+                return self._not_found("Message")
+            return 200, mailbox.render(
+                get.group(1), query.get("format", ["full"])[0], query.get("metadataHeaders")
+            )
+
+        if route == "history":
+            self.calls["history.list"] += 1
+            start = int(query.get("startHistoryId", ["0"])[0])
+            oldest = mailbox.history_id - mailbox.history_retention
+            if start < oldest:
+                return self._not_found("Requested entity was")
+            page_size = min(int(query.get("maxResults", ["100"])[0]), 500)
+            offset = int(query.get("pageToken", ["0"])[0] or 0)
+            records = [(h, m) for h, m in mailbox.history if h > start]
+            page = records[offset:offset + page_size]
+            response = {
+                "history": [
+                    {"id": str(h), "messagesAdded": [{"message": {
+                        "id": m, "threadId": m, "labelIds": mailbox.messages[m]["labelIds"]
+                    }}]}
+                    for h, m in page
+                ],
+                "historyId": str(mailbox.history_id),
+            }
+            if offset + page_size < len(records):
+                response["nextPageToken"] = str(offset + page_size)
+            return 200, response
+
+        if route in ("watch", "stop"):
+            self.calls[route] += 1
+            expiration = int((datetime.utcnow() + timedelta(days=7)).timestamp() * 1000)
+            return 200, {"historyId": str(mailbox.history_id), "expiration": str(expiration)} if route == "watch" else {}
+
+        return self._not_found(route)
+
+    def _handle_batch(self, content_type: str, body: bytes) -> Tuple[str, bytes, int]:
+        """Answer a multipart/mixed batch request part by part"""
+        envelope = BytesParser(policy=default_policy).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+        count = 0
+        for part in envelope.iter_parts():
+            count += 1
+            request_text = part.get_payload(decode=True).decode()
+            request_line = request_text.split("\n", 1)[0].strip()
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            status, payload = self.handle(method, url.path, parse_qs(url.query))
+            content_id = part["Content-ID"].strip()
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode(), count
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Gmail API")
+
+        @app.post("/batch")
+        @app.post("/batch/gmail/v1")
+        async def batch(request: Request):
+            body = await request.body()
+            content_type, response_body, count = self._handle_batch(request.headers["content-type"], body)
+            self.calls["batch"] += 1
+            self.calls["batch_sub_requests"] += count
+            await asyncio.sleep((self.latency_ms + self.batch_item_latency_ms * count) / 1000)
+            return Response(content=response_body, media_type=content_type)
+
+        @app.api_route("/gmail/v1/{path:path}", methods=["GET", "POST"])
+        async def api(request: Request, path: str):
+            await asyncio.sleep(self.latency_ms / 1000)
+            status, payload = self.handle(request.method, f"/gmail/v1/{path}", parse_qs(request.url.query))
+            headers = {"Retry-After": "1"} if status == 429 else None
+            return Response(content=json.dumps(payload), status_code=status,
+                            media_type="application/json", headers=headers)
+
+        return app
+
+    # -- lifecycle --------------------------------------------------------
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve on a background thread; returns the root URL to use as GMAIL_API_ROOT_URL"""
+        # Long keep-alive like Google's front ends, so pooled connections survive quota waits
+        config = uvicorn.Config(
+            self.app, host=host, port=port, log_level="warning", access_log=False, timeout_keep_alive=120
+        )
+        self._server = uvicorn.Server(config)
+        thread = threading.Thread(target=self._server.run, daemon=True)
+        thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        bound_port = self._server.servers[0].sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}/"
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Gmail API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--batch-item-latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--attachment-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = FakeGmailServer(
+        FakeMailbox(args.messages, attachment_ratio=args.attachment_ratio),
+        latency_ms=args.latency_ms,
+        batch_item_latency_ms=args.batch_item_latency_ms,
+        error_rate=args.error_rate
+    )
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="info", timeout_keep_alive=120)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Sync Throughput Benchmark
+Drive the full mailbox sync path against the local fake Gmail server and
+report messages/sec, API calls and per-stage latency percentiles
+
+Usage:
+    python -m app.benchmarks.sync_benchmark --messages 2000 --latency-ms 30
+    python -m app.benchmarks.sync_benchmark --error-rate 0.02 --incremental 50 --json
+
+Categorization runs in local (rule-based) mode and stored emails are not
+embedded into the vector index unless --with-index is given, so the numbers measure the Gmail and
+storage path rather than LLM or embedding latency.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Any
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.benchmarks.fake_gmail_server import FakeGmailServer, FakeMailbox
+
+
+async def _run_sync(db, user, days: int) -> Dict[str, Any]:
+    # Imported here so the settings overrides below are in place first
+    from app.services.email_sync import sync_user_mailbox
+    from app.utils.loop_monitor import loop_monitor
+
+    loop_monitor.reset()
+    loop_monitor.start()
+    started = time.perf_counter()
+    try:
+        stats = await sync_user_mailbox(user, db, days=days)
+    finally:
+        await loop_monitor.stop()
+    elapsed = time.perf_counter() - started
+    stored = stats["added"] + stats["metadata_only"]
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(stats["listed"] / elapsed, 1) if elapsed else 0.0,
+        "stored_per_second": round(stored / elapsed, 1) if elapsed else 0.0,
+        "sync": stats,
+        "event_loop": loop_monitor.snapshot(),
+    }
+
+
+def _simulate_categorize_latency(seconds: float):
+    """Stand in for LLM round-trips: the local categorizer plus a fixed wait per email"""
+    from app.services.ai_categorizer import EmailCategorizer
+
+    categorize_email = EmailCategorizer.categorize_email
+
+    async def slow_categorize_email(email_data, *args, **kwargs):
+        await asyncio.sleep(seconds)
+        return await categorize_email(email_data, *args, **kwargs)
+
+    EmailCategorizer.categorize_email = staticmethod(slow_categorize_email)
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Start the fake server, sync one synthetic mailbox and collect the results"""
+    server = FakeGmailServer(
+        FakeMailbox(args.messages, attachment_ratio=args.attachment_ratio),
+        latency_ms=args.latency_ms,
+        batch_item_latency_ms=args.batch_item_latency_ms,
+        error_rate=args.error_rate
+    )
+    settings.GMAIL_API_ROOT_URL = server.start_in_thread()
+    settings.CATEGORIZER_MODE = "local"
+    settings.SYNC_INDEX_EMAILS = args.with_index
+    settings.SYNC_TRIAGE_ORDERING = not args.no_triage_ordering
+    settings.ATTACHMENT_INGESTION_ENABLED = not args.skip_attachments
+    if args.quota_units_per_second:
+        settings.GMAIL_USER_QUOTA_UNITS_PER_SECOND = args.quota_units_per_second
+
+    from app.db.migrations import upgrade_database
+    from app.db.models import User
+    from app.services.attachment_processor import attachment_processor
+    from app.services.gmail_quota import gmail_quota
+    from app.services.gmail_service import gmail_discovery_document
+
+    gmail_discovery_document.cache_clear()
+    if args.categorize_latency_ms:
+        _simulate_categorize_latency(args.categorize_latency_ms / 1000)
+
+    db_path = None
+    database_url = args.database_url
+    if not database_url:
+        fd, db_path = tempfile.mkstemp(prefix="sync-benchmark-", suffix=".db")
+        os.close(fd)
+        database_url = f"sqlite:///{db_path}"
+    engine = create_engine(database_url)
+    upgrade_database(engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    try:
+        user = User(
+            email=f"benchmark-{int(time.time())}@cityhospital.org",
+            hashed_password="x",
+            gmail_access_token="fake-access-token",
+            gmail_refresh_token="fake-refresh-token",
+            gmail_token_expiry=datetime.utcnow() + timedelta(days=1)
+        )
+        db.add(user)
+        db.commit()
+
+        async def run_syncs():
+            # One event loop for both runs: cached clients hold loop-bound semaphores
+            results["full_sync"] = await _run_sync(db, user, args.days)
+            results["server_calls_full_sync"] = dict(server.calls)
+            if args.incremental:
+                server.calls.clear()
+                server.mailbox.add_messages(args.incremental)
+                results["incremental_sync"] = await _run_sync(db, user, args.days)
+                results["server_calls_incremental_sync"] = dict(server.calls)
+
+        results = {
+            "config": {
+                "messages": args.messages,
+                "latency_ms": args.latency_ms,
+                "batch_item_latency_ms": args.batch_item_latency_ms,
+                "error_rate": args.error_rate,
+                "categorize_latency_ms": args.categorize_latency_ms,
+                "triage_ordering": settings.SYNC_TRIAGE_ORDERING,
+                "gmail_batch_size": settings.GMAIL_BATCH_SIZE,
+                "gmail_max_concurrency": settings.GMAIL_MAX_CONCURRENCY,
+                "user_quota_units_per_second": settings.GMAIL_USER_QUOTA_UNITS_PER_SECOND,
+            },
+        }
+        asyncio.run(run_syncs())
+        results["gmail_quota"] = {k: v for k, v in gmail_quota.snapshot().items() if k != "users"}
+        return results
+    finally:
+        db.close()
+        engine.dispose()
+        attachment_processor.shutdown()
+        server.stop()
+        if db_path:
+            os.unlink(db_path)
+
+
+def _print_report(results: Dict[str, Any]):
+    print(f"Config: {results['config']}")
+    for phase in ("full_sync", "incremental_sync"):
+        if phase not in results:
+            continue
+        run = results[phase]
+        sync = run["sync"]
+        print(f"\n== {phase} ({sync['mode']}) ==")
+        print(
+            f"listed {sync['listed']}, added {sync['added']}, metadata-only {sync['metadata_only']}, "
+            f"skipped {sync['skipped']}, known {sync['known']} in {run['elapsed_seconds']}s"
+        )
+        print(f"throughput: {run['messages_per_second']} listed msgs/s, {run['stored_per_second']} stored msgs/s")
+        print(f"client API calls: {sync['api_calls']}, dropped: {sync['dropped']}")
+        first_high = sync['time_to_first_high_priority_seconds']
+        print(
+            f"high priority stored: {sync['high_priority']}, "
+            f"time to first: {'n/a' if first_high is None else f'{first_high}s'}"
+        )
+        print(f"server calls: {results['server_calls_' + phase]}")
+        print(f"event loop: {run['event_loop']}")
+        print(f"{'stage':<16}{'count':>7}{'total ms':>12}{'p50 ms':>10}{'p99 ms':>10}")
+        for stage, timing in run["sync"]["stage_ms"].items():
+            print(
+                f"{stage:<16}{timing['count']:>7}{timing['total_ms']:>12}"
+                f"{timing.get('p50', 0):>10}{timing.get('p99', 0):>10}"
+            )
+        print(f"{'pipeline stage':<16}{'workers':>8}{'items':>8}{'items/s':>10}{'util':>8}{'blocked s':>11}{'depth avg/max':>15}")
+        for stage, metrics in run["sync"]["pipeline"].items():
+            queue = metrics["queue"]
+            print(
+                f"{stage:<16}{metrics['workers']:>8}{metrics['items']:>8}{metrics['items_per_second']:>10}"
+                f"{metrics['utilization']:>8}{metrics['blocked_seconds']:>11}"
+                f"{str(queue['depth_avg']) + '/' + str(queue['depth_max']):>15}"
+            )
+    print(f"\nGmail quota: {results['gmail_quota']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mailbox sync against a local fake Gmail API")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages in the synthetic mailbox")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latency added to every HTTP request")
+    parser.add_argument("--batch-item-latency-ms", type=float, default=1.0, help="Extra latency per batched sub-request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 429/503")
+    parser.add_argument("--attachment-ratio", type=float, default=0.05, help="Fraction of messages with a PDF")
+    parser.add_argument("--skip-attachments", action="store_true", help="Disable attachment ingestion")
+    parser.add_argument("--quota-units-per-second", type=float, default=None, help="Override the per-user quota")
+    parser.add_argument("--incremental", type=int, default=0, help="Deliver N messages and run an incremental sync")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--with-index", action="store_true", help="Embed stored emails into the vector index")
+    parser.add_argument("--categorize-latency-ms", type=float, default=0.0, help="Simulated LLM latency per email")
+    parser.add_argument("--no-triage-ordering", action="store_true", help="Categorize in Gmail list order")
+    parser.add_argument("--database-url", default=None, help="Database to sync into (default: temporary SQLite)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        _print_report(results)
+
+
+if __name__ == "__main__":
+    main()
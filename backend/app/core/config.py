@@ -2,7 +2,7 @@
 Application Configuration Management
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import os
 
 
@@ -51,9 +51,126 @@ class Settings(BaseSettings):
     VECTOR_STORE_PATH: str = "./vector_store"
     
     # Email Processing
-    MAX_EMAILS_PER_FETCH: int = 100
+    MAX_EMAILS_PER_FETCH: int = 100  # message IDs per messages.list page
     EMAIL_BATCH_SIZE: int = 10
     
+    # Gmail API
+    GMAIL_LIST_PREFETCH_PAGES: int = 2  # listed pages buffered ahead of processing
+    GMAIL_BATCH_SIZE: int = 50  # sub-requests per HTTP batch call (capped at 50, Google's recommended maximum)
+    GMAIL_BATCH_MAX_RETRIES: int = 3
+    GMAIL_RETRY_BASE_DELAY: float = 1.0  # seconds
+    GMAIL_RETRY_MAX_DELAY: float = 32.0
+    GMAIL_MAX_RETRIES: int = 5  # retries for single (non-batch) requests
+    GMAIL_USER_QUOTA_UNITS_PER_SECOND: float = 250.0  # Gmail per-user limit
+    GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND: float = 20000.0  # 1,200,000 units per minute
+    GMAIL_QUOTA_BURST_SECONDS: float = 1.0  # bucket capacity in seconds of quota
+    KNOWN_ID_CHUNK_SIZE: int = 500  # gmail_ids per IN (...) de-duplication query
+    GMAIL_API_ROOT_URL: str = ""  # override (e.g. the local fake Gmail server); empty for Google
+    GMAIL_MAX_CONCURRENCY: int = 4  # in-flight Gmail requests per user
+    GMAIL_EXECUTOR_THREADS: int = 32  # shared worker threads for blocking Gmail calls
+    GMAIL_HTTP_TIMEOUT: float = 60.0  # seconds
+    GMAIL_CLIENT_CACHE_TTL: float = 1800.0  # seconds a per-user client is reused
+    GMAIL_CLIENT_CACHE_MAX_SIZE: int = 256
+    GMAIL_TOKEN_REFRESH_MARGIN: int = 300  # refresh this many seconds before expiry
+    
+    # Gmail Push Notifications
+    GMAIL_PUSH_ENABLED: bool = False
+    GMAIL_PUBSUB_TOPIC: str = ""  # projects/<project>/topics/<topic>
+    GMAIL_WEBHOOK_TOKEN: str = ""  # shared secret in the Pub/Sub push endpoint URL
+    PUSH_SYNC_DEBOUNCE_SECONDS: float = 2.0  # notifications within this window share one sync
+    GMAIL_WATCH_RENEW_INTERVAL: float = 6 * 3600.0  # seconds between watch renewal sweeps
+    GMAIL_WATCH_RENEW_MARGIN: float = 24 * 3600.0  # renew watches expiring within this window
+    
+    # Multi-account Sync Scheduler
+    SYNC_SCHEDULER_ENABLED: bool = False
+    SYNC_SCHEDULER_INTERVAL: float = 900.0  # seconds between syncs of one mailbox
+    SYNC_SCHEDULER_MAX_CONCURRENCY: int = 4  # syncs running at once across all users
+    SYNC_SCHEDULER_JITTER: float = 0.2  # +/- fraction applied to every delay
+    SYNC_SCHEDULER_BACKOFF_BASE: float = 60.0  # first retry delay after a failed sync
+    SYNC_SCHEDULER_BACKOFF_MAX: float = 3600.0
+    SYNC_SCHEDULER_USER_REFRESH_INTERVAL: float = 60.0  # seconds between scans for connected users
+    
+    # Sync Job Queue
+    SYNC_WORKER_IN_PROCESS: bool = True  # run the worker pool inside the API process; else `python -m app.services.sync_worker`
+    SYNC_WORKER_CONCURRENCY: int = 4  # jobs running at once per worker process
+    SYNC_WORKER_POLL_INTERVAL: float = 2.0  # seconds between queue polls when idle
+    SYNC_JOB_MAX_ATTEMPTS: int = 3
+    SYNC_JOB_RETRY_DELAY: float = 60.0  # first retry delay, doubled per attempt
+    SYNC_JOB_HEARTBEAT_INTERVAL: float = 15.0
+    SYNC_JOB_STALE_SECONDS: float = 120.0  # running jobs without a heartbeat this long are requeued
+    SYNC_JOB_PROGRESS_INTERVAL: float = 1.0  # seconds between progress writes to the job row
+    SYNC_EVENTS_POLL_INTERVAL: float = 1.0  # seconds between job reads by the progress stream
+    SYNC_JOB_WAIT_POLL_INTERVAL: float = 1.0  # seconds between job reads by scheduler/push syncs waiting on a job
+    SYNC_EVENTS_KEEPALIVE: float = 15.0  # seconds between keep-alive comments when nothing changed
+    SYNC_LEASE_TTL: float = 60.0  # lock-row leases expire this long after their last renewal (non-Postgres)
+    SYNC_LEASE_RETRY_DELAY: float = 10.0  # a job whose user is already syncing is retried after this long
+    
+    # Attachment Ingestion
+    ATTACHMENT_INGESTION_ENABLED: bool = True
+    ATTACHMENT_DOWNLOAD_CONCURRENCY: int = 4
+    ATTACHMENT_MAX_BYTES: int = 15 * 1024 * 1024  # larger attachments are not downloaded
+    ATTACHMENT_TEMP_DIR: Optional[str] = None  # system temp dir when unset
+    ATTACHMENT_PARSE_PROCESSES: int = 2
+    ATTACHMENT_PARSE_TIMEOUT: float = 30.0  # seconds per PDF
+    ATTACHMENT_PARSE_MEMORY_MB: int = 512  # address-space cap per parsing worker
+    ATTACHMENT_TEXT_MAX_CHARS: int = 20000
+    ATTACHMENT_SUMMARY_CHARS: int = 500
+    ATTACHMENT_PROMPT_MAX_TOKENS: int = 300  # attachment text in categorization/embedding input
+    
+    # Event Loop Monitoring
+    LOOP_MONITOR_INTERVAL: float = 0.05  # seconds between lag samples
+    LOOP_STALL_THRESHOLD: float = 0.25  # lag logged as a stall
+    
+    # Text Normalization (token budgets)
+    TOKENIZER_ENCODING: str = "cl100k_base"
+    NORMALIZED_MAX_TOKENS: int = 2000
+    CATEGORIZATION_MAX_TOKENS: int = 750
+    SUMMARIZATION_MAX_TOKENS: int = 1500
+    EMBEDDING_MAX_TOKENS: int = 512
+    EMBEDDING_CONCURRENCY: int = 4  # in-flight embedding calls when indexing new emails
+    
+    # Local Entity Extraction (spaCy)
+    SPACY_MODEL: str = "en_core_web_sm"
+    ENTITY_EXTRACTION_BATCH_SIZE: int = 64
+    ENTITY_EXTRACTION_PROCESSES: int = 2  # nlp.pipe workers for large synchronous batches; the API always uses 1
+    
+    # LLM Scheduling (shared OpenAI capacity)
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_INTERACTIVE_RESERVED: int = 4
+    LLM_BULK_RESERVED: int = 2
+    
+    # LLM Call Guard (deadlines, hedging, circuit breaker)
+    LLM_INTERACTIVE_TIMEOUT: float = 8.0  # seconds
+    LLM_BULK_TIMEOUT: float = 60.0
+    LLM_HEDGE_DEFAULT_DELAY: float = 2.0  # used until enough latency samples exist
+    LLM_HEDGE_MIN_DELAY: float = 0.25
+    LLM_BREAKER_ERROR_THRESHOLD: float = 0.5
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_WINDOW_SECONDS: float = 60.0
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    
+    # Categorization
+    CATEGORIZATION_CONCURRENCY: int = 8
+    CATEGORIZER_MODE: str = "openai"  # "openai" or "local" (rule-based, no API calls)
+    
+    # Ingest Pipeline
+    SYNC_INDEX_EMAILS: bool = True  # embed synced emails into the vector index as they are stored
+    INGEST_PAGE_QUEUE_SIZE: int = 4  # ID pages / fetched batches buffered between list, dedupe, fetch and normalize
+    INGEST_EMAIL_QUEUE_SIZE: int = 200  # emails buffered between normalize, categorize, persist and index
+    INGEST_FETCH_WORKERS: int = 2  # ID pages fetched from Gmail at once
+    SYNC_TRIAGE_ORDERING: bool = True  # categorize / store likely-urgent emails first (else Gmail list order)
+    TRIAGE_PRIORITY_DOMAINS: List[str] = []  # sender domains (labs, radiology, ...) categorized first during a sync
+    
+    # Mail Import
+    MAIL_IMPORT_BATCH_SIZE: int = 200  # messages per parse chunk, insert commit and checkpoint
+    MAIL_IMPORT_WORKERS: Optional[int] = None  # parsing processes (default: CPU count)
+    
+    # Background Jobs
+    JOB_CHECKPOINT_DIR: str = "./checkpoints"
+    RECATEGORIZE_BATCH_SIZE: int = 100
+    RECATEGORIZE_CONCURRENCY: int = 4
+    RECATEGORIZE_MAX_RATE: float = 5.0  # emails per second
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,93 @@
+"""
+Bulk Email Writes
+Batched INSERT ... ON CONFLICT (gmail_id) DO NOTHING for email records
+"""
+from typing import Dict, Any, List, Optional
+import logging
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import EmailRecord
+
+logger = logging.getLogger(__name__)
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING ... RETURNING
+CONFLICT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _insert_chunk(db: Session, rows: List[Dict[str, Any]]) -> List[str]:
+    """Insert rows in one statement, skipping gmail_ids that already exist; returns inserted gmail_ids"""
+    dialect_insert = CONFLICT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        # No ON CONFLICT support: insert one row at a time and treat integrity errors as duplicates
+        inserted = []
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(EmailRecord), [row])
+                inserted.append(row["gmail_id"])
+            except IntegrityError:
+                pass
+        return inserted
+
+    statement = dialect_insert(EmailRecord).values(rows).on_conflict_do_nothing(
+        index_elements=[EmailRecord.gmail_id]
+    ).returning(EmailRecord.gmail_id)
+    return [gmail_id for (gmail_id,) in db.execute(statement)]
+
+
+def insert_emails(
+    db: Session,
+    rows: List[Dict[str, Any]],
+    batch_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Insert email rows, skipping messages that are already stored
+
+    Rows are written as multi-row ``INSERT ... ON CONFLICT (gmail_id) DO
+    NOTHING`` statements and committed every ``batch_size`` rows, so stored
+    emails become visible during a long sync. A chunk that fails for another
+    reason is retried row by row, so one bad row doesn't lose its neighbours.
+
+    Args:
+        db: Database session
+        rows: Column dicts for EmailRecord (each with an ``id``)
+        batch_size: Rows per statement and commit (defaults to EMAIL_BATCH_SIZE)
+
+    Returns:
+        Dict with inserted, skipped (already stored) and failed counts, and
+        the set of inserted gmail_ids
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    result = {"inserted": 0, "skipped": 0, "failed": 0, "inserted_ids": set()}
+
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        try:
+            inserted = _insert_chunk(db, chunk)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Bulk insert of {len(chunk)} emails failed, retrying row by row: {str(getattr(e, 'orig', e))}")
+            inserted = []
+            for row in chunk:
+                try:
+                    inserted.extend(_insert_chunk(db, [row]))
+                    db.commit()
+                except SQLAlchemyError as row_error:
+                    db.rollback()
+                    result["failed"] += 1
+                    logger.error(f"Failed to store email {row.get('gmail_id')}: {str(getattr(row_error, 'orig', row_error))}")
+
+        result["inserted"] += len(inserted)
+        result["inserted_ids"].update(inserted)
+
+    result["skipped"] = len(rows) - result["inserted"] - result["failed"]
+    return result
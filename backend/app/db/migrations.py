@@ -0,0 +1,55 @@
+"""
+Database Migrations
+Bring the database schema up to date with Alembic
+
+Replaces Base.metadata.create_all: every schema change is a migration in
+backend/migrations/versions.
+"""
+from pathlib import Path
+from typing import Optional
+import logging
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.database import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# Revision matching the schema create_all produced before migrations were introduced
+BASELINE_REVISION = "0001"
+
+
+def alembic_config() -> Config:
+    """Alembic config that works from any working directory"""
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    return config
+
+
+def upgrade_database(engine: Optional[Engine] = None, revision: str = "head"):
+    """
+    Apply pending migrations
+
+    A database created by create_all before migrations existed has tables but
+    no alembic_version; it is stamped at the baseline revision and then
+    upgraded like any other, so later migrations add the columns and tables
+    create_all could not add to it.
+
+    Args:
+        engine: Database to migrate (defaults to the application engine)
+        revision: Target revision
+    """
+    engine = engine or default_engine
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = set(inspect(connection).get_table_names())
+        if tables and "alembic_version" not in tables:
+            logger.info(f"Adopting unversioned database; stamping revision {BASELINE_REVISION}")
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
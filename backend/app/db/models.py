@@ -1,5 +1,5 @@
 """Database Models"""
-from sqlalchemy import Column, String, DateTime, Text, JSON, Integer, Boolean, Float
+from sqlalchemy import Column, String, DateTime, Text, JSON, Integer, Boolean, Float, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 import uuid
@@ -33,6 +33,11 @@ class EmailRecord(Base):
     summary = Column(Text)
     content = Column(Text)
     
+    # Normalized body shared by categorizer, summarizer and embedder
+    normalized_content = Column(Text)
+    raw_token_count = Column(Integer)
+    normalized_token_count = Column(Integer)
+    
     # Extracted entities (JSON)
     entities = Column(JSON)  # {patient_name, doctor, department, amount, etc.}
     
@@ -45,6 +50,7 @@ class EmailRecord(Base):
     
     # Confidence scores
     confidence_score = Column(Float)  # AI categorization confidence
+    categorizer_version = Column(String, index=True)  # EmailCategorizer.PROMPT_VERSION used
     
     # Timestamps
     created_at = Column(DateTime, server_default=func.now())
@@ -52,6 +58,27 @@ class EmailRecord(Base):
     
     # Soft delete
     is_deleted = Column(Boolean, default=False)
+    
+    # Partial indexes over live (not soft-deleted) emails: list and analytics queries
+    # filter is_deleted == False, then sort by timestamp or group by a column
+    __table_args__ = (
+        Index(
+            "ix_emails_live_timestamp", timestamp.desc(),
+            postgresql_where=~is_deleted, sqlite_where=is_deleted == False
+        ),
+        Index(
+            "ix_emails_live_category_timestamp", category, timestamp,
+            postgresql_where=~is_deleted, sqlite_where=is_deleted == False
+        ),
+        Index(
+            "ix_emails_live_priority_timestamp", priority, timestamp,
+            postgresql_where=~is_deleted, sqlite_where=is_deleted == False
+        ),
+        Index(
+            "ix_emails_live_sender", sender,
+            postgresql_where=~is_deleted, sqlite_where=is_deleted == False
+        ),
+    )
 
 
 class User(Base):
@@ -67,6 +94,9 @@ class User(Base):
     gmail_access_token = Column(Text)
     gmail_refresh_token = Column(Text)
     gmail_token_expiry = Column(DateTime)
+    gmail_history_id = Column(String)  # historyId reached by the last successful sync
+    gmail_address = Column(String, index=True)  # mailbox address reported by Gmail (push notifications)
+    gmail_watch_expiration = Column(DateTime)  # when the users.watch registration lapses
     
     # User status
     is_active = Column(Boolean, default=True)
@@ -77,6 +107,50 @@ class User(Base):
     last_login = Column(DateTime)
 
 
+class SyncJob(Base):
+    """Queued or running mailbox sync, processed by the sync worker pool"""
+    __tablename__ = "sync_jobs"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, index=True, nullable=False)
+    status = Column(String, index=True, nullable=False, default="queued")  # queued, running, succeeded, failed
+    source = Column(String, default="manual")  # manual, push, scheduler
+    days = Column(Integer, default=7)
+    
+    # Execution
+    attempts = Column(Integer, default=0)
+    run_after = Column(DateTime, index=True)  # not picked up before this time (retry backoff)
+    worker_id = Column(String)
+    heartbeat_at = Column(DateTime)
+    error = Column(Text)
+    progress = Column(JSON)  # live per-stage counts while running (IngestPipeline.progress)
+    stats = Column(JSON)  # sync_user_mailbox statistics
+    
+    # Timestamps
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        # At most one queued or running job per user; concurrent enqueues attach to it
+        Index(
+            "uq_sync_jobs_active_user", "user_id", unique=True,
+            postgresql_where=status.in_(("queued", "running")),
+            sqlite_where=status.in_(("queued", "running"))
+        ),
+    )
+
+
+class SyncLease(Base):
+    """Per-user sync lock row with expiry (databases without advisory locks)"""
+    __tablename__ = "sync_leases"
+    
+    user_id = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
 class QueryHistory(Base):
     """Store user query history for analytics"""
     __tablename__ = "query_history"
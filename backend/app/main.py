@@ -8,9 +8,14 @@ from contextlib import asynccontextmanager
 import logging
 import os
 
-from app.db.database import engine, Base
-from app.routes import email_routes, query_routes, analytics_routes, auth_routes
+from app.db.migrations import upgrade_database
+from app.routes import email_routes, query_routes, analytics_routes, auth_routes, metrics_routes
 from app.core.config import settings
+from app.utils.loop_monitor import loop_monitor
+from app.services.attachment_processor import attachment_processor
+from app.services.push_sync import push_sync
+from app.services.sync_scheduler import sync_scheduler
+from app.services.sync_worker import sync_worker_pool
 
 # Import middleware
 from app.middleware.rate_limit import RateLimitMiddleware
@@ -29,11 +34,23 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting MedMail Intelligence Platform")
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created")
+    upgrade_database()
+    logger.info("Database schema up to date")
+    loop_monitor.start()
+    if settings.GMAIL_PUSH_ENABLED:
+        push_sync.start()
+    if settings.SYNC_SCHEDULER_ENABLED:
+        sync_scheduler.start()
+    if settings.SYNC_WORKER_IN_PROCESS:
+        sync_worker_pool.start()
     yield
     # Shutdown
     logger.info("Shutting down MedMail Intelligence Platform")
+    await loop_monitor.stop()
+    await push_sync.stop()
+    await sync_scheduler.stop()
+    await sync_worker_pool.stop()
+    attachment_processor.shutdown()
 
 
 # Initialize FastAPI app
@@ -94,6 +111,7 @@ for route in auth_routes.router.routes:
 app.include_router(email_routes.router, prefix="/api/emails", tags=["Emails"])
 app.include_router(analytics_routes.router, prefix="/api/analytics", tags=["Analytics"])
 app.include_router(query_routes.router, prefix="/api/query", tags=["AI Query"])
+app.include_router(metrics_routes.router, prefix="/api/metrics", tags=["Metrics"])
 
 # Log all registered routes
 logger.info(f"🚀 Total routes in app: {len(app.routes)}")
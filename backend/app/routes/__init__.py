@@ -1,4 +1,4 @@
 """Routes module"""
-from . import auth_routes, email_routes, analytics_routes, query_routes
+from . import auth_routes, email_routes, analytics_routes, query_routes, metrics_routes
 
-__all__ = ['auth_routes', 'email_routes', 'analytics_routes', 'query_routes']
+__all__ = ['auth_routes', 'email_routes', 'analytics_routes', 'query_routes', 'metrics_routes']
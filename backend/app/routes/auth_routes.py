@@ -129,6 +129,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    """Get current authenticated user, requiring admin rights"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+
 @router.post("/register", response_model=UserResponse)
 async def register(user: UserCreate, db: Session = Depends(get_db)):
     """
@@ -214,6 +224,7 @@ async def gmail_callback(
 ):
     """Handle Gmail OAuth callback"""
     from app.services.gmail_service import GmailService  # Lazy import
+    from app.services.gmail_client_cache import gmail_client_cache
     try:
         token_data = GmailService.exchange_code_for_token(code)
         # Save tokens to user
@@ -222,6 +233,7 @@ async def gmail_callback(
         if token_data['expiry']:
             current_user.gmail_token_expiry = datetime.fromisoformat(token_data['expiry'])
         db.commit()
+        gmail_client_cache.invalidate(current_user.id)
         return {"message": "Gmail connected successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
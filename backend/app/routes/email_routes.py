@@ -1,20 +1,24 @@
 """
 Email Management Routes
 """
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-from google.oauth2.credentials import Credentials
+import asyncio
+import hmac
+import json
+import time
 
-from app.db.database import get_db
-from app.db.models import EmailRecord, User
-from app.services.gmail_service import GmailService
-from app.services.ai_categorizer import EmailCategorizer
-from app.services.rag_service import rag_service
-from app.routes.auth_routes import get_current_user
 from app.core.config import settings
+from app.db.database import SessionLocal, get_db
+from app.db.models import EmailRecord, SyncJob, User
+from app.services.email_sync import load_email_body
+from app.services.push_sync import push_sync
+from app.services.sync_worker import sync_worker_pool
+from app.routes.auth_routes import get_current_user
 import logging
 
 logger = logging.getLogger(__name__)
@@ -38,95 +42,146 @@ class EmailResponse(BaseModel):
         from_attributes = True
 
 
+class EmailDetailResponse(EmailResponse):
+    content: Optional[str] = None
+
+
 @router.post("/sync")
 async def sync_emails(
-    background_tasks: BackgroundTasks,
     days: int = 7,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Sync emails from Gmail"""
+    """Queue a Gmail sync for the current user (returns the running job if there is one)"""
     if not current_user.gmail_access_token:
         raise HTTPException(
             status_code=400,
             detail="Gmail not connected. Please authorize first."
         )
     
-    # Add sync task to background
-    background_tasks.add_task(
-        sync_emails_task,
-        current_user,
-        db,
-        days
-    )
+    job, created = sync_worker_pool.enqueue(db, current_user.id, days=days, source="manual")
     
-    return {"message": "Email sync started", "status": "processing"}
+    return {
+        "message": "Email sync started" if created else "Email sync already in progress",
+        "status": job.status,
+        "job_id": job.id
+    }
 
 
-async def sync_emails_task(user: User, db: Session, days: int):
-    """Background task to sync and process emails"""
-    try:
-        # Create Gmail service with user credentials
-        # Include client_id, client_secret and token_uri so credentials can refresh tokens
+@router.get("/sync/{job_id}")
+async def get_sync_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status and statistics of a sync job"""
+    job = db.query(SyncJob).filter(
+        SyncJob.id == job_id,
+        SyncJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    
+    return sync_worker_pool.job_to_dict(job)
+
+
+@router.get("/sync/{job_id}/events")
+async def stream_sync_job_events(
+    job_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream a sync job's progress as server-sent events
+    
+    Sends a ``progress`` event whenever the job's counts change (listed,
+    fetched, skipped, categorized, persisted, indexed, errors, throughput)
+    and a final ``done`` event once the job succeeds or fails.
+    """
+    job = db.query(SyncJob).filter(
+        SyncJob.id == job_id,
+        SyncJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    
+    return StreamingResponse(
+        sync_job_events(job_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def sync_job_events(job_id: str, request: Request):
+    """Poll the job row and yield SSE frames until the job finishes or the client leaves"""
+    last_payload = None
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        # Own short-lived session per poll; the request-scoped one isn't held open for the stream
+        db = SessionLocal()
         try:
-            credentials = Credentials(
-                token=user.gmail_access_token,
-                refresh_token=user.gmail_refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=settings.GMAIL_CLIENT_ID,
-                client_secret=settings.GMAIL_CLIENT_SECRET,
-            )
-
-            gmail_service = GmailService(credentials)
-        except Exception as e:
-            logger.exception("Failed to create Gmail credentials for user %s", user.email)
+            job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+            payload = json.dumps(sync_worker_pool.job_to_dict(job)) if job else None
+            status = job.status if job else None
+        finally:
+            db.close()
+        
+        if payload is None:
+            yield "event: error\ndata: {\"detail\": \"Sync job not found\"}\n\n"
+            return
+        if status in ("succeeded", "failed"):
+            yield f"event: done\ndata: {payload}\n\n"
             return
+        if payload != last_payload:
+            yield f"event: progress\ndata: {payload}\n\n"
+            last_payload = payload
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= settings.SYNC_EVENTS_KEEPALIVE:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
         
-        # Fetch emails
-        emails = await gmail_service.fetch_recent_emails(
-            max_results=100,
-            days=days
+        await asyncio.sleep(settings.SYNC_EVENTS_POLL_INTERVAL)
+
+
+@router.post("/watch")
+async def register_gmail_watch(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Register Gmail push notifications for the current user's mailbox"""
+    if not current_user.gmail_refresh_token:
+        raise HTTPException(
+            status_code=400,
+            detail="Gmail not connected. Please authorize first."
         )
-        
-        # Process each email
-        for email_data in emails:
-            # Check if email already exists
-            existing = db.query(EmailRecord).filter(
-                EmailRecord.gmail_id == email_data['gmail_id']
-            ).first()
-            
-            if existing:
-                continue
-            
-            # Categorize email using AI
-            ai_result = await EmailCategorizer.categorize_email(email_data)
-            
-            # Create email record
-            email_record = EmailRecord(
-                gmail_id=email_data['gmail_id'],
-                thread_id=email_data['thread_id'],
-                sender=email_data['sender'],
-                recipient=email_data['recipient'],
-                subject=email_data['subject'],
-                timestamp=email_data['timestamp'],
-                content=email_data['content'],
-                category=ai_result['category'],
-                priority=ai_result['priority'],
-                summary=ai_result['summary'],
-                entities=ai_result['entities'],
-                attachments=email_data['attachments'],
-                confidence_score=ai_result.get('confidence', 0.0)
-            )
-            
-            db.add(email_record)
-        
-        db.commit()
-        
-        # Rebuild RAG index
-        await rag_service.build_index(db)
-        
-    except Exception as e:
-        logger.exception("Error syncing emails for user %s: %s", user.email, str(e))
+    
+    try:
+        return await push_sync.register_watch(current_user, db)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/push")
+async def gmail_push_webhook(
+    token: str,
+    envelope: dict = Body(...),
+    db: Session = Depends(get_db)
+):
+    """Receive Gmail change notifications from a Pub/Sub push subscription"""
+    if not settings.GMAIL_WEBHOOK_TOKEN or not hmac.compare_digest(token, settings.GMAIL_WEBHOOK_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid webhook token")
+    
+    try:
+        scheduled = await push_sync.handle_envelope(db, envelope)
+    except ValueError as e:
+        # Acknowledge malformed messages so Pub/Sub doesn't redeliver them forever
+        logger.warning(str(e))
+        return {"status": "ignored"}
+    
+    return {"status": "scheduled" if scheduled else "ignored"}
 
 
 @router.get("/", response_model=List[EmailResponse])
@@ -153,7 +208,7 @@ async def get_emails(
     return emails
 
 
-@router.get("/{email_id}", response_model=EmailResponse)
+@router.get("/{email_id}", response_model=EmailDetailResponse)
 async def get_email(
     email_id: str,
     current_user: User = Depends(get_current_user),
@@ -168,6 +223,10 @@ async def get_email(
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     
+    # Metadata-only emails get their body fetched the first time they are opened
+    if email.content is None:
+        email = await load_email_body(db, email, current_user)
+    
     return email
 
 
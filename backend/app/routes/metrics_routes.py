@@ -0,0 +1,62 @@
+"""
+Runtime Metrics Routes
+"""
+from fastapi import APIRouter, Depends
+
+from app.db.models import User
+from app.routes.auth_routes import get_current_user, get_current_admin
+from app.services.llm_scheduler import llm_scheduler
+from app.services.llm_guard import llm_guard
+from app.services.gmail_quota import gmail_quota
+from app.services.push_sync import push_sync
+from app.services.sync_scheduler import sync_scheduler
+from app.services.sync_worker import sync_worker_pool
+from app.services.ingest_pipeline import ingest_monitor
+from app.utils.loop_monitor import loop_monitor
+
+router = APIRouter()
+
+
+@router.get("/llm")
+async def get_llm_metrics(current_user: User = Depends(get_current_user)):
+    """Get LLM scheduler metrics and per-call-site tail latency / breaker state"""
+    return {
+        "scheduler": llm_scheduler.snapshot(),
+        "call_sites": llm_guard.snapshot()
+    }
+
+
+@router.get("/event-loop")
+async def get_event_loop_metrics(current_user: User = Depends(get_current_user)):
+    """Get event-loop lag (time the loop was blocked by synchronous work)"""
+    return loop_monitor.snapshot()
+
+
+@router.get("/push")
+async def get_push_metrics(current_user: User = Depends(get_current_user)):
+    """Get push notification counters and notification-to-ingest latency"""
+    return push_sync.snapshot()
+
+
+@router.get("/sync-scheduler")
+async def get_sync_scheduler_metrics(current_user: User = Depends(get_current_admin)):
+    """Get per-user sync lag, backoff and scheduler state (admin only: lists every account)"""
+    return sync_scheduler.snapshot()
+
+
+@router.get("/gmail")
+async def get_gmail_metrics(current_user: User = Depends(get_current_admin)):
+    """Get Gmail quota usage, local throttling, rate-limit retries and dropped requests (admin only)"""
+    return gmail_quota.snapshot()
+
+
+@router.get("/sync-worker")
+async def get_sync_worker_metrics(current_user: User = Depends(get_current_admin)):
+    """Get sync job worker state and job counters for this process (admin only)"""
+    return sync_worker_pool.snapshot()
+
+
+@router.get("/ingest")
+async def get_ingest_metrics(current_user: User = Depends(get_current_admin)):
+    """Get per-stage throughput and queue depth of running and recent sync pipelines (admin only)"""
+    return ingest_monitor.snapshot()
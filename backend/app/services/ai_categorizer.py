@@ -1,15 +1,40 @@
 """
 AI-powered Email Categorization Service
 """
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, RateLimitError, InternalServerError
 from app.core.config import settings
+from app.utils.text_normalizer import EmailNormalizer
+from app.services.llm_scheduler import Priority
+from app.services.llm_guard import llm_guard, CircuitOpenError
+import asyncio
 import json
 import logging
-from typing import Dict, Any
+import re
+from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+# Failures caused by an outage or overload; the same email may succeed later.
+# Anything else (bad JSON, a rejected prompt) fails again for that email.
+TRANSIENT_LLM_ERRORS = (CircuitOpenError, asyncio.TimeoutError, APIConnectionError, RateLimitError, InternalServerError)
+
+# Keyword rules for local (no-LLM) categorization, checked in order
+LOCAL_CATEGORY_RULES = [
+    ("Lab Results", re.compile(r"\b(lab results?|blood test|hemoglobin|cbc|lipid panel|urinalysis)\b", re.IGNORECASE)),
+    ("Diagnostic Results", re.compile(r"\b(x-?ray|mri|ct scan|ultrasound|ecg|ekg|radiology report|imaging)\b", re.IGNORECASE)),
+    ("Insurance Claims", re.compile(r"\b(insurance|claim|pre-?authori[sz]ation|tpa)\b", re.IGNORECASE)),
+    ("Billing / Payment", re.compile(r"\b(invoice|billing|payment|amount due|receipt|outstanding balance)\b", re.IGNORECASE)),
+    ("Appointment Confirmation", re.compile(r"\b(appointment|scheduled|reschedul\w*|booking confirmed)\b", re.IGNORECASE)),
+    ("Prescription", re.compile(r"\b(prescription|medication|dosage|refill|rx)\b", re.IGNORECASE)),
+    ("Medical Report", re.compile(r"\b(medical report|discharge summary|case summary|clinical notes?)\b", re.IGNORECASE)),
+    ("Official Notice", re.compile(r"\b(notice|policy|circular|announcement|compliance)\b", re.IGNORECASE)),
+    ("Doctor / Patient Communication", re.compile(r"\b(dear doctor|dear dr\.?|patient query|follow[- ]up question)\b", re.IGNORECASE)),
+]
+
+LOCAL_HIGH_PRIORITY_PATTERN = re.compile(r"\b(urgent|stat|critical|emergency|asap|immediately)\b", re.IGNORECASE)
+LOCAL_LOW_PRIORITY_PATTERN = re.compile(r"\b(newsletter|fyi|no action required|unsubscribe)\b", re.IGNORECASE)
 
 
 class EmailCategorizer:
@@ -30,6 +55,21 @@ class EmailCategorizer:
     
     PRIORITY_LEVELS = ["high", "medium", "low"]
     
+    # Bump whenever CATEGORIES or the prompt change so stored rows get re-processed
+    PROMPT_VERSION = "2"
+    
+    # Entity fields and their prompt descriptions
+    ENTITY_FIELDS = {
+        "patient_name": "<name or null>",
+        "doctor_name": "<name or null>",
+        "department": "<department or null>",
+        "amount": "<monetary amount or null>",
+        "date": "<important date or null>",
+        "diagnosis": "<diagnosis or null>",
+        "claim_id": "<claim/invoice ID or null>",
+        "appointment_date": "<appointment date or null>"
+    }
+    
     @staticmethod
     def create_categorization_prompt(email_data: Dict[str, Any]) -> str:
         """
@@ -37,23 +77,48 @@ class EmailCategorizer:
         
         Args:
             email_data: Dictionary containing email subject, sender, and content
+                (``normalized_content`` is used when present; fields already in
+                ``entities`` from local extraction are not requested again)
             
         Returns:
             str: Formatted prompt for GPT-4
         """
+        content = email_data.get('normalized_content')
+        if content is None:
+            content = EmailNormalizer.normalize(email_data.get('content', ''))['text']
+        content = EmailNormalizer.truncate_tokens(content, settings.CATEGORIZATION_MAX_TOKENS)
+        attachments = EmailNormalizer.attachment_text(
+            email_data.get('attachments'), settings.ATTACHMENT_PROMPT_MAX_TOKENS
+        )
+        
+        known_entities = {k: v for k, v in (email_data.get('entities') or {}).items() if v}
+        missing_fields = [f for f in EmailCategorizer.ENTITY_FIELDS if f not in known_entities]
+        
+        if missing_fields:
+            entity_task = f"4. Identify ONLY these missing entities: {', '.join(missing_fields)}"
+        else:
+            entity_task = "4. All entities are already extracted; return an empty entities object"
+        if known_entities:
+            entity_task += f"\n   (Already extracted, do not repeat: {json.dumps(known_entities)})"
+        
+        entity_schema = ",\n".join(
+            f'        "{field}": "{EmailCategorizer.ENTITY_FIELDS[field]}"' for field in missing_fields
+        )
+        
         return f"""
 You are an AI assistant specialized in categorizing hospital emails. Analyze the following email and provide a structured response.
 
 Email Details:
 - Sender: {email_data.get('sender', 'Unknown')}
 - Subject: {email_data.get('subject', 'No Subject')}
-- Content Preview: {email_data.get('content', '')[:1000]}
+- Content Preview: {content}
+- Attachments: {attachments or 'None'}
 
 Your task:
 1. Categorize this email into ONE of these categories: {', '.join(EmailCategorizer.CATEGORIES)}
 2. Determine priority level: high, medium, or low
 3. Extract a concise summary (2-3 sentences)
-4. Identify key entities (patient names, doctor names, departments, amounts, dates, diagnosis, etc.)
+{entity_task}
 
 Respond ONLY with valid JSON in this exact format:
 {{
@@ -61,42 +126,106 @@ Respond ONLY with valid JSON in this exact format:
     "priority": "<high/medium/low>",
     "summary": "<brief summary>",
     "entities": {{
-        "patient_name": "<name or null>",
-        "doctor_name": "<name or null>",
-        "department": "<department or null>",
-        "amount": "<monetary amount or null>",
-        "date": "<important date or null>",
-        "diagnosis": "<diagnosis or null>",
-        "claim_id": "<claim/invoice ID or null>",
-        "appointment_date": "<appointment date or null>"
+{entity_schema}
     }},
     "confidence": <0.0-1.0>
 }}
 """
     
     @staticmethod
-    async def categorize_email(email_data: Dict[str, Any]) -> Dict[str, Any]:
+    def merge_entities(local: Dict[str, Any], llm: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merge locally extracted entities with LLM output
+        
+        Local values win; the LLM only fills fields left empty.
+        
+        Args:
+            local: Entities from the local extraction pipeline
+            llm: Entities returned by the LLM
+            
+        Returns:
+            Merged entity dictionary
+        """
+        merged = {k: v for k, v in (llm or {}).items() if k in EmailCategorizer.ENTITY_FIELDS}
+        merged.update({k: v for k, v in (local or {}).items() if v})
+        return merged
+    
+    @staticmethod
+    def categorize_locally(email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Rule-based categorization without any API call
+        
+        Used when CATEGORIZER_MODE is "local" (offline imports, benchmarks).
+        
+        Args:
+            email_data: Email dictionary (subject, normalized_content, entities)
+            
+        Returns:
+            Dict in the same shape as categorize_email
+        """
+        content = email_data.get('normalized_content')
+        if content is None:
+            content = email_data.get('content') or ''
+        text = f"{email_data.get('subject', '')}\n{content}"
+        
+        category = next(
+            (name for name, pattern in LOCAL_CATEGORY_RULES if pattern.search(text)),
+            "Other"
+        )
+        if LOCAL_HIGH_PRIORITY_PATTERN.search(text):
+            priority = "high"
+        elif LOCAL_LOW_PRIORITY_PATTERN.search(text):
+            priority = "low"
+        else:
+            priority = "medium"
+        
+        summary = EmailNormalizer.truncate_tokens(' '.join(content.split()), 60)
+        return {
+            "category": category,
+            "priority": priority,
+            "summary": summary or email_data.get('subject', ''),
+            "entities": EmailCategorizer.merge_entities(email_data.get('entities'), None),
+            "confidence": 0.5 if category != "Other" else 0.2
+        }
+    
+    @staticmethod
+    async def categorize_email(
+        email_data: Dict[str, Any],
+        priority: Priority = Priority.BULK
+    ) -> Dict[str, Any]:
         """
         Categorize email using GPT-4
         
         Args:
             email_data: Email information dictionary
+            priority: LLM scheduler class (bulk for sync and re-categorization)
             
         Returns:
-            Dict containing category, priority, summary, and entities
+            Dict containing category, priority, summary, and entities. When the
+            LLM call fails (error, timeout, open circuit) the placeholder result
+            has ``failed: True``; callers must not treat it as a real category.
+            ``retryable`` tells a transient failure (timeout, open circuit,
+            connection, rate limit, server error) from one specific to the email.
         """
+        if settings.CATEGORIZER_MODE == "local":
+            return EmailCategorizer.categorize_locally(email_data)
+        
         try:
             prompt = EmailCategorizer.create_categorization_prompt(email_data)
             
-            response = client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are a medical email classification expert. Always respond with valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500,
-                response_format={"type": "json_object"}
+            response = await llm_guard.call(
+                "categorize",
+                lambda: client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=[
+                        {"role": "system", "content": "You are a medical email classification expert. Always respond with valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=500,
+                    response_format={"type": "json_object"}
+                ),
+                priority=priority
             )
             
             result = json.loads(response.choices[0].message.content)
@@ -109,6 +238,10 @@ Respond ONLY with valid JSON in this exact format:
             if result.get('priority') not in EmailCategorizer.PRIORITY_LEVELS:
                 result['priority'] = 'medium'
             
+            result['entities'] = EmailCategorizer.merge_entities(
+                email_data.get('entities'), result.get('entities')
+            )
+            
             logger.info(f"Email categorized: {result.get('category')} with priority {result.get('priority')}")
             
             return result
@@ -119,23 +252,28 @@ Respond ONLY with valid JSON in this exact format:
                 "category": "Other",
                 "priority": "medium",
                 "summary": "Failed to categorize automatically",
-                "entities": {},
-                "confidence": 0.0
+                "entities": EmailCategorizer.merge_entities(email_data.get('entities'), None),
+                "confidence": 0.0,
+                "failed": True,
+                "retryable": isinstance(e, TRANSIENT_LLM_ERRORS)
             }
     
     @staticmethod
-    async def batch_categorize(emails: list) -> list:
+    async def batch_categorize(emails: list, concurrency: Optional[int] = None) -> list:
         """
-        Categorize multiple emails
+        Categorize multiple emails concurrently
         
         Args:
             emails: List of email dictionaries
+            concurrency: Maximum in-flight LLM calls (defaults to settings)
             
         Returns:
-            List of categorization results
+            List of categorization results, in input order
         """
-        results = []
-        for email in emails:
-            result = await EmailCategorizer.categorize_email(email)
-            results.append(result)
-        return results
+        semaphore = asyncio.Semaphore(concurrency or settings.CATEGORIZATION_CONCURRENCY)
+        
+        async def categorize_one(email):
+            async with semaphore:
+                return await EmailCategorizer.categorize_email(email)
+        
+        return await asyncio.gather(*(categorize_one(email) for email in emails))
@@ -0,0 +1,152 @@
+"""
+Attachment Ingestion Service
+Download email attachments and extract text from PDFs in a process pool
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+
+from app.core.config import settings
+from app.services.gmail_service import GmailService
+from app.utils.pdf_parser import PDFParser, limit_worker_memory
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPES = {"application/pdf", "application/x-pdf"}
+
+
+class AttachmentProcessor:
+    """
+    Ingest PDF attachments of newly synced emails
+
+    Downloads run with bounded concurrency and are streamed to temporary
+    files. Parsing happens in a separate process pool whose workers have a
+    memory cap; a parse that exceeds its timeout has its pool recycled so a
+    stuck worker cannot hold a slot forever.
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._download_semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"downloaded": 0, "parsed": 0, "timeouts": 0, "errors": 0, "too_large": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.ATTACHMENT_PARSE_PROCESSES,
+                # spawn: workers never inherit the server's threads or open connections
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=limit_worker_memory,
+                initargs=(settings.ATTACHMENT_PARSE_MEMORY_MB,)
+            )
+        return self._pool
+
+    def _recycle_pool(self):
+        """Kill the worker processes (e.g. one is stuck on a PDF) and start fresh"""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop the parsing workers"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _parse_pdf(self, path: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._get_pool(),
+            PDFParser.extract_for_ingestion,
+            path,
+            settings.ATTACHMENT_TEXT_MAX_CHARS,
+            settings.ATTACHMENT_SUMMARY_CHARS
+        )
+        try:
+            return await asyncio.wait_for(future, timeout=settings.ATTACHMENT_PARSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._recycle_pool()
+            raise
+
+    async def _process_attachment(
+        self,
+        gmail_service: GmailService,
+        message_id: str,
+        attachment: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Download and parse one PDF attachment; returns the updated attachment dict"""
+        if attachment.get('size', 0) > settings.ATTACHMENT_MAX_BYTES:
+            self.stats["too_large"] += 1
+            return {**attachment, 'parse_status': 'too_large'}
+
+        if self._download_semaphore is None:
+            self._download_semaphore = asyncio.Semaphore(settings.ATTACHMENT_DOWNLOAD_CONCURRENCY)
+
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=settings.ATTACHMENT_TEMP_DIR)
+        try:
+            async with self._download_semaphore:
+                with os.fdopen(fd, "wb") as file:
+                    await gmail_service.download_attachment(message_id, attachment['attachment_id'], file)
+            self.stats["downloaded"] += 1
+
+            try:
+                parsed = await self._parse_pdf(path)
+            except BrokenProcessPool:
+                # Pool was recycled under us by another attachment's timeout; try once more
+                parsed = await self._parse_pdf(path)
+            self.stats["parsed"] += 1
+            return {**attachment, **parsed, 'parse_status': 'parsed'}
+
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"Timed out parsing {attachment['filename']} from {message_id}")
+            return {**attachment, 'parse_status': 'timeout'}
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error ingesting attachment {attachment['filename']} from {message_id}: {str(e)}")
+            return {**attachment, 'parse_status': 'error'}
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def process_email(self, gmail_service: GmailService, email_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Ingest the PDF attachments of one email
+
+        Args:
+            gmail_service: Gmail service for the mailbox owner
+            email_data: Full email dictionary from GmailService
+
+        Returns:
+            Attachment list with text, content_summary and parse_status filled in for PDFs
+        """
+        attachments = email_data.get('attachments') or []
+        tasks = []
+        for attachment in attachments:
+            if attachment.get('mime_type') in PDF_MIME_TYPES and attachment.get('attachment_id'):
+                tasks.append(self._process_attachment(gmail_service, email_data['gmail_id'], attachment))
+            else:
+                tasks.append(asyncio.sleep(0, result=attachment))
+        return list(await asyncio.gather(*tasks))
+
+    async def process_emails(self, gmail_service: GmailService, emails: List[Dict[str, Any]]):
+        """Ingest attachments for a batch of emails, updating each email's 'attachments' in place"""
+        if not settings.ATTACHMENT_INGESTION_ENABLED:
+            return
+        results = await asyncio.gather(*(self.process_email(gmail_service, email) for email in emails))
+        for email, attachments in zip(emails, results):
+            email['attachments'] = attachments
+
+
+# Global attachment processor instance
+attachment_processor = AttachmentProcessor()
@@ -0,0 +1,153 @@
+"""
+Email Sync Service
+Pull new mail for a user from Gmail, process it and store it
+"""
+from sqlalchemy.orm import Session
+from typing import Dict, Any, List, AsyncIterator, Awaitable, Callable, Optional
+import logging
+
+from app.core.config import settings
+from app.db.models import EmailRecord, User
+from app.services.gmail_service import GmailService, HistoryExpiredError
+from app.services.gmail_client_cache import gmail_client_cache
+from app.services.attachment_processor import attachment_processor
+from app.services.ingest_pipeline import IngestPipeline
+from app.services.sync_lease import sync_lease
+from app.utils.text_normalizer import EmailNormalizer
+from app.utils.stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+async def _chunked(items: List[str], size: int) -> AsyncIterator[List[str]]:
+    """Yield fixed-size chunks of an in-memory list as an async iterator"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def plan_changed_emails(gmail_service: GmailService, user: User, days: int) -> Dict[str, Any]:
+    """
+    Work out which messages were added since the user's last sync
+
+    Uses the Gmail History API from the stored historyId. Falls back to a
+    date-window sweep on the first sync or when the history has expired.
+
+    Args:
+        gmail_service: Gmail service for the user
+        user: User being synced
+        days: Look-back window for the fallback sweep
+
+    Returns:
+        Dict with an async iterator of message ID pages, the new historyId and the mode used
+    """
+    if user.gmail_history_id:
+        try:
+            message_ids, history_id = await gmail_service.list_history_message_ids(user.gmail_history_id)
+            logger.info(f"Incremental sync for {user.email}: {len(message_ids)} new messages")
+            return {
+                "id_pages": _chunked(message_ids, settings.GMAIL_BATCH_SIZE),
+                "history_id": history_id,
+                "mode": "incremental"
+            }
+        except HistoryExpiredError:
+            logger.warning(f"History {user.gmail_history_id} expired for {user.email}; running full sweep")
+
+    # Snapshot the historyId before listing so nothing added during the sweep is missed
+    history_id = await gmail_service.get_history_id()
+    return {
+        "id_pages": gmail_service.iter_recent_message_ids(days=days),
+        "history_id": history_id,
+        "mode": "full"
+    }
+
+
+async def load_email_body(db: Session, email: EmailRecord, user: User) -> EmailRecord:
+    """
+    Fetch and store the full body of a metadata-only email on demand
+
+    Args:
+        db: Database session
+        email: Stored email whose content hasn't been fetched
+        user: User whose Gmail account holds the message
+
+    Returns:
+        The updated email record (unchanged if the fetch fails)
+    """
+    if email.content is not None or not user.gmail_access_token:
+        return email
+
+    gmail_service = await gmail_client_cache.get(user, db)
+    email_data = await gmail_service._get_email_details(email.gmail_id)
+    if not email_data:
+        return email
+
+    await attachment_processor.process_emails(gmail_service, [email_data])
+    normalized = EmailNormalizer.normalize(email_data['content'])
+    email.content = email_data['content']
+    email.normalized_content = normalized['text']
+    email.raw_token_count = normalized['raw_tokens']
+    email.normalized_token_count = normalized['normalized_tokens']
+    email.attachments = email_data['attachments']
+    db.commit()
+    return email
+
+
+async def sync_user_mailbox(
+    user: User,
+    db: Session,
+    days: int = 7,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """
+    Sync one user's mailbox
+
+    Args:
+        user: User whose Gmail account is synced
+        db: Database session
+        days: Look-back window for full sweeps
+        on_progress: Awaited with IngestPipeline.progress() every SYNC_JOB_PROGRESS_INTERVAL seconds
+
+    Returns:
+        Dict with sync statistics, including latency percentiles per stage
+
+    Raises:
+        SyncInProgressError: Another process or task is already syncing this user
+    """
+    # One sync per mailbox across all processes; a second one would fetch and
+    # categorize the same messages only to have their inserts skipped
+    async with sync_lease.hold(db, user.id):
+        return await _sync_leased_mailbox(user, db, days, on_progress)
+
+
+async def _sync_leased_mailbox(
+    user: User,
+    db: Session,
+    days: int,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]]
+) -> Dict[str, Any]:
+    timer = StageTimer()
+    gmail_service = await gmail_client_cache.get(user, db)
+    # The client is shared across syncs; report only this sync's API usage
+    api_usage_before = dict(gmail_service.stats)
+
+    with timer.stage("plan"):
+        plan = await plan_changed_emails(gmail_service, user, days)
+
+    # Listing, fetching, categorization, commits and indexing overlap as pipeline stages
+    pipeline = IngestPipeline(gmail_service, db, user, timer, on_progress=on_progress)
+    stats = {"mode": plan["mode"], **await pipeline.run(plan["id_pages"])}
+
+    dropped = gmail_service.stats["dropped"] - api_usage_before["dropped"]
+    # Only advance the stored historyId once every page is committed and nothing was
+    # dropped; otherwise the next sync lists the same changes again (stored ones are skipped)
+    if plan["history_id"] and not dropped:
+        user.gmail_history_id = plan["history_id"]
+        db.commit()
+    elif dropped:
+        logger.warning(f"{dropped} Gmail requests dropped for {user.email}; historyId not advanced")
+
+    stats.update({key: value - api_usage_before[key] for key, value in gmail_service.stats.items()})
+    stats["stage_ms"] = timer.snapshot()
+    stats["pipeline"] = pipeline.snapshot()["stages"]
+    logger.info(f"Synced mailbox for {user.email}: {stats}")
+    return stats
@@ -0,0 +1,179 @@
+"""
+Local Entity Extraction Service
+spaCy NER + hospital department entity ruler + regexes for amounts and IDs,
+so the LLM only has to fill the fields this pipeline leaves empty
+"""
+from app.core.config import settings
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import re
+
+import spacy
+
+logger = logging.getLogger(__name__)
+
+
+# Only names that don't double as everyday words ("lab", "billing", "emergency"
+# appear in most email bodies without naming a department)
+HOSPITAL_DEPARTMENTS = [
+    "Cardiology", "Radiology", "Oncology", "Neurology", "Pediatrics", "Paediatrics",
+    "Orthopedics", "Orthopaedics", "ENT", "Dermatology", "Emergency Department",
+    "ICU", "Intensive Care", "Pathology", "Gastroenterology", "Nephrology", "Urology",
+    "Gynecology", "Obstetrics", "Psychiatry", "Pulmonology", "Endocrinology", "Hematology",
+    "Laboratory", "Pharmacy", "Anesthesiology", "Ophthalmology", "General Surgery",
+    "Internal Medicine", "Physiotherapy", "Billing Department", "Accounts Department",
+]
+
+AMOUNT_PATTERN = re.compile(
+    r"(?:(?:USD|INR|Rs\.?|EUR|GBP)\s?|[$₹€£]\s?)\d{1,3}(?:,\d{2,3})*(?:\.\d{1,2})?"
+    r"|\b\d{1,3}(?:,\d{3})*(?:\.\d{1,2})?\s?(?:USD|INR|dollars|rupees)\b",
+    re.IGNORECASE
+)
+
+CLAIM_ID_PATTERN = re.compile(
+    r"\b(?:claim|invoice|inv|reference|ref|policy)\s*(?:#|no\.?|number|id)?\s*[:\-]?\s*#?\s*"
+    r"([A-Z]{0,5}-?\d[A-Z0-9\-]{2,})",
+    re.IGNORECASE
+)
+
+DOCTOR_TITLE_PATTERN = re.compile(r"\b(?:Dr\.?|Doctor)\s+$", re.IGNORECASE)
+PATIENT_CUE_PATTERN = re.compile(r"\bpatient(?:\s+name)?\s*[:\-]?\s*$", re.IGNORECASE)
+APPOINTMENT_CUE_PATTERN = re.compile(r"\b(?:appointment|scheduled|visit|follow[- ]up)\b", re.IGNORECASE)
+
+# Characters of left context checked for "Dr." / "Patient:" style cues
+CUE_WINDOW = 20
+
+
+class EntityExtractor:
+    """Local entity extraction pipeline for hospital emails"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or settings.SPACY_MODEL
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        """Lazily load the spaCy pipeline with the department entity ruler"""
+        if self._nlp is None:
+            self._nlp = self._load_pipeline()
+        return self._nlp
+
+    def _load_pipeline(self):
+        try:
+            nlp = spacy.load(self.model_name, disable=["parser", "lemmatizer", "tagger", "attribute_ruler"])
+        except OSError:
+            logger.warning(
+                f"spaCy model '{self.model_name}' not installed; using rules-only pipeline. "
+                f"Install it with: python -m spacy download {self.model_name}"
+            )
+            nlp = spacy.blank("en")
+
+        ruler_config = {"phrase_matcher_attr": "LOWER", "overwrite_ents": True}
+        if "ner" in nlp.pipe_names:
+            ruler = nlp.add_pipe("entity_ruler", before="ner", config=ruler_config)
+        else:
+            ruler = nlp.add_pipe("entity_ruler", config=ruler_config)
+        ruler.add_patterns([
+            {"label": "DEPARTMENT", "pattern": department}
+            for department in HOSPITAL_DEPARTMENTS
+        ])
+        return nlp
+
+    @staticmethod
+    def _extract_from_doc(doc) -> Dict[str, Any]:
+        """Map a processed spaCy Doc to the categorizer's entity fields"""
+        text = doc.text
+        entities: Dict[str, Any] = {}
+
+        for ent in doc.ents:
+            left_context = text[max(0, ent.start_char - CUE_WINDOW):ent.start_char]
+
+            if ent.label_ == "DEPARTMENT" and not entities.get("department"):
+                entities["department"] = ent.text.title() if ent.text.islower() else ent.text
+            elif ent.label_ == "PERSON":
+                if DOCTOR_TITLE_PATTERN.search(left_context) and not entities.get("doctor_name"):
+                    entities["doctor_name"] = f"Dr. {ent.text}"
+                elif PATIENT_CUE_PATTERN.search(left_context) and not entities.get("patient_name"):
+                    entities["patient_name"] = ent.text
+            elif ent.label_ == "DATE":
+                sentence_context = text[max(0, ent.start_char - 60):ent.start_char]
+                if APPOINTMENT_CUE_PATTERN.search(sentence_context) and not entities.get("appointment_date"):
+                    entities["appointment_date"] = ent.text
+                elif not entities.get("date"):
+                    entities["date"] = ent.text
+            elif ent.label_ == "MONEY" and not entities.get("amount"):
+                entities["amount"] = ent.text
+
+        amount_match = AMOUNT_PATTERN.search(text)
+        if amount_match:
+            # Regex match keeps the currency symbol that spaCy's MONEY span often drops
+            entities["amount"] = amount_match.group(0).strip()
+
+        claim_match = CLAIM_ID_PATTERN.search(text)
+        if claim_match:
+            entities["claim_id"] = claim_match.group(1).upper()
+
+        return entities
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """
+        Extract entities from a single text
+
+        Args:
+            text: Email subject and normalized body
+
+        Returns:
+            Dict of entity fields that were found (missing fields are omitted)
+        """
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts: List[str], n_process: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Extract entities from many texts with nlp.pipe
+
+        Multiprocessing is only used once the batch is large enough to pay
+        for worker start-up.
+
+        Args:
+            texts: Texts to process
+            n_process: nlp.pipe worker processes (defaults to ENTITY_EXTRACTION_PROCESSES)
+
+        Returns:
+            List of entity dicts, aligned with ``texts``
+        """
+        if not texts:
+            return []
+
+        batch_size = settings.ENTITY_EXTRACTION_BATCH_SIZE
+        if n_process is None:
+            n_process = settings.ENTITY_EXTRACTION_PROCESSES if len(texts) >= batch_size * 2 else 1
+
+        try:
+            docs = self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+            return [self._extract_from_doc(doc) for doc in docs]
+        except Exception as e:
+            logger.error(f"Error extracting entities: {str(e)}")
+            return [{} for _ in texts]
+
+    async def extract_batch_async(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Run ``extract_batch`` off the event loop
+
+        Always single-process: nlp.pipe would otherwise start multiprocessing
+        workers from an executor thread of the API server.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.extract_batch(texts, n_process=1))
+
+    @staticmethod
+    def email_text(email_data: Dict[str, Any]) -> str:
+        """Text used for extraction: subject plus normalized body"""
+        body = email_data.get('normalized_content')
+        if body is None:
+            body = email_data.get('content', '')
+        return f"{email_data.get('subject', '')}\n{body or ''}"
+
+
+# Global entity extractor instance
+entity_extractor = EntityExtractor()
@@ -0,0 +1,148 @@
+"""
+Gmail Client Cache
+Reuse one GmailService per user and keep its access token fresh
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import asyncio
+import logging
+import time
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import User
+from app.services.gmail_service import GmailService, gmail_executor
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+class _CachedClient:
+    """A cached GmailService and the tokens it was built from"""
+
+    def __init__(self, service: GmailService, refresh_token: str):
+        self.service = service
+        self.refresh_token = refresh_token
+        self.created_at = time.monotonic()
+
+
+class GmailClientCache:
+    """
+    Per-user GmailService cache with TTL
+
+    Cached clients keep their per-thread keep-alive connections between
+    syncs. Access tokens are refreshed shortly before ``gmail_token_expiry``
+    and written back to the user row, so later syncs and other workers start
+    with a valid token instead of paying a refresh round trip.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        self.ttl = ttl or settings.GMAIL_CLIENT_CACHE_TTL
+        self.max_size = max_size or settings.GMAIL_CLIENT_CACHE_MAX_SIZE
+        self._clients: "OrderedDict[str, _CachedClient]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+
+    @staticmethod
+    def build_credentials(user: User) -> Credentials:
+        """
+        Create credentials from the user's stored tokens
+
+        Includes client_id, client_secret and token_uri so credentials can refresh tokens.
+        """
+        return Credentials(
+            token=user.gmail_access_token,
+            refresh_token=user.gmail_refresh_token,
+            token_uri=GOOGLE_TOKEN_URI,
+            client_id=settings.GMAIL_CLIENT_ID,
+            client_secret=settings.GMAIL_CLIENT_SECRET,
+            expiry=user.gmail_token_expiry,
+        )
+
+    @staticmethod
+    def _needs_refresh(credentials: Credentials) -> bool:
+        """Refresh ahead of expiry so no request goes out with a dying token"""
+        if not credentials.refresh_token:
+            return False
+        if not credentials.token or not credentials.expiry:
+            return True
+        margin = timedelta(seconds=settings.GMAIL_TOKEN_REFRESH_MARGIN)
+        # google-auth keeps expiry as naive UTC
+        return credentials.expiry - margin <= datetime.utcnow()
+
+    async def _refresh(self, credentials: Credentials, user: User):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(gmail_executor, credentials.refresh, Request())
+            self.stats["refreshes"] += 1
+            logger.info(f"Refreshed Gmail access token for {user.email}")
+        except Exception as e:
+            self.stats["refresh_failures"] += 1
+            logger.error(f"Failed to refresh Gmail token for {user.email}: {str(e)}")
+
+    @staticmethod
+    def _persist_token(credentials: Credentials, user: User, db: Optional[Session]):
+        """Write a token refreshed in this process back to the user row"""
+        if not credentials.token or credentials.token == user.gmail_access_token:
+            return
+        user.gmail_access_token = credentials.token
+        user.gmail_token_expiry = credentials.expiry
+        if db is not None:
+            db.commit()
+
+    async def get(self, user: User, db: Optional[Session] = None) -> GmailService:
+        """
+        Get the cached GmailService for a user, building it if needed
+
+        Args:
+            user: User whose Gmail account is accessed
+            db: Session the user row belongs to; refreshed tokens are committed through it
+
+        Returns:
+            GmailService with a token valid for at least GMAIL_TOKEN_REFRESH_MARGIN seconds
+        """
+        lock = self._locks.setdefault(user.id, asyncio.Lock())
+        async with lock:
+            cached = self._clients.get(user.id)
+            if cached and (
+                time.monotonic() - cached.created_at > self.ttl
+                or cached.refresh_token != user.gmail_refresh_token
+            ):
+                # Expired, or the user re-authorized with new tokens
+                self._clients.pop(user.id, None)
+                cached = None
+
+            if cached:
+                self.stats["hits"] += 1
+                self._clients.move_to_end(user.id)
+                credentials = cached.service.credentials
+            else:
+                self.stats["misses"] += 1
+                credentials = self.build_credentials(user)
+
+            if self._needs_refresh(credentials):
+                await self._refresh(credentials, user)
+            # Also catches refreshes done transparently by AuthorizedHttp on a 401
+            self._persist_token(credentials, user, db)
+
+            if cached:
+                return cached.service
+
+            service = GmailService(credentials, quota_key=user.id)
+            self._clients[user.id] = _CachedClient(service, user.gmail_refresh_token)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+            return service
+
+    def invalidate(self, user_id: str):
+        """Drop a user's cached client (e.g. after they reconnect Gmail)"""
+        self._clients.pop(user_id, None)
+
+
+# Global Gmail client cache instance
+gmail_client_cache = GmailClientCache()
@@ -0,0 +1,179 @@
+"""
+Gmail Quota Limiter
+Quota-unit token buckets per user and per project, with retry-after-aware
+backoff for rate-limited Gmail calls
+"""
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import random
+import time
+
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Quota units charged per Gmail API method
+# https://developers.google.com/gmail/api/reference/quota
+METHOD_QUOTA_UNITS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.watch": 100,
+    "gmail.users.stop": 50,
+    "gmail.users.history.list": 2,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.messages.attachments.get": 5,
+}
+DEFAULT_QUOTA_UNITS = 5
+
+
+class TokenBucket:
+    """
+    Token bucket that reserves units up front
+
+    Callers take their units immediately (the balance may go negative) and
+    sleep until the debt is repaid, so concurrent callers are served in
+    arrival order without a lock. ``pause`` blocks the bucket entirely after
+    the server reports a rate limit.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, units: float) -> float:
+        """Take units and return how long the caller must wait before using them"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= units
+        debt_delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(debt_delay, self.blocked_until - now, 0.0)
+
+    def pause(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class GmailQuota:
+    """Quota-unit rate limiting shared by every GmailService in the process"""
+
+    def __init__(self):
+        self._project: Optional[TokenBucket] = None
+        self._users: Dict[str, TokenBucket] = {}
+        self._user_stats: Dict[str, Dict[str, Any]] = {}
+        self.stats = self._new_stats()
+
+    @staticmethod
+    def _new_stats() -> Dict[str, Any]:
+        return {
+            "calls": 0,
+            "units": 0,
+            "throttled": 0,  # calls delayed locally by a token bucket
+            "throttle_wait_seconds": 0.0,
+            "rate_limited": 0,  # 429 / rateLimitExceeded responses from Gmail
+            "retried": 0,
+            "dropped": 0,  # requests given up on after all retries
+        }
+
+    def _project_bucket(self) -> TokenBucket:
+        # Created on first use so settings overridden after import still apply
+        if self._project is None:
+            self._project = TokenBucket(
+                settings.GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND,
+                settings.GMAIL_PROJECT_QUOTA_UNITS_PER_SECOND * settings.GMAIL_QUOTA_BURST_SECONDS
+            )
+        return self._project
+
+    def _user_bucket(self, key: str) -> TokenBucket:
+        if key not in self._users:
+            self._users[key] = TokenBucket(
+                settings.GMAIL_USER_QUOTA_UNITS_PER_SECOND,
+                settings.GMAIL_USER_QUOTA_UNITS_PER_SECOND * settings.GMAIL_QUOTA_BURST_SECONDS
+            )
+            self._user_stats[key] = self._new_stats()
+        return self._users[key]
+
+    def _count(self, key: str, field: str, amount=1):
+        self.stats[field] += amount
+        self._user_stats[key][field] += amount
+
+    @staticmethod
+    def cost_of(request: Any) -> int:
+        """Quota units for a googleapiclient HttpRequest"""
+        return METHOD_QUOTA_UNITS.get(getattr(request, "methodId", None), DEFAULT_QUOTA_UNITS)
+
+    async def acquire(self, key: str, units: int):
+        """
+        Wait until both the user's and the project's buckets allow ``units``
+
+        Args:
+            key: Per-user bucket key (user ID)
+            units: Quota units the call will consume
+        """
+        user_bucket = self._user_bucket(key)
+        delay = max(user_bucket.reserve(units), self._project_bucket().reserve(units))
+        self._count(key, "calls")
+        self._count(key, "units", units)
+        if delay > 0:
+            self._count(key, "throttled")
+            self._count(key, "throttle_wait_seconds", delay)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def is_rate_limit(exception: Exception) -> bool:
+        """Whether Gmail rejected a call for exceeding a rate limit"""
+        if not isinstance(exception, HttpError):
+            return False
+        status = exception.resp.status
+        return status == 429 or (status == 403 and "ratelimitexceeded" in str(exception).lower())
+
+    @staticmethod
+    def retry_after(exception: Exception) -> Optional[float]:
+        """Seconds from a Retry-After header, if the server sent one"""
+        resp = getattr(exception, "resp", None)
+        value = resp.get("retry-after") if hasattr(resp, "get") else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def backoff_delay(self, attempt: int, exception: Optional[Exception] = None) -> float:
+        """Exponential backoff with jitter, never shorter than the server's Retry-After"""
+        delay = min(settings.GMAIL_RETRY_BASE_DELAY * (2 ** attempt), settings.GMAIL_RETRY_MAX_DELAY)
+        delay *= random.uniform(0.5, 1.0)
+        retry_after = self.retry_after(exception) if exception is not None else None
+        return max(delay, retry_after or 0.0)
+
+    def record_rate_limited(self, key: str, delay: float):
+        """Gmail rate-limited this user: pause their bucket so every caller backs off"""
+        self._user_bucket(key)
+        self._count(key, "rate_limited")
+        self._users[key].pause(delay)
+
+    def record_retry(self, key: str, count: int = 1):
+        self._user_bucket(key)
+        self._count(key, "retried", count)
+
+    def record_dropped(self, key: str, count: int = 1):
+        self._user_bucket(key)
+        self._count(key, "dropped", count)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Global and per-user quota counters"""
+        return {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+            "users": {
+                key: {k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()}
+                for key, stats in self._user_stats.items()
+            },
+        }
+
+
+# Global Gmail quota limiter instance
+gmail_quota = GmailQuota()
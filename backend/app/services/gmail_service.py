@@ -4,16 +4,92 @@ Gmail API Integration Service
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import asyncio
 import base64
+import json
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+
+import httplib2
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, BinaryIO
 from datetime import datetime, timedelta
 from app.core.config import settings
+from app.services.gmail_quota import gmail_quota
+from app.utils.mime import extract_body, extract_attachments_info
 
 logger = logging.getLogger(__name__)
 
+# The batch endpoint accepts 100 sub-requests, but Google advises at most 50;
+# larger Gmail batches are prone to rateLimitExceeded errors
+GMAIL_BATCH_LIMIT = 50
+
+# Headers requested by the metadata-only first pass
+METADATA_HEADERS = ['From', 'To', 'Subject', 'Date']
+
+# HTTP statuses worth retrying for a failed batch sub-request
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# googleapiclient is blocking; every request runs on this shared, bounded pool
+gmail_executor = ThreadPoolExecutor(
+    max_workers=settings.GMAIL_EXECUTOR_THREADS,
+    thread_name_prefix="gmail"
+)
+
+
+# Base64 characters decoded per write when saving attachments (multiple of 4)
+ATTACHMENT_DECODE_CHUNK = 1024 * 1024
+
+
+def _write_base64url(data: str, file: BinaryIO) -> int:
+    """Decode base64url data into a file chunk by chunk"""
+    written = 0
+    for start in range(0, len(data), ATTACHMENT_DECODE_CHUNK):
+        chunk = data[start:start + ATTACHMENT_DECODE_CHUNK]
+        chunk += '=' * (-len(chunk) % 4)
+        written += file.write(base64.urlsafe_b64decode(chunk))
+    file.flush()
+    return written
+
+
+@lru_cache(maxsize=1)
+def gmail_discovery_document() -> Dict[str, Any]:
+    """Gmail v1 discovery document bundled with googleapiclient, parsed once per process"""
+    document = json.loads(get_static_doc('gmail', 'v1'))
+    if settings.GMAIL_API_ROOT_URL:
+        # Point every request (including batches) at another server, e.g. the local fake
+        root_url = settings.GMAIL_API_ROOT_URL.rstrip('/') + '/'
+        document['rootUrl'] = root_url
+        document['baseUrl'] = root_url + document['servicePath']
+        document['mtlsRootUrl'] = root_url
+    return document
+
+
+class HistoryExpiredError(Exception):
+    """Raised when a stored historyId is too old for users.history.list"""
+
+
+class _CountingHttp:
+    """Wrap an HTTP client and count response body bytes (used on one worker thread)"""
+    
+    def __init__(self, http: AuthorizedHttp):
+        self.http = http
+        self.bytes_received = 0
+    
+    def request(self, *args, **kwargs):
+        response, content = self.http.request(*args, **kwargs)
+        self.bytes_received += len(content or b'')
+        return response, content
+    
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
 
 class GmailService:
     """Gmail API service for fetching and managing emails"""
@@ -23,15 +99,23 @@ class GmailService:
         'https://www.googleapis.com/auth/gmail.modify'
     ]
     
-    def __init__(self, credentials: Optional[Credentials] = None):
+    def __init__(self, credentials: Optional[Credentials] = None, quota_key: str = "default"):
         """
         Initialize Gmail service
         
         Args:
             credentials: Google OAuth2 credentials
+            quota_key: Per-user quota bucket (the user ID)
         """
         self.credentials = credentials
+        self.quota_key = quota_key
         self.service = None
+        # API calls made, response bytes received and requests given up on
+        # after retries by this instance
+        self.stats = {"api_calls": 0, "bytes_received": 0, "dropped": 0}
+        # httplib2 connections are not thread-safe: one keep-alive connection pool per worker thread
+        self._local = threading.local()
+        self._semaphore: Optional[asyncio.Semaphore] = None
         if credentials:
             # Ensure credentials are valid and refresh if expired (requires client_id/secret present)
             try:
@@ -43,11 +127,80 @@ class GmailService:
                     except Exception as refresh_exc:
                         logger.exception("Failed to refresh Gmail credentials: %s", str(refresh_exc))
                         # Let the build fail below and surface the error when making API calls
-                self.service = build('gmail', 'v1', credentials=self.credentials)
+                # Static discovery document: no network fetch or re-parse per client
+                self.service = build_from_document(gmail_discovery_document(), credentials=self.credentials)
             except Exception as e:
                 logger.exception("Failed to initialize Gmail API client: %s", str(e))
                 self.service = None
     
+    def _http(self) -> "_CountingHttp":
+        """Authorized HTTP client for the current worker thread, reused across calls"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = _CountingHttp(
+                AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=settings.GMAIL_HTTP_TIMEOUT))
+            )
+            self._local.http = http
+        return http
+    
+    def _run_request(self, request: Any) -> Tuple[Any, int]:
+        """Execute a request on a worker thread; returns (response, bytes received)"""
+        http = self._http()
+        http.bytes_received = 0
+        response = request.execute(http=http)
+        return response, http.bytes_received
+    
+    async def _execute(self, request: Any, units: Optional[int] = None, retry: bool = True) -> Any:
+        """
+        Run a googleapiclient request (or batch) off the event loop
+        
+        Every call first takes its quota units from the user's and the
+        project's token buckets. At most GMAIL_MAX_CONCURRENCY requests per
+        user are in flight at once. Retryable failures are retried with
+        exponential backoff that honours Retry-After; a rate-limit response
+        also pauses the user's bucket so concurrent callers back off too.
+        
+        Args:
+            request: HttpRequest or BatchHttpRequest
+            units: Quota units (derived from the request's method if omitted)
+            retry: Retry failures here (batches handle retries per sub-request)
+            
+        Returns:
+            The decoded response (None for batches, which use callbacks)
+            
+        Raises:
+            Exception: The last error once retries are exhausted (counted as dropped)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.GMAIL_MAX_CONCURRENCY)
+        if units is None:
+            units = gmail_quota.cost_of(request)
+        loop = asyncio.get_running_loop()
+        max_retries = settings.GMAIL_MAX_RETRIES if retry else 0
+        
+        for attempt in range(max_retries + 1):
+            await gmail_quota.acquire(self.quota_key, units)
+            try:
+                async with self._semaphore:
+                    response, received = await loop.run_in_executor(gmail_executor, self._run_request, request)
+                self.stats["api_calls"] += 1
+                self.stats["bytes_received"] += received
+                return response
+            except Exception as e:
+                if not retry or not self._is_retryable(e):
+                    raise
+                if attempt == max_retries:
+                    self.stats["dropped"] += 1
+                    gmail_quota.record_dropped(self.quota_key)
+                    logger.error(f"Dropping Gmail request after {attempt + 1} attempts: {str(e)}")
+                    raise
+                delay = gmail_quota.backoff_delay(attempt, e)
+                if gmail_quota.is_rate_limit(e):
+                    gmail_quota.record_rate_limited(self.quota_key, delay)
+                gmail_quota.record_retry(self.quota_key)
+                logger.info(f"Retrying Gmail request in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+    
     @staticmethod
     def get_authorization_url() -> str:
         """
@@ -124,9 +277,119 @@ class GmailService:
             # Raise a clear error that will be logged by the route handler
             raise RuntimeError(f"Failed to fetch token from Google: {str(e)}")
     
+    @staticmethod
+    def _build_search_query(days: int, query: str = "") -> str:
+        """Build the Gmail search query for a look-back window"""
+        after_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
+        search_query = f"after:{after_date}"
+        if query:
+            search_query += f" {query}"
+        return search_query
+    
+    async def iter_message_id_pages(
+        self,
+        search_query: str,
+        page_size: Optional[int] = None
+    ) -> AsyncIterator[List[str]]:
+        """
+        Walk every page of messages.list, following nextPageToken
+        
+        The next page is listed in the background while the caller processes
+        the current one; at most GMAIL_LIST_PREFETCH_PAGES pages are buffered.
+        
+        Args:
+            search_query: Gmail search query
+            page_size: Message IDs per page (Gmail allows up to 500)
+            
+        Yields:
+            Lists of message IDs, one per page
+        """
+        page_size = min(page_size or settings.MAX_EMAILS_PER_FETCH, 500)
+        pages: asyncio.Queue = asyncio.Queue(maxsize=settings.GMAIL_LIST_PREFETCH_PAGES)
+        done = object()
+        
+        async def producer():
+            page_token = None
+            try:
+                while True:
+                    request = self.service.users().messages().list(
+                        userId='me',
+                        maxResults=page_size,
+                        q=search_query,
+                        pageToken=page_token
+                    )
+                    response = await self._execute(request)
+                    await pages.put([msg['id'] for msg in response.get('messages', [])])
+                    page_token = response.get('nextPageToken')
+                    if not page_token:
+                        break
+                await pages.put(done)
+            except Exception as e:
+                await pages.put(e)
+        
+        task = asyncio.create_task(producer())
+        try:
+            while True:
+                page = await pages.get()
+                if page is done:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                if page:
+                    yield page
+        finally:
+            task.cancel()
+    
+    async def iter_recent_message_ids(self, days: int = 7, query: str = "") -> AsyncIterator[List[str]]:
+        """Stream IDs of recent messages, one listed page at a time"""
+        if not self.service:
+            logger.error("Gmail service not initialized — cannot list emails")
+            return
+        async for message_ids in self.iter_message_id_pages(self._build_search_query(days, query)):
+            yield message_ids
+    
+    async def iter_recent_emails(
+        self,
+        days: int = 7,
+        query: str = "",
+        format: str = 'full'
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream recent emails page by page
+        
+        Memory stays bounded by one page of full messages plus the prefetch
+        buffer of message IDs, regardless of mailbox size.
+        
+        Args:
+            days: Number of days to look back
+            query: Gmail search query
+            format: 'full' or 'metadata' (see _get_email_details_batch)
+            
+        Yields:
+            Lists of email dictionaries, one per listed page
+        """
+        if not self.service:
+            logger.error("Gmail service not initialized — cannot fetch emails")
+            return
+        
+        async for message_ids in self.iter_message_id_pages(self._build_search_query(days, query)):
+            yield await self._get_email_details_batch(message_ids, format=format)
+    
+    async def iter_emails_by_ids(
+        self,
+        message_ids: List[str],
+        format: str = 'full'
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream details for known message IDs, one batch at a time"""
+        if not self.service:
+            return
+        batch_size = min(settings.GMAIL_BATCH_SIZE, GMAIL_BATCH_LIMIT)
+        for start in range(0, len(message_ids), batch_size):
+            yield await self._get_email_details_batch(message_ids[start:start + batch_size], format=format)
+    
     async def fetch_recent_emails(
         self, 
-        max_results: int = 100,
+        max_results: Optional[int] = None,
         days: int = 7,
         query: str = ""
     ) -> List[Dict[str, Any]]:
@@ -134,49 +397,120 @@ class GmailService:
         Fetch recent emails from Gmail
         
         Args:
-            max_results: Maximum number of emails to fetch
+            max_results: Maximum number of emails to fetch (None for all pages)
             days: Number of days to look back
             query: Gmail search query
             
         Returns:
             List of email dictionaries
         """
-        if not self.service:
-            logger.error("Gmail service not initialized — cannot fetch emails")
-            return []
-        
+        emails = []
         try:
-            # Calculate date filter
-            after_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
-            search_query = f"after:{after_date}"
-            if query:
-                search_query += f" {query}"
-            
-            # Fetch message IDs
-            results = self.service.users().messages().list(
-                userId='me',
-                maxResults=max_results,
-                q=search_query
-            ).execute()
-            
-            messages = results.get('messages', [])
-            emails = []
-            
-            # Fetch full message details
-            for msg in messages:
-                try:
-                    email_data = await self._get_email_details(msg['id'])
-                    if email_data:
-                        emails.append(email_data)
-                except Exception as e:
-                    logger.exception("Failed to fetch details for message %s: %s", msg.get('id'), str(e))
+            async for page in self.iter_recent_emails(days=days, query=query):
+                emails.extend(page)
+                if max_results and len(emails) >= max_results:
+                    emails = emails[:max_results]
+                    break
             
             logger.info(f"Fetched {len(emails)} emails from Gmail")
             return emails
             
         except Exception as e:
             logger.error(f"Error fetching emails: {str(e)}")
+            return emails
+    
+    async def fetch_emails_by_ids(self, message_ids: List[str], format: str = 'full') -> List[Dict[str, Any]]:
+        """Fetch messages for specific IDs ('metadata' first pass or 'full' second pass)"""
+        if not self.service or not message_ids:
             return []
+        return await self._get_email_details_batch(message_ids, format=format)
+    
+    async def get_profile(self) -> Optional[Dict[str, Any]]:
+        """Get the mailbox profile (emailAddress, historyId, message counts)"""
+        if not self.service:
+            return None
+        try:
+            return await self._execute(self.service.users().getProfile(userId='me'))
+        except Exception as e:
+            logger.error(f"Error getting Gmail profile: {str(e)}")
+            return None
+    
+    async def get_history_id(self) -> Optional[str]:
+        """Get the mailbox's current historyId"""
+        profile = await self.get_profile()
+        return profile.get('historyId') if profile else None
+    
+    async def watch(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Register (or renew) push notifications for the mailbox
+        
+        Args:
+            topic_name: Cloud Pub/Sub topic Gmail publishes changes to
+            label_ids: Only notify for changes to these labels
+            
+        Returns:
+            Dict with the mailbox historyId and the watch expiration (epoch ms)
+        """
+        if not self.service:
+            raise RuntimeError("Gmail service not initialized")
+        body = {'topicName': topic_name, 'labelFilterBehavior': 'include', 'labelIds': label_ids or ['INBOX']}
+        return await self._execute(self.service.users().watch(userId='me', body=body))
+    
+    async def stop_watch(self) -> bool:
+        """Stop push notifications for the mailbox"""
+        try:
+            await self._execute(self.service.users().stop(userId='me'))
+            return True
+        except Exception as e:
+            logger.error(f"Error stopping Gmail watch: {str(e)}")
+            return False
+    
+    async def list_history_message_ids(self, start_history_id: str) -> Tuple[List[str], str]:
+        """
+        List messages added since a historyId
+        
+        Args:
+            start_history_id: historyId stored after the previous sync
+            
+        Returns:
+            Tuple of (added message IDs, latest historyId)
+            
+        Raises:
+            HistoryExpiredError: The historyId is no longer available (HTTP 404)
+        """
+        if not self.service:
+            raise RuntimeError("Gmail service not initialized")
+        
+        message_ids = []
+        latest_history_id = start_history_id
+        page_token = None
+        
+        while True:
+            try:
+                response = await self._execute(self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    pageToken=page_token,
+                    maxResults=500
+                ))
+            except HttpError as e:
+                if e.resp.status == 404:
+                    raise HistoryExpiredError(start_history_id) from e
+                raise
+            
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    if 'DRAFT' not in message.get('labelIds', []):
+                        message_ids.append(message['id'])
+            
+            latest_history_id = response.get('historyId', latest_history_id)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        return list(dict.fromkeys(message_ids)), latest_history_id
     
     async def _get_email_details(self, message_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -189,78 +523,203 @@ class GmailService:
             Dictionary with email details
         """
         try:
-            message = self.service.users().messages().get(
+            message = await self._execute(self.service.users().messages().get(
                 userId='me',
                 id=message_id,
                 format='full'
-            ).execute()
+            ))
             
-            headers = message['payload']['headers']
-            header_dict = {h['name'].lower(): h['value'] for h in headers}
+            return self._parse_message(message)
             
-            # Extract email body
-            body = self._extract_body(message['payload'])
+        except Exception as e:
+            logger.error(f"Error getting email details for {message_id}: {str(e)}")
+            return None
+    
+    async def _get_email_details_batch(
+        self,
+        message_ids: List[str],
+        format: str = 'full'
+    ) -> List[Dict[str, Any]]:
+        """
+        Get details for many emails through Gmail's HTTP batch endpoint
+        
+        Sub-requests are sent in batches of up to GMAIL_BATCH_SIZE, with the
+        batches of one round running concurrently (bounded by the per-user
+        limit in _execute). Only the sub-requests that failed with a retryable
+        status are retried, with Retry-After-aware exponential backoff;
+        permanent failures are logged and skipped, and messages still failing
+        after the last retry are counted as dropped.
+        
+        Args:
+            message_ids: Gmail message IDs
+            format: 'full' for complete messages, 'metadata' for headers,
+                labels, snippet and size estimate only
             
-            # Extract attachments info
-            attachments = self._extract_attachments_info(message['payload'])
+        Returns:
+            List of email dictionaries, in the order of ``message_ids``
+        """
+        messages: Dict[str, Dict[str, Any]] = {}
+        pending = list(dict.fromkeys(message_ids))
+        batch_size = min(settings.GMAIL_BATCH_SIZE, GMAIL_BATCH_LIMIT)
+        
+        for attempt in range(settings.GMAIL_BATCH_MAX_RETRIES + 1):
+            retry = []
+            # Callbacks run on executor threads; only collect results there
+            failures = []
             
-            email_data = {
-                'gmail_id': message['id'],
-                'thread_id': message.get('threadId'),
-                'sender': header_dict.get('from', 'Unknown'),
-                'recipient': header_dict.get('to', ''),
-                'subject': header_dict.get('subject', 'No Subject'),
-                'timestamp': datetime.fromtimestamp(int(message['internalDate']) / 1000),
-                'content': body,
-                'attachments': attachments,
-                'labels': message.get('labelIds', [])
-            }
+            def callback(request_id, response, exception):
+                if exception is None:
+                    messages[request_id] = response
+                else:
+                    failures.append((request_id, exception))
             
-            return email_data
+            async def send(chunk):
+                batch = self.service.new_batch_http_request(callback=callback)
+                units = 0
+                for message_id in chunk:
+                    if format == 'metadata':
+                        request = self.service.users().messages().get(
+                            userId='me', id=message_id, format=format, metadataHeaders=METADATA_HEADERS
+                        )
+                    else:
+                        request = self.service.users().messages().get(userId='me', id=message_id, format=format)
+                    batch.add(request, request_id=message_id)
+                    units += gmail_quota.cost_of(request)
+                try:
+                    await self._execute(batch, units=units, retry=False)
+                except Exception as e:
+                    # Whole batch call failed (network, auth); retry every sub-request in it
+                    logger.warning(f"Gmail batch request failed: {str(e)}")
+                    failures.extend((mid, e) for mid in chunk if mid not in messages)
             
-        except Exception as e:
-            logger.error(f"Error getting email details for {message_id}: {str(e)}")
-            return None
+            await asyncio.gather(*(
+                send(pending[start:start + batch_size])
+                for start in range(0, len(pending), batch_size)
+            ))
+            retry_errors = []
+            for request_id, exception in failures:
+                if self._is_retryable(exception):
+                    retry.append(request_id)
+                    retry_errors.append(exception)
+                else:
+                    logger.error(f"Error getting email details for {request_id}: {str(exception)}")
+            
+            if not retry:
+                break
+            
+            pending = retry
+            if attempt < settings.GMAIL_BATCH_MAX_RETRIES:
+                delay = max(gmail_quota.backoff_delay(attempt, e) for e in retry_errors)
+                if any(gmail_quota.is_rate_limit(e) for e in retry_errors):
+                    gmail_quota.record_rate_limited(self.quota_key, delay)
+                gmail_quota.record_retry(self.quota_key, len(pending))
+                logger.info(f"Retrying {len(pending)} failed Gmail sub-requests in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                self.stats["dropped"] += len(pending)
+                gmail_quota.record_dropped(self.quota_key, len(pending))
+                logger.error(f"Dropping {len(pending)} Gmail messages after {attempt + 1} attempts")
+        
+        parse = self._parse_metadata if format == 'metadata' else self._parse_message
+        emails = []
+        for message_id in message_ids:
+            if message_id in messages:
+                try:
+                    emails.append(parse(messages[message_id]))
+                except Exception as e:
+                    logger.error(f"Error parsing email {message_id}: {str(e)}")
+        return emails
+    
+    @staticmethod
+    def _is_retryable(exception: Exception) -> bool:
+        """Whether a failed Gmail call is worth retrying"""
+        if isinstance(exception, HttpError):
+            status = exception.resp.status
+            if status in RETRYABLE_STATUSES:
+                return True
+            # Gmail reports per-user rate limiting as 403 rateLimitExceeded
+            return status == 403 and 'ratelimitexceeded' in str(exception).lower()
+        # Network-level failures (resets, timeouts, DNS)
+        return isinstance(exception, (OSError, httplib2.HttpLib2Error))
+    
+    def _parse_metadata(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a format='metadata' message resource into a metadata dictionary"""
+        headers = message.get('payload', {}).get('headers', [])
+        header_dict = {h['name'].lower(): h['value'] for h in headers}
+        
+        return {
+            'gmail_id': message['id'],
+            'thread_id': message.get('threadId'),
+            'sender': header_dict.get('from', 'Unknown'),
+            'recipient': header_dict.get('to', ''),
+            'subject': header_dict.get('subject', 'No Subject'),
+            'timestamp': datetime.fromtimestamp(int(message['internalDate']) / 1000),
+            'snippet': message.get('snippet', ''),
+            'labels': message.get('labelIds', []),
+            'size_estimate': message.get('sizeEstimate', 0)
+        }
+    
+    def _parse_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a Gmail API message resource into an email dictionary"""
+        headers = message['payload']['headers']
+        header_dict = {h['name'].lower(): h['value'] for h in headers}
+        
+        # Extract email body
+        body = self._extract_body(message['payload'])
+        
+        # Extract attachments info
+        attachments = self._extract_attachments_info(message['payload'])
+        
+        return {
+            'gmail_id': message['id'],
+            'thread_id': message.get('threadId'),
+            'sender': header_dict.get('from', 'Unknown'),
+            'recipient': header_dict.get('to', ''),
+            'subject': header_dict.get('subject', 'No Subject'),
+            'timestamp': datetime.fromtimestamp(int(message['internalDate']) / 1000),
+            'content': body,
+            'attachments': attachments,
+            'labels': message.get('labelIds', [])
+        }
     
     def _extract_body(self, payload: Dict) -> str:
-        """Extract email body from payload"""
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body'].get('data', '')
-                    if data:
-                        return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-        
-        # Single part message
-        if 'body' in payload and 'data' in payload['body']:
-            data = payload['body']['data']
-            return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-        
-        return ""
+        """Extract email body from payload, preferring text/plain over text/html"""
+        return extract_body(payload)
     
     def _extract_attachments_info(self, payload: Dict) -> List[Dict[str, Any]]:
-        """Extract attachment information"""
-        attachments = []
-        
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part.get('filename'):
-                    attachments.append({
-                        'filename': part['filename'],
-                        'mime_type': part['mimeType'],
-                        'size': part['body'].get('size', 0)
-                    })
-        
-        return attachments
+        """Extract attachment information, including attachments in nested parts"""
+        return extract_attachments_info(payload)
+    
+    async def download_attachment(self, message_id: str, attachment_id: str, file: BinaryIO) -> int:
+        """
+        Download an attachment with attachments.get and write it to a file
+        
+        The base64url payload is decoded and written in chunks on the Gmail
+        worker pool, so the event loop never holds or decodes the body.
+        
+        Args:
+            message_id: Gmail message ID
+            attachment_id: Attachment ID from the message payload
+            file: Binary file object to write to
+            
+        Returns:
+            Number of bytes written
+        """
+        request = self.service.users().messages().attachments().get(
+            userId='me', messageId=message_id, id=attachment_id
+        )
+        response = await self._execute(request)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(gmail_executor, _write_base64url, response.get('data', ''), file)
     
     async def mark_as_read(self, message_id: str) -> bool:
         """Mark email as read"""
         try:
-            self.service.users().messages().modify(
+            await self._execute(self.service.users().messages().modify(
                 userId='me',
                 id=message_id,
                 body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+            ))
             return True
         except Exception as e:
             logger.error(f"Error marking email as read: {str(e)}")
@@ -0,0 +1,566 @@
+"""
+Ingest Pipeline
+Staged, backpressured ingest of a mailbox sync:
+list -> dedupe -> fetch -> normalize -> categorize -> persist -> index
+
+Each stage reads from a bounded asyncio queue and runs its own number of
+workers, so Gmail I/O runs ahead of the LLM-bound categorize stage while
+full queues stop fast stages from buffering an unbounded backlog.
+
+The categorize queue hands out the highest triage pre-score first and the
+persist queue the highest categorized priority first, so likely-urgent mail
+isn't stuck behind a backlog of newsletters.
+"""
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.bulk import insert_emails
+from app.db.models import EmailRecord, User, generate_uuid
+from app.services.gmail_service import GmailService
+from app.services.ai_categorizer import EmailCategorizer
+from app.services.attachment_processor import attachment_processor
+from app.services.entity_extractor import EntityExtractor, entity_extractor
+from app.services.rag_service import rag_service
+from app.services.triage import pre_score
+from app.utils.text_normalizer import EmailNormalizer
+from app.utils.stage_timer import StageTimer
+from app.utils.stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+# Messages with these labels are not stored at all
+SKIP_LABELS = {"SPAM", "TRASH", "DRAFT"}
+
+# Bulk-mail tabs are stored from metadata only; their body is fetched on demand
+METADATA_ONLY_LABELS = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_FORUMS"}
+
+STAGES = ("list", "dedupe", "fetch", "normalize", "categorize", "persist", "index")
+
+# Number of finished pipeline runs kept for the metrics endpoint
+RECENT_RUNS = 20
+
+# End-of-stream marker; one is queued per downstream worker
+_DONE = object()
+
+# Persist order of categorized priorities (metadata-only rows last)
+PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+
+def filter_unseen_ids(db: Session, message_ids: List[str], chunk_size: int = None) -> List[str]:
+    """
+    Drop message IDs that are already stored, with one set-based query per chunk
+
+    Args:
+        db: Database session
+        message_ids: Listed Gmail message IDs
+        chunk_size: IDs per IN (...) query, kept under driver parameter limits
+
+    Returns:
+        IDs not yet in EmailRecord.gmail_id, in listing order
+    """
+    chunk_size = chunk_size or settings.KNOWN_ID_CHUNK_SIZE
+    known = set()
+    for start in range(0, len(message_ids), chunk_size):
+        chunk = message_ids[start:start + chunk_size]
+        known.update(
+            gmail_id for (gmail_id,) in db.query(EmailRecord.gmail_id).filter(EmailRecord.gmail_id.in_(chunk))
+        )
+    return [message_id for message_id in message_ids if message_id not in known]
+
+
+def triage(metadata: Dict[str, Any]) -> str:
+    """
+    Decide how far to process a message from its metadata
+
+    Returns:
+        'skip', 'metadata_only' or 'categorize'
+    """
+    labels = set(metadata.get('labels') or [])
+    if labels & SKIP_LABELS:
+        return 'skip'
+    if labels & METADATA_ONLY_LABELS:
+        return 'metadata_only'
+    return 'categorize'
+
+
+def normalize_email(email_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize the body once; reused by categorizer, summarizer and embedder"""
+    normalized = EmailNormalizer.normalize(email_data['content'])
+    email_data['normalized_content'] = normalized['text']
+    email_data['raw_token_count'] = normalized['raw_tokens']
+    email_data['normalized_token_count'] = normalized['normalized_tokens']
+    return email_data
+
+
+def build_metadata_row(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Row for a low-value message stored without its body or an LLM call"""
+    return {
+        "id": generate_uuid(),
+        "gmail_id": metadata['gmail_id'],
+        "thread_id": metadata['thread_id'],
+        "sender": metadata['sender'],
+        "recipient": metadata['recipient'],
+        "subject": metadata['subject'],
+        "timestamp": metadata['timestamp'],
+        "content": None,  # fetched lazily by the detail view
+        "normalized_content": metadata['snippet'],
+        "raw_token_count": None,
+        "normalized_token_count": None,
+        "summary": metadata['snippet'],
+        "category": "Other",
+        "priority": "low",
+        "entities": {},
+        "attachments": [],
+        "confidence_score": 0.0,
+        "categorizer_version": None,
+    }
+
+
+def build_email_row(email_data: Dict[str, Any], ai_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Row for a fully processed (normalized and categorized) email; same keys as build_metadata_row"""
+    return {
+        "id": generate_uuid(),
+        "gmail_id": email_data['gmail_id'],
+        "thread_id": email_data['thread_id'],
+        "sender": email_data['sender'],
+        "recipient": email_data['recipient'],
+        "subject": email_data['subject'],
+        "timestamp": email_data['timestamp'],
+        "content": email_data['content'],
+        "normalized_content": email_data['normalized_content'],
+        "raw_token_count": email_data['raw_token_count'],
+        "normalized_token_count": email_data['normalized_token_count'],
+        "summary": ai_result['summary'],
+        "category": ai_result['category'],
+        "priority": ai_result['priority'],
+        "entities": ai_result['entities'],
+        "attachments": email_data['attachments'],
+        "confidence_score": ai_result.get('confidence', 0.0),
+        # Unstamped rows are picked up again by the re-categorization job
+        "categorizer_version": None if ai_result.get('failed') else EmailCategorizer.PROMPT_VERSION,
+    }
+
+
+class RankedQueue(asyncio.PriorityQueue):
+    """
+    Bounded queue that hands out the lowest-ranked item first, FIFO among equal ranks
+
+    End-of-stream markers always come after every queued item.
+    """
+
+    def __init__(self, maxsize: int, rank: Callable[[Any], float]):
+        super().__init__(maxsize)
+        self._rank = rank
+        self._sequence = itertools.count()
+
+    def _put(self, item):
+        key = (1, 0) if item is _DONE else (0, self._rank(item))
+        heapq.heappush(self._queue, (key, next(self._sequence), item))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[2]
+
+
+class StageMetrics:
+    """Throughput, utilization and input-queue depth of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int, queue: Optional[asyncio.Queue]):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # time spent waiting for room in the next stage's queue
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def sample_depth(self):
+        if self.queue is None:
+            return
+        depth = self.queue.qsize()
+        self.depth_samples += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def snapshot(self, elapsed: float) -> Dict[str, Any]:
+        working = max(self.busy_seconds - self.blocked_seconds, 0.0)
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "items_per_second": round(self.items / elapsed, 2) if elapsed else 0.0,
+            # Fraction of worker time spent doing work rather than waiting on either queue
+            "utilization": round(working / (elapsed * self.workers), 3) if elapsed else 0.0,
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "queue": {
+                "maxsize": self.queue.maxsize if self.queue is not None else None,
+                "depth": self.queue.qsize() if self.queue is not None else None,
+                "depth_avg": round(self.depth_total / self.depth_samples, 2) if self.depth_samples else 0.0,
+                "depth_max": self.depth_max,
+            },
+        }
+
+
+class IngestPipeline:
+    """
+    Run one sync's ingest as concurrent stages connected by bounded queues
+
+    - list: pages of message IDs from the sync plan
+    - dedupe: drop IDs already stored (one set query per page)
+    - fetch: metadata, triage, full bodies and attachments per page
+    - normalize: body normalization and batched local entity extraction
+    - categorize: one LLM (or local) categorization per email, highest pre-score first
+    - persist: bulk insert (ON CONFLICT DO NOTHING) with periodic commits, high priority first
+    - index: embed committed records into the vector index
+    """
+
+    def __init__(
+        self,
+        gmail_service: GmailService,
+        db: Session,
+        user: User,
+        timer: Optional[StageTimer] = None,
+        fetch_workers: Optional[int] = None,
+        categorize_workers: Optional[int] = None,
+        index_emails: Optional[bool] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        self.gmail_service = gmail_service
+        self.db = db
+        self.user = user
+        self.timer = timer or StageTimer()
+        self.index_emails = settings.SYNC_INDEX_EMAILS if index_emails is None else index_emails
+        self.on_progress = on_progress
+        self.workers = {
+            "list": 1,
+            "dedupe": 1,
+            "fetch": fetch_workers or settings.INGEST_FETCH_WORKERS,
+            "normalize": 1,
+            "categorize": categorize_workers or settings.CATEGORIZATION_CONCURRENCY,
+            "persist": 1,  # the session is not shared between concurrent writers
+            "index": 1,
+        }
+        page_queue = settings.INGEST_PAGE_QUEUE_SIZE
+        email_queue = settings.INGEST_EMAIL_QUEUE_SIZE
+        self.triage_ordering = settings.SYNC_TRIAGE_ORDERING
+        self.queues: Dict[str, asyncio.Queue] = {
+            "dedupe": asyncio.Queue(maxsize=page_queue),
+            "fetch": asyncio.Queue(maxsize=page_queue),
+            "normalize": asyncio.Queue(maxsize=page_queue),
+            "categorize": RankedQueue(email_queue, rank=lambda email_data: -email_data['pre_score'])
+            if self.triage_ordering else asyncio.Queue(maxsize=email_queue),
+            "persist": RankedQueue(email_queue, rank=lambda row: PRIORITY_RANK.get(row['priority'], len(PRIORITY_RANK)))
+            if self.triage_ordering else asyncio.Queue(maxsize=email_queue),
+            "index": asyncio.Queue(maxsize=email_queue),
+        }
+        self.metrics = {
+            stage: StageMetrics(stage, self.workers[stage], self.queues.get(stage)) for stage in STAGES
+        }
+        self.stats = {
+            "listed": 0, "known": 0, "fetched": 0, "skipped": 0, "metadata_only": 0, "added": 0,
+            "inserted": 0, "conflicts": 0, "failed": 0, "indexed": 0, "high_priority": 0,
+        }
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.first_high_priority_at: Optional[float] = None
+        self._dropped_before = 0
+
+    async def _emit(self, stage: str, next_stage: str, item: Any):
+        """Hand an item downstream, recording time blocked by backpressure"""
+        queue = self.queues[next_stage]
+        if queue.full():
+            started = time.perf_counter()
+            await queue.put(item)
+            self.metrics[stage].blocked_seconds += time.perf_counter() - started
+        else:
+            queue.put_nowait(item)
+
+    async def _finish(self, next_stage: str):
+        for _ in range(self.workers[next_stage]):
+            await self.queues[next_stage].put(_DONE)
+
+    async def _worker(self, stage: str, handler: Callable[[Any], Awaitable[None]]):
+        queue = self.queues[stage]
+        metrics = self.metrics[stage]
+        while True:
+            metrics.sample_depth()
+            item = await queue.get()
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            await handler(item)
+            metrics.busy_seconds += time.perf_counter() - started
+            metrics.items += 1
+
+    async def _run_stage(self, stage: str, handler: Callable[[Any], Awaitable[None]], next_stage: Optional[str]):
+        await asyncio.gather(*(self._worker(stage, handler) for _ in range(self.workers[stage])))
+        if next_stage:
+            await self._finish(next_stage)
+
+    async def _get_batch(self, stage: str, limit: int) -> Tuple[List[Any], bool]:
+        """Wait for one item, then take whatever else is already queued (up to ``limit``)"""
+        queue = self.queues[stage]
+        self.metrics[stage].sample_depth()
+        item = await queue.get()
+        if item is _DONE:
+            return [], True
+        items = [item]
+        while len(items) < limit and not queue.empty():
+            item = queue.get_nowait()
+            if item is _DONE:
+                return items, True
+            items.append(item)
+        return items, False
+
+    # -- stages -------------------------------------------------------------
+
+    async def _list(self, id_pages):
+        metrics = self.metrics["list"]
+        pages = id_pages.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                message_ids = await pages.__anext__()
+            except StopAsyncIteration:
+                break
+            elapsed = time.perf_counter() - started
+            self.timer.record("list", elapsed)
+            metrics.busy_seconds += elapsed
+            metrics.items += len(message_ids)
+            self.stats["listed"] += len(message_ids)
+            await self._emit("list", "dedupe", message_ids)
+        await self._finish("dedupe")
+
+    async def _dedupe(self, message_ids: List[str]):
+        # Known IDs never reach the Gmail detail stage
+        with self.timer.stage("dedupe"):
+            unseen_ids = filter_unseen_ids(self.db, message_ids)
+        self.stats["known"] += len(message_ids) - len(unseen_ids)
+        if unseen_ids:
+            await self._emit("dedupe", "fetch", unseen_ids)
+
+    async def _fetch(self, message_ids: List[str]):
+        with self.timer.stage("fetch_metadata"):
+            metadata_list = await self.gmail_service.fetch_emails_by_ids(message_ids, format='metadata')
+        self.stats["fetched"] += len(metadata_list)
+
+        to_categorize = []
+        for metadata in metadata_list:
+            decision = triage(metadata)
+            if decision == 'categorize':
+                to_categorize.append(metadata['gmail_id'])
+            elif decision == 'metadata_only':
+                self.stats["metadata_only"] += 1
+                await self._emit("fetch", "persist", build_metadata_row(metadata))
+            else:
+                self.stats["skipped"] += 1
+
+        # Second phase: full bodies only for messages that will be categorized
+        if not to_categorize:
+            return
+        with self.timer.stage("fetch_full"):
+            full_emails = await self.gmail_service.fetch_emails_by_ids(to_categorize)
+        with self.timer.stage("attachments"):
+            await attachment_processor.process_emails(self.gmail_service, full_emails)
+        if full_emails:
+            await self._emit("fetch", "normalize", full_emails)
+
+    async def _normalize(self, emails: List[Dict[str, Any]]):
+        with self.timer.stage("normalize"):
+            for email_data in emails:
+                normalize_email(email_data)
+        # Extract entities locally in one nlp.pipe batch; the LLM fills the gaps
+        with self.timer.stage("extract"):
+            local_entities = await entity_extractor.extract_batch_async(
+                [EntityExtractor.email_text(email_data) for email_data in emails]
+            )
+        for email_data, entities in zip(emails, local_entities):
+            email_data['entities'] = entities
+            email_data['pre_score'] = pre_score(email_data, self.user.email)
+        if self.triage_ordering:
+            # Even while the categorize queue is full, the page's most urgent emails go in first
+            emails = sorted(emails, key=lambda email_data: -email_data['pre_score'])
+        for email_data in emails:
+            await self._emit("normalize", "categorize", email_data)
+
+    async def _categorize(self, email_data: Dict[str, Any]):
+        with self.timer.stage("categorize"):
+            ai_result = await EmailCategorizer.categorize_email(email_data)
+        self.stats["added"] += 1
+        await self._emit("categorize", "persist", build_email_row(email_data, ai_result))
+
+    async def _persist(self):
+        metrics = self.metrics["persist"]
+        done = False
+        while not done:
+            rows, done = await self._get_batch("persist", settings.GMAIL_BATCH_SIZE)
+            if not rows:
+                continue
+            started = time.perf_counter()
+            with self.timer.stage("persist"):
+                # Commits every EMAIL_BATCH_SIZE rows; messages stored meanwhile are skipped
+                result = insert_emails(self.db, rows)
+            metrics.busy_seconds += time.perf_counter() - started
+            metrics.items += len(rows)
+            self.stats["inserted"] += result["inserted"]
+            self.stats["conflicts"] += result["skipped"]
+            self.stats["failed"] += result["failed"]
+            high_priority = sum(
+                1 for row in rows if row["priority"] == "high" and row["gmail_id"] in result["inserted_ids"]
+            )
+            if high_priority:
+                self.stats["high_priority"] += high_priority
+                if self.first_high_priority_at is None:
+                    self.first_high_priority_at = time.perf_counter()
+            if self.index_emails:
+                for row in rows:
+                    if row["gmail_id"] in result["inserted_ids"]:
+                        # Transient record: only read by the embedding text builder
+                        await self._emit("persist", "index", EmailRecord(**row))
+        await self._finish("index")
+
+    async def _index(self):
+        metrics = self.metrics["index"]
+        done = False
+        while not done:
+            records, done = await self._get_batch("index", settings.INGEST_EMAIL_QUEUE_SIZE)
+            if not records:
+                continue
+            started = time.perf_counter()
+            with self.timer.stage("index"):
+                self.stats["indexed"] += await rag_service.add_emails(records)
+            metrics.busy_seconds += time.perf_counter() - started
+            metrics.items += len(records)
+
+    async def run(self, id_pages) -> Dict[str, Any]:
+        """
+        Ingest every page of message IDs
+
+        Args:
+            id_pages: Async iterator of message ID lists (from plan_changed_emails)
+
+        Returns:
+            Ingest counters: listed, known, skipped (by label), metadata_only and
+            added (processed), inserted / conflicts / failed (rows written, already
+            stored, rejected), indexed, high_priority (stored high-priority emails)
+            and time_to_first_high_priority_seconds
+        """
+        self.started_at = time.perf_counter()
+        self._dropped_before = self.gmail_service.stats.get("dropped", 0)
+        ingest_monitor.register(self)
+        reporter = asyncio.ensure_future(self._report_progress()) if self.on_progress else None
+        tasks = [
+            asyncio.ensure_future(coro) for coro in (
+                self._list(id_pages),
+                self._run_stage("dedupe", self._dedupe, "fetch"),
+                self._run_stage("fetch", self._fetch, "normalize"),
+                self._run_stage("normalize", self._normalize, "categorize"),
+                self._run_stage("categorize", self._categorize, "persist"),
+                self._persist(),
+                self._index(),
+            )
+        ]
+        try:
+            # Fail fast: one broken stage would otherwise leave the others blocked on their queues
+            finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in finished:
+                if task.exception():
+                    raise task.exception()
+            if self.on_progress:
+                await self.on_progress(self.progress())
+            return {**self.stats, "time_to_first_high_priority_seconds": self.time_to_first_high_priority()}
+        finally:
+            if reporter:
+                reporter.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.finished_at = time.perf_counter()
+            ingest_monitor.unregister(self)
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(settings.SYNC_JOB_PROGRESS_INTERVAL)
+            try:
+                await self.on_progress(self.progress())
+            except Exception as e:
+                logger.warning(f"Failed to report sync progress: {str(e)}")
+
+    def time_to_first_high_priority(self) -> Optional[float]:
+        """Seconds from pipeline start until the first high-priority email was stored"""
+        if self.first_high_priority_at is None or self.started_at is None:
+            return None
+        return round(self.first_high_priority_at - self.started_at, 3)
+
+    def progress(self) -> Dict[str, Any]:
+        """Per-stage progress counts and current throughput, for live progress reporting"""
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at if self.started_at else 0.0
+        stats = self.stats
+        return {
+            "listed": stats["listed"],
+            "fetched": stats["fetched"],
+            "skipped": stats["known"] + stats["skipped"] + stats["conflicts"],
+            "categorized": stats["added"],
+            "persisted": stats["inserted"],
+            "indexed": stats["indexed"],
+            "high_priority": stats["high_priority"],
+            "time_to_first_high_priority_seconds": self.time_to_first_high_priority(),
+            "errors": stats["failed"] + self.gmail_service.stats.get("dropped", 0) - self._dropped_before,
+            "elapsed_seconds": round(elapsed, 2),
+            "throughput": {
+                "listed_per_second": round(stats["listed"] / elapsed, 2) if elapsed else 0.0,
+                "persisted_per_second": round(stats["inserted"] / elapsed, 2) if elapsed else 0.0,
+            },
+            "queue_depth": {stage: queue.qsize() for stage, queue in self.queues.items()},
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus per-stage throughput, utilization and queue depth"""
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "user_id": self.user.id,
+            "running": self.started_at is not None and self.finished_at is None,
+            "elapsed_seconds": round(elapsed, 3),
+            **self.stats,
+            "time_to_first_high_priority_seconds": self.time_to_first_high_priority(),
+            "stages": {stage: self.metrics[stage].snapshot(elapsed) for stage in STAGES},
+        }
+
+
+class IngestMonitor:
+    """Running and recently finished pipelines, for the metrics endpoint"""
+
+    def __init__(self):
+        self._running: Dict[int, IngestPipeline] = {}
+        self._recent = deque(maxlen=RECENT_RUNS)
+
+    def register(self, pipeline: IngestPipeline):
+        self._running[id(pipeline)] = pipeline
+
+    def unregister(self, pipeline: IngestPipeline):
+        self._running.pop(id(pipeline), None)
+        self._recent.append(pipeline.snapshot())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": [pipeline.snapshot() for pipeline in self._running.values()],
+            "recent": list(self._recent),
+            # Recent runs that stored at least one high-priority email
+            "time_to_first_high_priority_ms": summarize_ms(
+                run["time_to_first_high_priority_seconds"] for run in self._recent
+                if run["time_to_first_high_priority_seconds"] is not None
+            ),
+        }
+
+
+# Global ingest pipeline monitor instance
+ingest_monitor = IngestMonitor()
@@ -0,0 +1,254 @@
+"""
+LLM Call Guard
+Per-call deadlines, p95-based hedged requests and circuit breakers for OpenAI
+call sites, with tail-latency statistics
+"""
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Optional
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.services.llm_scheduler import llm_scheduler, Priority
+from app.utils.stats import percentile, summarize_ms
+
+logger = logging.getLogger(__name__)
+
+# Number of recent latencies kept per call site
+LATENCY_SAMPLE_SIZE = 500
+
+# Hedging only uses the measured p95 once this many samples exist
+MIN_SAMPLES_FOR_HEDGE_P95 = 20
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call site's circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding time window"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_threshold: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        window_seconds: Optional[float] = None,
+        cooldown_seconds: Optional[float] = None
+    ):
+        self.error_threshold = error_threshold or settings.LLM_BREAKER_ERROR_THRESHOLD
+        self.min_calls = min_calls or settings.LLM_BREAKER_MIN_CALLS
+        self.window_seconds = window_seconds or settings.LLM_BREAKER_WINDOW_SECONDS
+        self.cooldown_seconds = cooldown_seconds or settings.LLM_BREAKER_COOLDOWN_SECONDS
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._outcomes = deque()  # (timestamp, success)
+        self._trial_in_flight = False
+
+    def _trim(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def error_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def allow(self) -> bool:
+        """Whether a call may go through right now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            # Let exactly one trial call probe the provider
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+            if success:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, success))
+        self._trim(now)
+        if (
+            self.state == self.CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and self.error_rate() >= self.error_threshold
+        ):
+            self._open(now)
+
+    def release_trial(self):
+        """Forget a half-open trial call that was cancelled before finishing"""
+        self._trial_in_flight = False
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        logger.warning(f"LLM circuit breaker opened (error rate {self.error_rate():.0%})")
+
+
+class CallSiteStats:
+    """Latency and outcome counters for one call site"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_SAMPLES_FOR_HEDGE_P95:
+            return None
+        return percentile(sorted(self.latencies), 0.95)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rejected_by_breaker": self.rejected,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "latency_ms": summarize_ms(self.latencies),
+        }
+
+
+class LLMGuard:
+    """Wrap OpenAI calls with deadlines, hedging and circuit breaking"""
+
+    def __init__(self):
+        self._stats: Dict[str, CallSiteStats] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _site(self, name: str):
+        if name not in self._stats:
+            self._stats[name] = CallSiteStats()
+            self._breakers[name] = CircuitBreaker()
+        return self._stats[name], self._breakers[name]
+
+    @staticmethod
+    def default_deadline(priority: Priority) -> float:
+        if priority == Priority.INTERACTIVE:
+            return settings.LLM_INTERACTIVE_TIMEOUT
+        return settings.LLM_BULK_TIMEOUT
+
+    @staticmethod
+    async def _run_once(factory: Callable[[], Awaitable[Any]], priority: Priority):
+        async with llm_scheduler.slot(priority):
+            return await factory()
+
+    async def _run_hedged(self, stats: CallSiteStats, factory: Callable[[], Awaitable[Any]], priority: Priority):
+        """Start a duplicate request if the first is slower than the site's p95"""
+        hedge_delay = max(stats.p95() or settings.LLM_HEDGE_DEFAULT_DELAY, settings.LLM_HEDGE_MIN_DELAY)
+
+        primary = asyncio.ensure_future(self._run_once(factory, priority))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        stats.hedges_fired += 1
+        hedge = asyncio.ensure_future(self._run_once(factory, priority))
+        pending = {primary, hedge}
+        first_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            stats.hedges_won += 1
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+
+    async def call(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.BULK,
+        deadline: Optional[float] = None,
+        hedge: bool = False
+    ) -> Any:
+        """
+        Run one guarded LLM call
+
+        Args:
+            name: Call site name (stats and breaker are kept per site)
+            factory: Zero-arg callable returning a fresh request coroutine
+            priority: LLM scheduler class
+            deadline: Seconds before the call is abandoned (defaults per priority)
+            hedge: Send a duplicate request after the site's p95 latency
+
+        Returns:
+            The provider response
+
+        Raises:
+            CircuitOpenError: The site's breaker is open; callers use their fallback
+            asyncio.TimeoutError: The deadline passed
+        """
+        stats, breaker = self._site(name)
+        if not breaker.allow():
+            stats.rejected += 1
+            raise CircuitOpenError(f"Circuit open for LLM call site '{name}'")
+
+        stats.calls += 1
+        started = time.monotonic()
+        runner = self._run_hedged(stats, factory, priority) if hedge else self._run_once(factory, priority)
+        try:
+            result = await asyncio.wait_for(runner, timeout=deadline or self.default_deadline(priority))
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            breaker.record(False)
+            raise
+        except Exception:
+            stats.errors += 1
+            breaker.record(False)
+            raise
+
+        stats.latencies.append(time.monotonic() - started)
+        breaker.record(True)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Tail-latency stats and breaker state per call site"""
+        return {
+            name: {
+                **stats.snapshot(),
+                "breaker": {
+                    "state": self._breakers[name].state,
+                    "error_rate": round(self._breakers[name].error_rate(), 3),
+                    "times_opened": self._breakers[name].times_opened,
+                },
+            }
+            for name, stats in self._stats.items()
+        }
+
+
+# Global LLM guard instance
+llm_guard = LLMGuard()
@@ -0,0 +1,140 @@
+"""
+LLM Request Scheduler
+Coordinate interactive and bulk OpenAI calls over one shared concurrency budget
+"""
+from contextlib import asynccontextmanager
+from collections import deque
+from enum import IntEnum
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.utils.stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+# Number of recent wait times kept per class for percentile stats
+WAIT_SAMPLE_SIZE = 1000
+
+
+class Priority(IntEnum):
+    """Priority classes; lower value is served first"""
+    INTERACTIVE = 0  # user is waiting: query parsing, summaries, query embeddings
+    BULK = 1         # background work: sync categorization, index builds, re-categorization
+
+
+class LLMScheduler:
+    """
+    Priority scheduler for shared LLM capacity
+
+    Every OpenAI call acquires a slot. Each class may reserve slots that other
+    classes cannot use, and when a slot frees up queued interactive requests are
+    always granted before queued bulk work.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        reservations: Optional[Dict[Priority, int]] = None
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            max_concurrency: Total in-flight LLM calls allowed
+            reservations: Slots held back for each class
+        """
+        self.capacity = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.reservations = reservations or {
+            Priority.INTERACTIVE: settings.LLM_INTERACTIVE_RESERVED,
+            Priority.BULK: settings.LLM_BULK_RESERVED,
+        }
+        self.in_flight = {p: 0 for p in Priority}
+        self._waiters = {p: deque() for p in Priority}
+        self._granted = {p: 0 for p in Priority}
+        self._wait_times = {p: deque(maxlen=WAIT_SAMPLE_SIZE) for p in Priority}
+        self._max_queue_depth = {p: 0 for p in Priority}
+
+    def _can_start(self, priority: Priority) -> bool:
+        """A class may use any slot not reserved (and unused) by another class"""
+        held_back = sum(
+            max(0, self.reservations.get(other, 0) - self.in_flight[other])
+            for other in Priority if other != priority
+        )
+        return sum(self.in_flight.values()) < self.capacity - held_back
+
+    def _has_queued_at_or_above(self, priority: Priority) -> bool:
+        return any(self._waiters[p] for p in Priority if p <= priority)
+
+    def _dispatch(self):
+        """Grant free slots to waiters in priority order"""
+        for priority in Priority:
+            waiters = self._waiters[priority]
+            while waiters and self._can_start(priority):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self.in_flight[priority] += 1
+                future.set_result(None)
+
+    async def _acquire(self, priority: Priority):
+        if not self._has_queued_at_or_above(priority) and self._can_start(priority):
+            self.in_flight[priority] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(future)
+        self._max_queue_depth[priority] = max(self._max_queue_depth[priority], len(self._waiters[priority]))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled; hand it back
+                self._release(priority)
+            else:
+                try:
+                    self._waiters[priority].remove(future)
+                except ValueError:
+                    pass
+            raise
+
+    def _release(self, priority: Priority):
+        self.in_flight[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.BULK):
+        """
+        Hold one LLM slot for the duration of the block
+
+        Args:
+            priority: Priority class of the call
+        """
+        enqueued_at = time.monotonic()
+        await self._acquire(priority)
+        self._granted[priority] += 1
+        self._wait_times[priority].append(time.monotonic() - enqueued_at)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth, in-flight and wait-time metrics per class"""
+        classes = {}
+        for priority in Priority:
+            classes[priority.name.lower()] = {
+                "queue_depth": len(self._waiters[priority]),
+                "max_queue_depth": self._max_queue_depth[priority],
+                "in_flight": self.in_flight[priority],
+                "reserved": self.reservations.get(priority, 0),
+                "granted_total": self._granted[priority],
+                "wait_ms": summarize_ms(self._wait_times[priority]),
+            }
+        return {"capacity": self.capacity, "classes": classes}
+
+
+# Global LLM scheduler instance
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,416 @@
+"""
+Mail Archive Importer
+Bulk-import archived mail from mbox files or directories of .eml files,
+without going through the Gmail API
+
+Messages are streamed one at a time (constant memory regardless of archive
+size), parsed, normalized and entity-tagged in a process pool, categorized
+concurrently and bulk-inserted. Progress is checkpointed after every
+committed batch, so an interrupted import resumes where it stopped.
+
+Run with:
+    python -m app.services.mail_importer archive.mbox [more.mbox eml_dir/] --workers 4 --local-categorizer
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from datetime import datetime
+import argparse
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import time
+
+from app.core.config import settings
+from app.db.bulk import insert_emails
+from app.db.database import SessionLocal
+from app.db.migrations import upgrade_database
+from app.db.models import EmailRecord
+from app.services.ai_categorizer import EmailCategorizer
+from app.services.ingest_pipeline import triage, normalize_email, build_email_row
+from app.utils.checkpoint import JsonCheckpoint
+from app.utils.mime import message_to_payload, header_dict, extract_body, extract_attachments_info, parse_date
+
+logger = logging.getLogger(__name__)
+
+# Gmail Takeout mbox separator: "From <decimal message id>@xxx <date>"
+TAKEOUT_FROM_LINE = re.compile(rb"^From (\d{10,})@xxx ")
+
+# mboxrd escaping of body lines that start with "From "
+ESCAPED_FROM_LINE = re.compile(rb"^>+From ")
+
+# Takeout X-Gmail-Labels values mapped to Gmail API label IDs
+TAKEOUT_LABELS = {
+    "inbox": "INBOX",
+    "spam": "SPAM",
+    "trash": "TRASH",
+    "drafts": "DRAFT",
+    "draft": "DRAFT",
+    "sent": "SENT",
+    "important": "IMPORTANT",
+    "unread": "UNREAD",
+    "starred": "STARRED",
+    "category promotions": "CATEGORY_PROMOTIONS",
+    "category social": "CATEGORY_SOCIAL",
+    "category forums": "CATEGORY_FORUMS",
+    "category updates": "CATEGORY_UPDATES",
+}
+
+EML_SUFFIXES = {".eml", ".msg", ".txt"}
+
+
+def iter_mbox(path: str, offset: int = 0) -> Iterator[Tuple[bytes, Optional[str], int]]:
+    """
+    Stream messages from an mbox file without indexing it
+
+    Args:
+        path: mbox file
+        offset: Byte offset of the first message to read (from a checkpoint)
+
+    Yields:
+        (raw message bytes, Gmail message ID from a Takeout separator or None,
+        byte offset just past the message)
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        lines: List[bytes] = []
+        gmail_id = None
+        position = offset
+        message_end = offset
+        previous_blank = True
+        started = False
+        for line in f:
+            if line.startswith(b"From ") and previous_blank:
+                if started:
+                    # The separator's preceding blank line belongs to neither message
+                    yield b"".join(lines[:-1]), gmail_id, message_end
+                match = TAKEOUT_FROM_LINE.match(line)
+                gmail_id = format(int(match.group(1)), "x") if match else None
+                lines = []
+                started = True
+            elif started:
+                lines.append(line[1:] if ESCAPED_FROM_LINE.match(line) else line)
+            position += len(line)
+            if line.strip():
+                message_end = position
+            previous_blank = not line.strip()
+        if started:
+            yield b"".join(lines), gmail_id, position
+
+
+def iter_eml_dir(path: str, skip: int = 0) -> Iterator[Tuple[bytes, Optional[str], int]]:
+    """
+    Stream .eml files from a directory tree in a stable (sorted) order
+
+    Args:
+        path: Directory
+        skip: Number of files already imported (from a checkpoint)
+
+    Yields:
+        (raw message bytes, None, number of files read so far)
+    """
+    count = 0
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if Path(name).suffix.lower() not in EML_SUFFIXES:
+                continue
+            count += 1
+            if count <= skip:
+                continue
+            with open(os.path.join(root, name), "rb") as f:
+                yield f.read(), None, count
+
+
+def parse_raw_message(raw: bytes, gmail_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse one raw RFC 822 message into the email dict GmailService produces
+
+    Args:
+        raw: Message bytes
+        gmail_id: Gmail message ID if the archive records it (Takeout mbox)
+
+    Returns:
+        Email dict with gmail_id, thread_id, sender, recipient, subject,
+        timestamp, content, attachments and labels
+    """
+    message = BytesParser(policy=default_policy).parsebytes(raw)
+    payload = message_to_payload(message)
+    headers = header_dict(payload)
+
+    if not gmail_id:
+        # Stable ID so re-importing the same archive (or overlapping ones) skips duplicates
+        source = headers.get('message-id', '').strip().encode() or raw
+        gmail_id = "imp-" + hashlib.sha1(source).hexdigest()[:24]
+    thread_id = headers.get('x-gm-thrid', '').strip()
+    labels = [
+        TAKEOUT_LABELS.get(label.strip().lower(), label.strip())
+        for label in headers.get('x-gmail-labels', '').split(',') if label.strip()
+    ]
+
+    return {
+        'gmail_id': gmail_id,
+        'thread_id': format(int(thread_id), 'x') if thread_id.isdigit() else None,
+        'sender': headers.get('from', 'Unknown'),
+        'recipient': headers.get('to', ''),
+        'subject': headers.get('subject', 'No Subject') or 'No Subject',
+        'timestamp': parse_date(headers.get('date')) or datetime.now(),
+        'content': extract_body(payload),
+        'attachments': extract_attachments_info(payload),
+        'labels': labels
+    }
+
+
+def _init_import_worker():
+    # Workers are the parallelism; spaCy must not start its own process pool inside them
+    settings.ENTITY_EXTRACTION_PROCESSES = 1
+
+
+def prepare_messages(items: List[Tuple[bytes, Optional[str]]], categorize_locally: bool) -> List[Dict[str, Any]]:
+    """
+    Parse, triage, normalize and entity-tag a chunk of raw messages (runs in a worker process)
+
+    Args:
+        items: (raw bytes, Gmail ID or None) per message
+        categorize_locally: Also run the rule-based categorizer here
+
+    Returns:
+        One dict per message: {'email': ..., 'ai_result': ... or None},
+        {'skipped': True} or {'error': ...}
+    """
+    from app.services.entity_extractor import EntityExtractor, entity_extractor
+
+    results = []
+    emails = []
+    for raw, gmail_id in items:
+        try:
+            email_data = parse_raw_message(raw, gmail_id)
+            if triage(email_data) == 'skip':
+                results.append({'skipped': True})
+                continue
+            normalize_email(email_data)
+            result = {'email': email_data, 'ai_result': None}
+            results.append(result)
+            emails.append(result)
+        except Exception as e:
+            results.append({'error': str(e)})
+
+    local_entities = entity_extractor.extract_batch(
+        [EntityExtractor.email_text(result['email']) for result in emails]
+    )
+    for result, entities in zip(emails, local_entities):
+        result['email']['entities'] = entities
+        if categorize_locally:
+            result['ai_result'] = EmailCategorizer.categorize_locally(result['email'])
+    return results
+
+
+class MailImporter:
+    """Resumable, parallel import of mbox files and EML directories"""
+
+    def __init__(
+        self,
+        paths: List[str],
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        local_categorizer: bool = False,
+        embed: bool = False
+    ):
+        """
+        Initialize importer
+
+        Args:
+            paths: mbox files and/or directories of .eml files
+            workers: Parsing processes (defaults to MAIL_IMPORT_WORKERS or the CPU count)
+            batch_size: Messages per worker chunk, insert/commit and checkpoint
+            concurrency: Maximum in-flight LLM categorizations (non-local mode)
+            local_categorizer: Categorize with local rules only (no API calls)
+            embed: Store embeddings for imported emails (needs the embedding API)
+        """
+        self.paths = [str(Path(p).resolve()) for p in paths]
+        self.workers = workers or settings.MAIL_IMPORT_WORKERS or os.cpu_count() or 1
+        self.batch_size = batch_size or settings.MAIL_IMPORT_BATCH_SIZE
+        self.concurrency = concurrency or settings.CATEGORIZATION_CONCURRENCY
+        self.local_categorizer = local_categorizer or settings.CATEGORIZER_MODE == "local"
+        self.embed = embed
+        digest = hashlib.sha1("\n".join(sorted(self.paths)).encode()).hexdigest()[:12]
+        self.checkpoint = JsonCheckpoint(f"mail-import-{digest}")
+        self.stats = {
+            "messages": 0, "parse_errors": 0, "skipped": 0,
+            "inserted": 0, "duplicates": 0, "failed": 0, "embedded": 0,
+        }
+
+    def _read_source(self, path: str, position: int) -> Iterator[Tuple[bytes, Optional[str], int]]:
+        if os.path.isdir(path):
+            return iter_eml_dir(path, skip=position)
+        return iter_mbox(path, offset=position)
+
+    def _chunks(self, messages: Iterator[Tuple[bytes, Optional[str], int]]):
+        chunk = []
+        position = None
+        for raw, gmail_id, position in messages:
+            chunk.append((raw, gmail_id))
+            if len(chunk) >= self.batch_size:
+                yield chunk, position
+                chunk = []
+        if chunk:
+            yield chunk, position
+
+    async def _complete_chunk(self, db, future, state: Dict[str, Any], path: str, position: int):
+        """Categorize, store and checkpoint one prepared chunk"""
+        results = await future
+        prepared = [result for result in results if 'email' in result]
+        self.stats["messages"] += len(results)
+        self.stats["parse_errors"] += sum(1 for result in results if 'error' in result)
+        self.stats["skipped"] += sum(1 for result in results if result.get('skipped'))
+
+        pending = [result for result in prepared if result['ai_result'] is None]
+        if pending:
+            ai_results = await EmailCategorizer.batch_categorize(
+                [result['email'] for result in pending], concurrency=self.concurrency
+            )
+            for result, ai_result in zip(pending, ai_results):
+                result['ai_result'] = ai_result
+
+        rows = [build_email_row(result['email'], result['ai_result']) for result in prepared]
+        stored = insert_emails(db, rows, batch_size=self.batch_size)
+        self.stats["inserted"] += stored["inserted"]
+        self.stats["duplicates"] += stored["skipped"]
+        self.stats["failed"] += stored["failed"]
+
+        if self.embed and stored["inserted_ids"]:
+            from app.services.rag_service import rag_service
+            records = [EmailRecord(**row) for row in rows if row["gmail_id"] in stored["inserted_ids"]]
+            self.stats["embedded"] += await rag_service.store_embeddings(db, records)
+
+        # Only checkpoint past messages that are committed
+        state["sources"][path] = {"position": position, "done": False}
+        state["stats"] = self.stats
+        self.checkpoint.save(state)
+
+    async def _import_source(self, db, pool: ProcessPoolExecutor, path: str, state: Dict[str, Any]):
+        source_state = state["sources"].get(path, {})
+        if source_state.get("done"):
+            logger.info(f"Skipping {path} (already imported)")
+            return
+        position = source_state.get("position", 0)
+        if position:
+            logger.info(f"Resuming {path} at position {position}")
+
+        loop = asyncio.get_running_loop()
+        in_flight = deque()
+        # Chunks are completed in submission order so checkpoints only move forward;
+        # at most two chunks per worker are buffered, which bounds memory
+        for chunk, chunk_position in self._chunks(self._read_source(path, position)):
+            future = loop.run_in_executor(pool, prepare_messages, chunk, self.local_categorizer)
+            in_flight.append((future, chunk_position))
+            if len(in_flight) >= self.workers * 2:
+                await self._drain_one(db, in_flight, state, path)
+        while in_flight:
+            await self._drain_one(db, in_flight, state, path)
+
+        state["sources"][path] = {"position": 0, "done": True}
+        self.checkpoint.save(state)
+
+    async def _drain_one(self, db, in_flight: deque, state: Dict[str, Any], path: str):
+        future, position = in_flight.popleft()
+        await self._complete_chunk(db, future, state, path, position)
+        logger.info(
+            f"Imported {self.stats['inserted']} emails "
+            f"({self.stats['messages']} read, {self.stats['duplicates']} duplicates) from {Path(path).name}"
+        )
+
+    async def run(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Run (or resume) the import
+
+        Args:
+            reset: Ignore any saved checkpoint and start from the beginning
+
+        Returns:
+            Import statistics, including messages per minute
+        """
+        if reset:
+            self.checkpoint.clear()
+        state = self.checkpoint.load() or {}
+        state.setdefault("sources", {})
+        self.stats.update(state.get("stats", {}))
+
+        # Imports may run before the API has ever started against this database
+        upgrade_database()
+
+        started = time.monotonic()
+        messages_before = self.stats["messages"]
+        db = SessionLocal()
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_import_worker
+        )
+        error = None
+        try:
+            for path in self.paths:
+                await self._import_source(db, pool, path, state)
+            self.checkpoint.clear()
+        except Exception as e:
+            # The checkpoint keeps the last committed batch; re-running resumes from there
+            logger.error(f"Import stopped: {str(e)}")
+            error = str(e)
+        finally:
+            pool.shutdown(cancel_futures=True)
+            db.close()
+
+        elapsed = time.monotonic() - started
+        read = self.stats["messages"] - messages_before
+        result = {
+            **self.stats,
+            "completed": error is None,
+            "elapsed_seconds": round(elapsed, 2),
+            "messages_per_minute": round(read / elapsed * 60, 1) if elapsed else 0.0,
+        }
+        if error:
+            result["error"] = error
+        return result
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Import mbox files or EML directories into the email store")
+    parser.add_argument("paths", nargs="+", help="mbox files and/or directories of .eml files")
+    parser.add_argument("--workers", type=int, default=None, help="Parsing processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Messages per chunk, commit and checkpoint")
+    parser.add_argument("--concurrency", type=int, default=None, help="In-flight LLM categorizations")
+    parser.add_argument("--local-categorizer", action="store_true", help="Rule-based categorization, no API calls")
+    parser.add_argument("--embed", action="store_true", help="Store embeddings for the vector index")
+    parser.add_argument("--reset", action="store_true", help="Ignore saved checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.local_categorizer:
+        settings.CATEGORIZER_MODE = "local"
+
+    importer = MailImporter(
+        args.paths,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        local_categorizer=args.local_categorizer,
+        embed=args.embed
+    )
+    try:
+        result = asyncio.run(importer.run(reset=args.reset))
+    except KeyboardInterrupt:
+        logger.info("Import interrupted; run the same command again to resume")
+        return
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
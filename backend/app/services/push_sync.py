@@ -0,0 +1,289 @@
+"""
+Push Sync Service
+Gmail watch registration and debounced, per-user incremental syncs triggered
+by Pub/Sub change notifications
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+import asyncio
+import base64
+import json
+import logging
+import time
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import User
+from app.services.gmail_client_cache import gmail_client_cache
+from app.services.sync_worker import sync_worker_pool
+from app.utils.stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+# Number of recent notification-to-ingest latencies kept
+LATENCY_SAMPLE_SIZE = 500
+
+
+class _UserPushState:
+    """Debounce/coalescing state for one user's notifications"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.dirty = False  # a notification arrived while a sync was running
+        self.first_notified_at: Optional[float] = None
+        self.notifications = 0
+
+
+class PushSyncCoordinator:
+    """
+    Turn mailbox change notifications into incremental syncs
+
+    Notifications for a user that arrive within PUSH_SYNC_DEBOUNCE_SECONDS
+    are coalesced into one sync. A notification that arrives while that
+    user's sync is running schedules exactly one follow-up sync. Syncs run
+    as sync worker jobs (source "push").
+    """
+
+    def __init__(self, debounce_seconds: Optional[float] = None):
+        self.debounce_seconds = (
+            settings.PUSH_SYNC_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        )
+        self._users: Dict[str, _UserPushState] = {}
+        self._renew_task: Optional[asyncio.Task] = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.stats = {"notifications": 0, "coalesced": 0, "ignored": 0, "syncs": 0, "deferred": 0, "sync_errors": 0}
+
+    @staticmethod
+    def decode_pubsub_envelope(envelope: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decode a Pub/Sub push request body
+
+        Args:
+            envelope: {"message": {"data": base64(JSON), ...}, "subscription": ...}
+
+        Returns:
+            Gmail notification payload with emailAddress and historyId
+
+        Raises:
+            ValueError: The body is not a Gmail notification
+        """
+        try:
+            data = envelope["message"]["data"]
+            payload = json.loads(base64.b64decode(data + "=" * (-len(data) % 4)))
+            return {"emailAddress": payload["emailAddress"], "historyId": str(payload["historyId"])}
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid Gmail push notification: {str(e)}")
+
+    @staticmethod
+    def _find_user(db: Session, email_address: str) -> Optional[User]:
+        return db.query(User).filter(
+            or_(User.gmail_address == email_address, User.email == email_address),
+            User.gmail_refresh_token.isnot(None)
+        ).first()
+
+    def notify(self, db: Session, email_address: str, history_id: str) -> bool:
+        """
+        Handle one change notification
+
+        Args:
+            db: Database session (used for the user lookup only)
+            email_address: Mailbox the notification is for
+            history_id: Mailbox historyId after the change
+
+        Returns:
+            Whether a sync was scheduled or coalesced into a pending one
+        """
+        self.stats["notifications"] += 1
+        user = self._find_user(db, email_address)
+        if not user:
+            self.stats["ignored"] += 1
+            logger.warning(f"Push notification for unknown mailbox {email_address}")
+            return False
+
+        if user.gmail_history_id and int(history_id) <= int(user.gmail_history_id):
+            # Already synced past this change (e.g. a redelivered notification)
+            self.stats["ignored"] += 1
+            return False
+
+        state = self._users.setdefault(user.id, _UserPushState())
+        state.notifications += 1
+        if state.first_notified_at is None:
+            state.first_notified_at = time.monotonic()
+
+        if state.task and not state.task.done():
+            self.stats["coalesced"] += 1
+            state.dirty = True
+            return True
+
+        state.task = asyncio.get_running_loop().create_task(self._debounced_sync(user.id, state))
+        return True
+
+    async def handle_envelope(self, db: Session, envelope: Dict[str, Any]) -> bool:
+        """Decode a Pub/Sub push body and handle the notification it carries"""
+        payload = self.decode_pubsub_envelope(envelope)
+        return self.notify(db, payload["emailAddress"], payload["historyId"])
+
+    async def _debounced_sync(self, user_id: str, state: _UserPushState):
+        while True:
+            await asyncio.sleep(self.debounce_seconds)
+            # Everything that arrived during the debounce window is covered by this sync
+            state.dirty = False
+            notified_at = state.first_notified_at
+            state.first_notified_at = None
+
+            if not await self._run_sync(user_id):
+                # The user's job was already running and may have listed history
+                # before these changes arrived; sync again after another debounce
+                state.dirty = True
+                if state.first_notified_at is None:
+                    state.first_notified_at = notified_at
+                continue
+            if notified_at is not None:
+                self._latencies.append(time.monotonic() - notified_at)
+
+            if not state.dirty:
+                break
+
+    async def _run_sync(self, user_id: str) -> bool:
+        """
+        Queue a sync job for a user and wait for it to finish
+
+        Returns:
+            False if the notification attached to a job that had already
+            started, which may not cover the new changes
+        """
+        db = SessionLocal()
+        try:
+            job, created = sync_worker_pool.enqueue(db, user_id, source="push")
+            job_id = job.id
+            # A job that is still queued starts after these changes arrived
+            covered = created or job.status == "queued"
+        except Exception as e:
+            self.stats["sync_errors"] += 1
+            logger.exception("Failed to queue push-triggered sync for user %s: %s", user_id, str(e))
+            return True
+        finally:
+            db.close()
+
+        result = await sync_worker_pool.wait(job_id)
+        if not covered:
+            self.stats["deferred"] += 1
+            return False
+        if result and result["status"] == "failed":
+            self.stats["sync_errors"] += 1
+            logger.error(f"Push-triggered sync job {job_id} failed for user {user_id}: {result['error']}")
+        else:
+            self.stats["syncs"] += 1
+        return True
+
+    async def register_watch(self, user: User, db: Session) -> Dict[str, Any]:
+        """
+        Register (or renew) the Gmail watch for a user
+
+        Args:
+            user: User whose mailbox is watched
+            db: Session the user row belongs to
+
+        Returns:
+            Dict with the watched address and expiration
+        """
+        if not settings.GMAIL_PUBSUB_TOPIC:
+            raise RuntimeError("GMAIL_PUBSUB_TOPIC must be set to register Gmail push notifications")
+
+        gmail_service = await gmail_client_cache.get(user, db)
+        profile = await gmail_service.get_profile()
+        response = await gmail_service.watch(settings.GMAIL_PUBSUB_TOPIC)
+
+        if profile:
+            user.gmail_address = profile.get("emailAddress")
+        # Gmail reports the expiration in epoch milliseconds
+        user.gmail_watch_expiration = datetime.utcfromtimestamp(int(response["expiration"]) / 1000)
+        db.commit()
+        logger.info(f"Gmail watch registered for {user.gmail_address} until {user.gmail_watch_expiration}")
+        return {"email_address": user.gmail_address, "expiration": user.gmail_watch_expiration}
+
+    async def renew_watches(self):
+        """Renew every watch that lapses within GMAIL_WATCH_RENEW_MARGIN"""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() + timedelta(seconds=settings.GMAIL_WATCH_RENEW_MARGIN)
+            users = db.query(User).filter(
+                User.gmail_refresh_token.isnot(None),
+                User.gmail_watch_expiration.isnot(None),
+                User.gmail_watch_expiration <= cutoff
+            ).all()
+            for user in users:
+                try:
+                    await self.register_watch(user, db)
+                except Exception as e:
+                    logger.error(f"Failed to renew Gmail watch for {user.email}: {str(e)}")
+        finally:
+            db.close()
+
+    async def _renew_loop(self):
+        while True:
+            await self.renew_watches()
+            await asyncio.sleep(settings.GMAIL_WATCH_RENEW_INTERVAL)
+
+    def start(self):
+        """Start the periodic watch renewal"""
+        if self._renew_task is None or self._renew_task.done():
+            self._renew_task = asyncio.get_running_loop().create_task(self._renew_loop())
+
+    async def stop(self):
+        """Stop watch renewal and any pending debounced syncs"""
+        tasks = [state.task for state in self._users.values() if state.task and not state.task.done()]
+        if self._renew_task:
+            tasks.append(self._renew_task)
+            self._renew_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Notification counters and notification-to-ingest latency"""
+        return {
+            **self.stats,
+            "pending_users": sum(1 for s in self._users.values() if s.task and not s.task.done()),
+            "ingest_latency_ms": summarize_ms(self._latencies),
+        }
+
+
+class LocalNotifier:
+    """
+    Stand-in for Gmail + Pub/Sub in development and tests
+
+    Publishes notifications in the same envelope format Pub/Sub pushes to
+    the webhook, so the full decode/debounce/sync path is exercised.
+    """
+
+    def __init__(self, coordinator: Optional[PushSyncCoordinator] = None):
+        self.coordinator = coordinator or push_sync
+
+    @staticmethod
+    def build_envelope(email_address: str, history_id: str) -> Dict[str, Any]:
+        data = json.dumps({"emailAddress": email_address, "historyId": int(history_id)})
+        return {
+            "message": {
+                "data": base64.b64encode(data.encode()).decode(),
+                "messageId": f"local-{time.time_ns()}",
+                "publishTime": datetime.utcnow().isoformat() + "Z",
+            },
+            "subscription": "projects/local/subscriptions/gmail-push",
+        }
+
+    async def publish(self, email_address: str, history_id: str) -> bool:
+        """Deliver one notification to the coordinator"""
+        db = SessionLocal()
+        try:
+            return await self.coordinator.handle_envelope(db, self.build_envelope(email_address, history_id))
+        finally:
+            db.close()
+
+
+# Global push sync coordinator instance
+push_sync = PushSyncCoordinator()
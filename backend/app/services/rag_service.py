@@ -2,20 +2,46 @@
 RAG (Retrieval-Augmented Generation) Query Service
 Using FAISS for vector similarity search
 """
-from openai import OpenAI
+from openai import AsyncOpenAI
 from app.core.config import settings
 import faiss
 import numpy as np
+import asyncio
 import json
 import logging
+import re
 from typing import List, Dict, Any
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app.db.models import EmailRecord
+from app.db.models import EmailRecord, EmailEmbedding, generate_uuid
+from app.utils.text_normalizer import EmailNormalizer
+from app.services.llm_scheduler import Priority
+from app.services.llm_guard import llm_guard
+from app.services.entity_extractor import HOSPITAL_DEPARTMENTS
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+# Keyword cues for the local fallback query parser
+FALLBACK_CATEGORY_KEYWORDS = {
+    "Insurance Claims": ["insurance", "claim"],
+    "Billing / Payment": ["billing", "bill", "payment", "invoice"],
+    "Appointment Confirmation": ["appointment", "schedule"],
+    "Diagnostic Results": ["diagnostic", "scan", "x-ray", "mri", "ecg"],
+    "Lab Results": ["lab", "blood test"],
+    "Medical Report": ["medical report", "report"],
+    "Doctor / Patient Communication": ["patient message", "patient messages"],
+    "Official Notice": ["notice", "policy", "announcement"],
+    "Prescription": ["prescription", "medication"],
+}
+
+FALLBACK_STOPWORDS = {
+    "show", "all", "find", "get", "list", "emails", "email", "messages", "from", "the",
+    "and", "for", "with", "about", "last", "this", "week", "today", "days", "past",
+    "urgent", "high", "low", "priority", "unread", "pending", "processed", "above", "below",
+}
 
 
 class RAGQueryService:
@@ -29,12 +55,32 @@ class RAGQueryService:
         self.last_rebuild = None
         self._embedding_cache = {}  # Cache embeddings to reduce API calls
     
-    async def create_embedding(self, text: str) -> List[float]:
+    @staticmethod
+    def build_embedding_text(email: EmailRecord) -> str:
+        """
+        Build the text embedded for an email
+        
+        Uses the stored normalized body rather than raw content so quoted
+        replies, signatures and HTML never reach the embedding model. Text
+        extracted from PDF attachments is included ahead of the body.
+        
+        Args:
+            email: Email record
+            
+        Returns:
+            Token-bounded text for embedding
+        """
+        attachments = EmailNormalizer.attachment_text(email.attachments, settings.ATTACHMENT_PROMPT_MAX_TOKENS)
+        text = f"{email.subject} {email.summary or ''} {email.category or ''}\n{attachments}\n{email.normalized_content or ''}"
+        return EmailNormalizer.truncate_tokens(text, settings.EMBEDDING_MAX_TOKENS)
+    
+    async def create_embedding(self, text: str, priority: Priority = Priority.INTERACTIVE) -> List[float]:
         """
         Create embedding for text using OpenAI with caching
         
         Args:
             text: Text to embed
+            priority: LLM scheduler class (interactive for queries, bulk for indexing)
             
         Returns:
             List of floats representing the embedding
@@ -45,9 +91,16 @@ class RAGQueryService:
             return self._embedding_cache[cache_key]
         
         try:
-            response = client.embeddings.create(
-                model=settings.EMBEDDING_MODEL,
-                input=text
+            # Queries and index builds are separate call sites: bulk failures must not
+            # open the breaker for user searches, nor slow bulk calls skew the hedge p95
+            response = await llm_guard.call(
+                "embedding_query" if priority == Priority.INTERACTIVE else "embedding_index",
+                lambda: client.embeddings.create(
+                    model=settings.EMBEDDING_MODEL,
+                    input=text
+                ),
+                priority=priority,
+                hedge=priority == Priority.INTERACTIVE
             )
             embedding = response.data[0].embedding
             
@@ -81,16 +134,18 @@ class RAGQueryService:
                 self.index_built = False
                 return
             
-            # Create embeddings for all emails
+            # Reuse embeddings stored by bulk imports; embed the rest
+            stored = self.load_stored_embeddings(db)
             embeddings = []
             self.email_ids = []
             
-            logger.info(f"Building index for {len(emails)} emails...")
+            logger.info(f"Building index for {len(emails)} emails ({len(stored)} stored embeddings)...")
             
             for i, email in enumerate(emails):
-                # Combine subject and summary for better context
-                text = f"{email.subject} {email.summary or ''} {email.category or ''}"
-                embedding = await self.create_embedding(text)
+                embedding = stored.get(email.id)
+                if embedding is None:
+                    text = self.build_embedding_text(email)
+                    embedding = await self.create_embedding(text, priority=Priority.BULK)
                 embeddings.append(embedding)
                 self.email_ids.append(email.id)
                 
@@ -111,6 +166,79 @@ class RAGQueryService:
             logger.error(f"Error building index: {str(e)}")
             self.index_built = False
     
+    async def add_emails(self, emails: List[EmailRecord], concurrency: int = None) -> int:
+        """
+        Embed new emails and append them to the existing index
+        
+        Does nothing until the index has been built once; the first query
+        builds it from every stored email, including these.
+        
+        Args:
+            emails: Newly stored email records
+            concurrency: Maximum in-flight embedding calls (defaults to settings)
+            
+        Returns:
+            Number of emails added to the index
+        """
+        if not self.index_built or not emails:
+            return 0
+        
+        indexed = set(self.email_ids)
+        emails = [email for email in emails if email.id not in indexed]
+        semaphore = asyncio.Semaphore(concurrency or settings.EMBEDDING_CONCURRENCY)
+        
+        async def embed(email):
+            async with semaphore:
+                return await self.create_embedding(self.build_embedding_text(email), priority=Priority.BULK)
+        
+        embeddings = await asyncio.gather(*(embed(email) for email in emails))
+        if not embeddings:
+            return 0
+        
+        self.index.add(np.array(embeddings).astype('float32'))
+        self.email_ids.extend(email.id for email in emails)
+        return len(emails)
+    
+    def load_stored_embeddings(self, db: Session) -> Dict[str, List[float]]:
+        """Embeddings saved in email_embeddings, keyed by email id"""
+        return {
+            email_id: embedding
+            for email_id, embedding in db.query(EmailEmbedding.email_id, EmailEmbedding.embedding)
+            if embedding and len(embedding) == self.dimension
+        }
+    
+    async def store_embeddings(self, db: Session, emails: List[EmailRecord], concurrency: int = None) -> int:
+        """
+        Embed emails and save the vectors to email_embeddings
+        
+        Used by offline imports, whose process doesn't hold the serving
+        index; the next index build loads these instead of re-embedding.
+        
+        Args:
+            db: Database session
+            emails: Stored email records
+            concurrency: Maximum in-flight embedding calls (defaults to settings)
+            
+        Returns:
+            Number of embeddings saved
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.EMBEDDING_CONCURRENCY)
+        
+        async def embed(email):
+            async with semaphore:
+                return await self.create_embedding(self.build_embedding_text(email), priority=Priority.BULK)
+        
+        embeddings = await asyncio.gather(*(embed(email) for email in emails))
+        rows = [
+            {"id": generate_uuid(), "email_id": email.id, "embedding": embedding}
+            for email, embedding in zip(emails, embeddings)
+            if any(embedding)  # create_embedding returns zeros on failure
+        ]
+        if rows:
+            db.execute(insert(EmailEmbedding), rows)
+            db.commit()
+        return len(rows)
+    
     async def parse_natural_query(self, query: str) -> Dict[str, Any]:
         """
         Parse natural language query into structured filters using GPT
@@ -148,14 +276,19 @@ Extract the following information and return as JSON:
 Today's date is {datetime.now().strftime('%Y-%m-%d')}.
 """
             
-            response = client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are a query parser. Always return valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"}
+            response = await llm_guard.call(
+                "query_parse",
+                lambda: client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=[
+                        {"role": "system", "content": "You are a query parser. Always return valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.1,
+                    response_format={"type": "json_object"}
+                ),
+                priority=Priority.INTERACTIVE,
+                hedge=True
             )
             
             result = json.loads(response.choices[0].message.content)
@@ -163,8 +296,70 @@ Today's date is {datetime.now().strftime('%Y-%m-%d')}.
             return result
             
         except Exception as e:
-            logger.error(f"Error parsing query: {str(e)}")
-            return {"keywords": [query]}
+            logger.error(f"Error parsing query, using local fallback parser: {str(e) or type(e).__name__}")
+            return self.fallback_parse_query(query)
+    
+    @staticmethod
+    def fallback_parse_query(query: str) -> Dict[str, Any]:
+        """
+        Parse a query locally with keyword rules
+        
+        Used when the LLM call times out, fails or its circuit breaker is open.
+        Produces the same structure as parse_natural_query.
+        
+        Args:
+            query: Natural language query from user
+            
+        Returns:
+            Dictionary with filters and search parameters
+        """
+        text = query.lower()
+        
+        categories = [
+            category for category, cues in FALLBACK_CATEGORY_KEYWORDS.items()
+            if any(cue in text for cue in cues)
+        ]
+        
+        priority = None
+        if re.search(r"\b(urgent|critical|stat|emergency|high priority|asap)\b", text):
+            priority = "high"
+        elif "low priority" in text:
+            priority = "low"
+        
+        relative = None
+        days_match = re.search(r"(?:last|past)\s+(\d+)\s+days?", text)
+        if "today" in text:
+            relative = "today"
+        elif days_match:
+            relative = f"last {days_match.group(1)} days"
+        elif "week" in text:
+            relative = "this week"
+        
+        status = next((s for s in ("unread", "pending", "processed") if s in text), None)
+        
+        # Departments that double as category cues ("billing", "lab") are not used as filters
+        category_cues = {cue for cues in FALLBACK_CATEGORY_KEYWORDS.values() for cue in cues}
+        department = next(
+            (
+                d for d in HOSPITAL_DEPARTMENTS
+                if d.lower() not in category_cues and re.search(rf"\b{re.escape(d.lower())}\b", text)
+            ),
+            None
+        )
+        
+        keywords = [
+            word for word in re.findall(r"[a-z0-9$#\-]+", text)
+            if word not in FALLBACK_STOPWORDS and len(word) > 2
+        ]
+        
+        return {
+            "categories": categories,
+            "priority": priority,
+            "time_range": {"start_date": None, "end_date": None, "relative": relative},
+            "keywords": keywords or [query],
+            "entities": {"patient_name": None, "doctor_name": None, "department": department},
+            "status": status
+        }
     
     async def semantic_search(self, query: str, k: int = 10) -> List[str]:
         """
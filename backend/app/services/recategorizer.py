@@ -0,0 +1,267 @@
+"""
+Re-categorization Job
+Stream stored emails through the categorizer again after CATEGORIES or the
+prompt change, writing results back in batches
+
+Run with: python -m app.services.recategorizer [--all] [--reset]
+"""
+from sqlalchemy import select, update, or_
+from sqlalchemy.orm import Session
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import argparse
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import EmailRecord
+from app.services.ai_categorizer import EmailCategorizer
+from app.utils.checkpoint import JsonCheckpoint
+from app.utils.text_normalizer import EmailNormalizer
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "recategorize"
+
+
+class RecategorizationJob:
+    """Resumable, throttled re-categorization over the emails table"""
+
+    COLUMNS = [
+        EmailRecord.id,
+        EmailRecord.sender,
+        EmailRecord.subject,
+        EmailRecord.content,
+        EmailRecord.normalized_content,
+        EmailRecord.entities,
+    ]
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_rate: Optional[float] = None,
+        only_stale: bool = True
+    ):
+        """
+        Initialize job
+
+        Args:
+            batch_size: Rows per fetch/write/commit batch
+            concurrency: Maximum in-flight categorizer calls
+            max_rate: Maximum emails per second (0 disables throttling)
+            only_stale: Only process rows with an outdated prompt version or unknown category
+        """
+        self.batch_size = batch_size or settings.RECATEGORIZE_BATCH_SIZE
+        self.concurrency = concurrency or settings.RECATEGORIZE_CONCURRENCY
+        self.max_rate = settings.RECATEGORIZE_MAX_RATE if max_rate is None else max_rate
+        self.only_stale = only_stale
+        self.checkpoint = JsonCheckpoint(CHECKPOINT_NAME)
+
+    def _build_query(self, last_id: Optional[str]):
+        """Keyset-ordered query so the checkpoint is just the last processed id"""
+        stmt = select(*self.COLUMNS).where(
+            EmailRecord.is_deleted == False,
+            # Metadata-only emails (bulk categories) stay uncategorized until their
+            # body is loaded; sending their snippets to the LLM would undo that saving
+            EmailRecord.content.isnot(None)
+        )
+
+        if self.only_stale:
+            stmt = stmt.where(or_(
+                EmailRecord.categorizer_version.is_(None),
+                EmailRecord.categorizer_version != EmailCategorizer.PROMPT_VERSION,
+                EmailRecord.category.is_(None),
+                EmailRecord.category.notin_(EmailCategorizer.CATEGORIES)
+            ))
+
+        if last_id:
+            stmt = stmt.where(EmailRecord.id > last_id)
+
+        # yield_per turns on stream_results (server-side cursor on PostgreSQL)
+        return stmt.order_by(EmailRecord.id).execution_options(yield_per=self.batch_size)
+
+    def _iter_batches(self, read_db: Session, last_id: Optional[str]):
+        """
+        Yield row batches in id order
+
+        PostgreSQL streams one server-side cursor. SQLite can't commit on another
+        connection while a read cursor is open, so it re-queries per keyset page.
+        """
+        if read_db.get_bind().dialect.name != "sqlite":
+            yield from read_db.execute(self._build_query(last_id)).partitions()
+            return
+
+        while True:
+            rows = read_db.execute(self._build_query(last_id).limit(self.batch_size)).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    @staticmethod
+    def _to_email_data(row) -> Dict[str, Any]:
+        normalized_content = row.normalized_content
+        if normalized_content is None:
+            normalized_content = EmailNormalizer.normalize(row.content or '')['text']
+        return {
+            'id': row.id,
+            'sender': row.sender,
+            'subject': row.subject,
+            'content': row.content or '',
+            'normalized_content': normalized_content,
+            'entities': row.entities or {},
+        }
+
+    async def _process_batch(self, write_db: Session, rows: List) -> Dict[str, Any]:
+        """
+        Categorize one batch and write it back in a single bulk UPDATE
+
+        Rows whose categorization failed are left untouched and unstamped, so
+        an LLM outage never overwrites a stored category with the placeholder.
+        A transient failure (timeout, open circuit) ends the batch at that row;
+        a failure specific to one email only skips that email.
+
+        Returns:
+            Dict with ``done`` (leading rows handled), ``failed_ids`` (skipped
+            emails among them) and ``interrupted`` (a transient failure stopped the batch)
+        """
+        emails = [self._to_email_data(row) for row in rows]
+        results = await EmailCategorizer.batch_categorize(emails, concurrency=self.concurrency)
+
+        done = next(
+            (n for n, result in enumerate(results) if result.get('failed') and result.get('retryable')),
+            len(results)
+        )
+        handled = list(zip(emails[:done], results[:done]))
+
+        now = datetime.utcnow()
+        updates = [
+            {
+                'id': email['id'],
+                'category': result['category'],
+                'priority': result['priority'],
+                'summary': result['summary'],
+                'entities': result['entities'],
+                'confidence_score': result.get('confidence', 0.0),
+                'categorizer_version': EmailCategorizer.PROMPT_VERSION,
+                'normalized_content': email['normalized_content'],
+                'updated_at': now,
+            }
+            for email, result in handled
+            if not result.get('failed')
+        ]
+        if updates:
+            write_db.execute(update(EmailRecord), updates)
+            write_db.commit()
+        return {
+            'done': done,
+            'failed_ids': [email['id'] for email, result in handled if result.get('failed')],
+            'interrupted': done < len(rows),
+        }
+
+    async def _throttle(self, processed: int, started: float):
+        """Sleep so the average rate stays under max_rate"""
+        if self.max_rate <= 0:
+            return
+        expected_elapsed = processed / self.max_rate
+        actual_elapsed = time.monotonic() - started
+        if expected_elapsed > actual_elapsed:
+            await asyncio.sleep(expected_elapsed - actual_elapsed)
+
+    async def run(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Run (or resume) the job
+
+        Args:
+            reset: Ignore any saved checkpoint and start from the beginning
+
+        Returns:
+            Dict with processed and failed (skipped) counts and the last processed id
+        """
+        if reset:
+            self.checkpoint.clear()
+
+        state = self.checkpoint.load()
+        last_id = state.get('last_id')
+        processed_total = state.get('processed', 0)
+        failed_total = state.get('failed', 0)
+        if last_id:
+            logger.info(f"Resuming re-categorization after id {last_id} ({processed_total} already done)")
+
+        # Separate sessions: committing on the read session would close its cursor
+        read_db = SessionLocal()
+        write_db = SessionLocal()
+        started = time.monotonic()
+        processed_run = 0
+
+        try:
+            for rows in self._iter_batches(read_db, last_id):
+                batch = await self._process_batch(write_db, rows)
+                processed_run += batch['done']
+                processed_total += batch['done']
+                failed_total += len(batch['failed_ids'])
+                if batch['done']:
+                    last_id = rows[batch['done'] - 1].id
+                if batch['failed_ids']:
+                    logger.warning(
+                        f"Could not categorize {len(batch['failed_ids'])} emails, skipped: "
+                        f"{', '.join(batch['failed_ids'])}"
+                    )
+                self.checkpoint.save({'last_id': last_id, 'processed': processed_total, 'failed': failed_total})
+
+                if batch['interrupted']:
+                    # The checkpoint stops just before the email that hit the outage
+                    logger.error(f"Re-categorization stopped after id {last_id}: categorizer unavailable")
+                    return {
+                        'processed': processed_total, 'failed': failed_total, 'last_id': last_id,
+                        'completed': False,
+                        'error': "Categorizer unavailable (timeout or open circuit); run again to resume"
+                    }
+
+                logger.info(f"Re-categorized {processed_total} emails (last id {last_id})")
+                await self._throttle(processed_run, started)
+
+            self.checkpoint.clear()
+            logger.info(f"✅ Re-categorization complete: {processed_total} emails ({failed_total} failed)")
+            return {'processed': processed_total, 'failed': failed_total, 'last_id': last_id, 'completed': True}
+
+        except Exception as e:
+            write_db.rollback()
+            logger.error(f"Re-categorization stopped after id {last_id}: {str(e)}")
+            return {
+                'processed': processed_total, 'failed': failed_total, 'last_id': last_id,
+                'completed': False, 'error': str(e)
+            }
+
+        finally:
+            read_db.close()
+            write_db.close()
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Re-categorize stored emails")
+    parser.add_argument("--all", action="store_true", help="Re-process every email, not just stale ones")
+    parser.add_argument("--reset", action="store_true", help="Ignore saved checkpoint")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--max-rate", type=float, default=None, help="Emails per second (0 = unthrottled)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    job = RecategorizationJob(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_rate=args.max_rate,
+        only_stale=not args.all
+    )
+    result = asyncio.run(job.run(reset=args.reset))
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Sync Lease
+Per-user lock that keeps two processes (or tasks) from syncing the same mailbox at once
+
+On PostgreSQL the lease is a session-level advisory lock held on a dedicated
+connection, so it is released by the server if the holder dies. Other
+databases use a row in ``sync_leases`` with an expiry that the holder renews
+while it runs; an expired row is taken over by the next caller.
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import SyncLease
+
+logger = logging.getLogger(__name__)
+
+
+class SyncInProgressError(Exception):
+    """Raised when another sync already holds the user's lease"""
+    pass
+
+
+class _AdvisoryLease:
+    """Postgres session advisory lock on a connection kept out of the pool while held"""
+
+    def __init__(self, bind: Engine, user_id: str):
+        self.bind = bind
+        digest = hashlib.sha1(f"email-sync:{user_id}".encode()).digest()
+        self.key = int.from_bytes(digest[:8], "big", signed=True)
+        self.connection = None
+
+    def acquire(self) -> bool:
+        connection = self.bind.connect()
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self.connection = connection
+        return True
+
+    def renew(self):
+        # Held until unlocked or the connection closes; nothing to renew
+        pass
+
+    def release(self):
+        try:
+            self.connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            self.connection.commit()
+            self.connection.close()
+        except Exception as e:
+            # Never return a connection that may still hold the lock to the pool
+            logger.warning(f"Failed to release advisory lock {self.key}: {str(e)}")
+            self.connection.invalidate()
+        self.connection = None
+
+
+class _RowLease:
+    """Lock row with expiry, renewed by the holder"""
+
+    def __init__(self, bind: Engine, user_id: str, holder: str):
+        self.bind = bind
+        self.user_id = user_id
+        self.holder = holder
+
+    def acquire(self) -> bool:
+        db = Session(bind=self.bind)
+        try:
+            now = datetime.utcnow()
+            # Take over leases whose holder stopped renewing (crashed or killed)
+            db.query(SyncLease).filter(
+                SyncLease.user_id == self.user_id,
+                SyncLease.expires_at < now
+            ).delete(synchronize_session=False)
+            db.add(SyncLease(
+                user_id=self.user_id,
+                holder=self.holder,
+                acquired_at=now,
+                expires_at=now + timedelta(seconds=settings.SYNC_LEASE_TTL)
+            ))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def renew(self):
+        db = Session(bind=self.bind)
+        try:
+            renewed = db.query(SyncLease).filter(
+                SyncLease.user_id == self.user_id,
+                SyncLease.holder == self.holder
+            ).update(
+                {SyncLease.expires_at: datetime.utcnow() + timedelta(seconds=settings.SYNC_LEASE_TTL)},
+                synchronize_session=False
+            )
+            db.commit()
+            if not renewed:
+                logger.warning(f"Sync lease for user {self.user_id} expired and was taken over")
+        finally:
+            db.close()
+
+    def release(self):
+        db = Session(bind=self.bind)
+        try:
+            db.query(SyncLease).filter(
+                SyncLease.user_id == self.user_id,
+                SyncLease.holder == self.holder
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+class SyncLeaseManager:
+    """Hand out per-user sync leases and keep them alive while a sync runs"""
+
+    def __init__(self):
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stats = {"acquired": 0, "busy": 0}
+
+    def _lease(self, bind: Engine, user_id: str):
+        if bind.dialect.name == "postgresql":
+            return _AdvisoryLease(bind, user_id)
+        return _RowLease(bind, user_id, f"{self.process_id}:{uuid.uuid4().hex[:8]}")
+
+    async def _keep_alive(self, lease):
+        while True:
+            await asyncio.sleep(settings.SYNC_LEASE_TTL / 3)
+            try:
+                lease.renew()
+            except Exception as e:
+                logger.warning(f"Failed to renew sync lease: {str(e)}")
+
+    @asynccontextmanager
+    async def hold(self, db: Session, user_id: str) -> AsyncIterator[None]:
+        """
+        Hold the user's sync lease for the duration of the block
+
+        Args:
+            db: Session of the sync; the lease lives in the same database
+            user_id: User whose mailbox is about to be synced
+
+        Raises:
+            SyncInProgressError: Another sync for this user is running
+        """
+        lease = self._lease(db.get_bind(), user_id)
+        if not lease.acquire():
+            self.stats["busy"] += 1
+            raise SyncInProgressError(f"A sync is already running for user {user_id}")
+        self.stats["acquired"] += 1
+
+        keep_alive = asyncio.get_running_loop().create_task(self._keep_alive(lease))
+        try:
+            yield
+        finally:
+            keep_alive.cancel()
+            lease.release()
+
+
+# Global sync lease manager instance
+sync_lease = SyncLeaseManager()
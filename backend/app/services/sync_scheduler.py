@@ -0,0 +1,215 @@
+"""
+Sync Scheduler
+Keep every connected mailbox fresh with periodic, fairly shared syncs
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import random
+import time
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import User
+from app.services.sync_worker import sync_worker_pool
+
+logger = logging.getLogger(__name__)
+
+
+class _UserSchedule:
+    """Scheduling state for one mailbox"""
+
+    def __init__(self, user_id: str, email: str, next_due: float):
+        self.user_id = user_id
+        self.email = email
+        self.next_due = next_due
+        self.running = False
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[float] = None
+        self.last_success_at: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.syncs = 0
+
+
+class SyncScheduler:
+    """
+    Periodically sync every user with a connected Gmail account
+
+    - At most ``max_concurrency`` syncs run at once across all users.
+    - A user never holds more than one slot, and free slots go to the user
+      that has been due the longest, so large mailboxes can't starve others.
+    - Next runs are jittered so users don't all come due together.
+    - Failing users back off exponentially up to SYNC_SCHEDULER_BACKOFF_MAX.
+    - Syncs run as sync worker jobs (source "scheduler"); a user's manual or
+      push-triggered job that is already queued or running is waited on
+      instead of starting another.
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        jitter: Optional[float] = None
+    ):
+        self.interval = interval or settings.SYNC_SCHEDULER_INTERVAL
+        self.max_concurrency = max_concurrency or settings.SYNC_SCHEDULER_MAX_CONCURRENCY
+        self.jitter = settings.SYNC_SCHEDULER_JITTER if jitter is None else jitter
+        self._users: Dict[str, _UserSchedule] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _backoff(self, failures: int) -> float:
+        delay = settings.SYNC_SCHEDULER_BACKOFF_BASE * (2 ** (failures - 1))
+        return self._jittered(min(delay, settings.SYNC_SCHEDULER_BACKOFF_MAX))
+
+    def refresh_users(self):
+        """Pick up newly connected mailboxes and forget disconnected ones"""
+        db = SessionLocal()
+        try:
+            rows = db.query(User.id, User.email).filter(
+                User.gmail_refresh_token.isnot(None),
+                User.is_active == True
+            ).all()
+        finally:
+            db.close()
+
+        now = time.monotonic()
+        active = set()
+        for user_id, email in rows:
+            active.add(user_id)
+            if user_id not in self._users:
+                # Spread first runs over one interval instead of syncing everyone at start-up
+                self._users[user_id] = _UserSchedule(user_id, email, now + random.uniform(0, self.interval))
+        for user_id in list(self._users):
+            if user_id not in active and user_id not in self._in_flight:
+                del self._users[user_id]
+        self._last_refresh = now
+
+    def _due_users(self, now: float) -> List[_UserSchedule]:
+        """Users ready to sync, longest-overdue first"""
+        due = [s for s in self._users.values() if not s.running and s.next_due <= now]
+        return sorted(due, key=lambda s: s.next_due)
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for schedule in self._due_users(now):
+            if len(self._in_flight) >= self.max_concurrency:
+                break
+            schedule.running = True
+            task = asyncio.get_running_loop().create_task(self._run_sync(schedule))
+            self._in_flight[schedule.user_id] = task
+
+    async def _run_sync(self, schedule: _UserSchedule):
+        started = time.monotonic()
+        try:
+            db = SessionLocal()
+            try:
+                job, _ = sync_worker_pool.enqueue(db, schedule.user_id, source="scheduler")
+                job_id = job.id
+            finally:
+                db.close()
+            result = await sync_worker_pool.wait(job_id)
+            if result and result["status"] == "failed":
+                raise RuntimeError(result["error"] or f"Sync job {job_id} failed")
+            schedule.failures = 0
+            schedule.last_error = None
+            schedule.last_success = time.monotonic()
+            schedule.last_success_at = datetime.utcnow()
+            schedule.syncs += 1
+            schedule.next_due = schedule.last_success + self._jittered(self.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            schedule.failures += 1
+            schedule.last_error = str(e)
+            delay = self._backoff(schedule.failures)
+            schedule.next_due = time.monotonic() + delay
+            logger.warning(
+                f"Scheduled sync failed for {schedule.email} ({schedule.failures} in a row); "
+                f"retrying in {delay:.0f}s: {str(e)}"
+            )
+        finally:
+            schedule.running = False
+            schedule.last_duration = time.monotonic() - started
+            self._in_flight.pop(schedule.user_id, None)
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if time.monotonic() - self._last_refresh >= settings.SYNC_SCHEDULER_USER_REFRESH_INTERVAL:
+                try:
+                    self.refresh_users()
+                except Exception as e:
+                    logger.error(f"Failed to load users for scheduled sync: {str(e)}")
+            self._dispatch()
+
+            # Sleep until the next user comes due, a sync finishes, or the refresh interval passes
+            waiting = [s.next_due for s in self._users.values() if not s.running]
+            timeout = settings.SYNC_SCHEDULER_USER_REFRESH_INTERVAL
+            if waiting and len(self._in_flight) < self.max_concurrency:
+                timeout = min(timeout, max(0.0, min(waiting) - time.monotonic()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.05))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start the scheduler on the running loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"Sync scheduler started (interval {self.interval:.0f}s, "
+                f"max {self.max_concurrency} concurrent syncs)"
+            )
+
+    async def stop(self):
+        """Stop scheduling and cancel running syncs"""
+        tasks = list(self._in_flight.values())
+        if self._task:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-user lag and scheduler state"""
+        now = time.monotonic()
+        users = []
+        for s in sorted(self._users.values(), key=lambda s: s.next_due):
+            users.append({
+                "user_id": s.user_id,
+                "email": s.email,
+                "running": s.running,
+                # How long the user has been due without a sync starting
+                "lag_seconds": round(max(0.0, now - s.next_due), 1) if not s.running else 0.0,
+                "seconds_since_success": round(now - s.last_success, 1) if s.last_success else None,
+                "last_success_at": s.last_success_at.isoformat() if s.last_success_at else None,
+                "next_due_in_seconds": round(max(0.0, s.next_due - now), 1),
+                "last_duration_seconds": round(s.last_duration, 2) if s.last_duration is not None else None,
+                "consecutive_failures": s.failures,
+                "last_error": s.last_error,
+                "syncs": s.syncs,
+            })
+        lags = [u["lag_seconds"] for u in users]
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": len(self._in_flight),
+            "users": users,
+            "max_lag_seconds": max(lags) if lags else 0.0,
+        }
+
+
+# Global sync scheduler instance
+sync_scheduler = SyncScheduler()
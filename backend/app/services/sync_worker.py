@@ -0,0 +1,394 @@
+"""
+Sync Worker Pool
+Durable, database-backed queue of mailbox sync jobs and the workers that run them
+
+Jobs are rows in ``sync_jobs``. Any number of worker processes may poll the
+table; a job is claimed with a conditional UPDATE so exactly one worker runs
+it. Workers open their own database sessions, so jobs never depend on a
+request-scoped session.
+
+Queue queries and updates run in worker threads so a slow database never
+stalls the event loop that also serves requests and drives running syncs.
+
+Run the pool inside the API process (SYNC_WORKER_IN_PROCESS=True) or as a
+separate process:
+    python -m app.services.sync_worker
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import SyncJob, User
+from app.services.email_sync import sync_user_mailbox
+from app.services.sync_lease import SyncInProgressError, sync_lease
+
+logger = logging.getLogger(__name__)
+
+# A user has at most one job in these states at a time
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+class SyncWorkerPool:
+    """
+    Claim queued sync jobs and run up to ``concurrency`` of them at once
+
+    - Enqueueing a sync for a user who already has a queued or running job
+      returns that job instead of creating a duplicate; a unique index makes
+      concurrent enqueues attach to the same job.
+    - Manual, scheduled and push-triggered syncs all go through the queue,
+      so each has a job that later requests and progress streams attach to.
+    - A job is never started while another job for the same user is running,
+      and is deferred while the user's sync lease is held outside the queue.
+    - Failed jobs are retried with exponential backoff up to SYNC_JOB_MAX_ATTEMPTS.
+    - Running jobs heartbeat; jobs whose worker died are requeued once their
+      heartbeat is older than SYNC_JOB_STALE_SECONDS.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.concurrency = concurrency or settings.SYNC_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.SYNC_WORKER_POLL_INTERVAL
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"claimed": 0, "succeeded": 0, "failed": 0, "retried": 0, "deferred": 0, "requeued_stale": 0}
+
+    @staticmethod
+    def job_to_dict(job: SyncJob) -> Dict[str, Any]:
+        """Public representation of a job for API responses"""
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "source": job.source,
+            "days": job.days,
+            "attempts": job.attempts,
+            "error": job.error,
+            "progress": job.progress,
+            "stats": job.stats,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    def enqueue(self, db: Session, user_id: str, days: int = 7, source: str = "manual") -> Tuple[SyncJob, bool]:
+        """
+        Queue a sync for a user unless one is already queued or running
+
+        Args:
+            db: Database session
+            user_id: User whose mailbox is synced
+            days: Look-back window for full sweeps
+            source: What requested the sync (manual, push, scheduler)
+
+        Returns:
+            (job, created) - the new job, or the user's existing active job
+        """
+        existing = self._active_job(db, user_id)
+        if existing:
+            if existing.status == "queued" and existing.run_after and source != "scheduler":
+                # A user request or new mail shouldn't wait out a retry backoff
+                existing.run_after = None
+                db.commit()
+            self.notify()
+            return existing, False
+
+        job = SyncJob(user_id=user_id, days=days, source=source, status="queued", attempts=0)
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent request (another tab or process) queued one first; attach to it
+            db.rollback()
+            existing = self._active_job(db, user_id)
+            if existing is None:
+                raise
+            self.notify()
+            return existing, False
+        db.refresh(job)
+        self.notify()
+        return job, True
+
+    @staticmethod
+    def _active_job(db: Session, user_id: str) -> Optional[SyncJob]:
+        return db.query(SyncJob).filter(
+            SyncJob.user_id == user_id,
+            SyncJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).order_by(SyncJob.created_at.desc()).first()
+
+    async def wait(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Wait until a job has succeeded or failed
+
+        The job may run in another worker process, so its row is polled every
+        SYNC_JOB_WAIT_POLL_INTERVAL; jobs run by this pool wake waiters as soon
+        as they finish.
+
+        Args:
+            job_id: Job to wait for
+
+        Returns:
+            The finished job (job_to_dict), or None if the row no longer exists
+        """
+        try:
+            while True:
+                job = await asyncio.to_thread(self._load_job, job_id)
+                if job is None or job["status"] not in ACTIVE_JOB_STATUSES:
+                    return job
+                finished = self._finished.setdefault(job_id, asyncio.Event())
+                try:
+                    await asyncio.wait_for(finished.wait(), timeout=settings.SYNC_JOB_WAIT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._finished.pop(job_id, None)
+
+    def _load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+            return self.job_to_dict(job) if job else None
+        finally:
+            db.close()
+
+    def notify(self):
+        """Wake an in-process pool so new jobs start without waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim_next(self) -> Optional[str]:
+        """Atomically move the oldest runnable job to 'running' for this worker"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            busy_users = db.query(SyncJob.user_id).filter(SyncJob.status == "running")
+            candidates = db.query(SyncJob.id).filter(
+                SyncJob.status == "queued",
+                (SyncJob.run_after.is_(None)) | (SyncJob.run_after <= now),
+                SyncJob.user_id.notin_(busy_users)
+            ).order_by(SyncJob.created_at).limit(self.concurrency * 2).all()
+
+            for (job_id,) in candidates:
+                # Conditional update: only one worker can win the queued -> running transition
+                claimed = db.query(SyncJob).filter(
+                    SyncJob.id == job_id,
+                    SyncJob.status == "queued"
+                ).update({
+                    SyncJob.status: "running",
+                    SyncJob.worker_id: self.worker_id,
+                    SyncJob.started_at: now,
+                    SyncJob.heartbeat_at: now,
+                    SyncJob.attempts: SyncJob.attempts + 1,
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    self.stats["claimed"] += 1
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def _requeue_stale(self):
+        """Recover jobs whose worker stopped heartbeating (crash, kill, lost host)"""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.SYNC_JOB_STALE_SECONDS)
+            stale = db.query(SyncJob).filter(
+                SyncJob.status == "running",
+                SyncJob.heartbeat_at < cutoff
+            ).all()
+            for job in stale:
+                logger.warning(f"Sync job {job.id} lost its worker {job.worker_id}; requeueing")
+                job.error = f"Worker {job.worker_id} stopped responding"
+                if job.attempts >= settings.SYNC_JOB_MAX_ATTEMPTS:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                else:
+                    job.status = "queued"
+                self.stats["requeued_stale"] += 1
+            if stale:
+                db.commit()
+        finally:
+            db.close()
+
+    def _touch_heartbeat(self, job_id: str):
+        db = SessionLocal()
+        try:
+            db.query(SyncJob).filter(
+                SyncJob.id == job_id,
+                SyncJob.worker_id == self.worker_id
+            ).update({SyncJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(settings.SYNC_JOB_HEARTBEAT_INTERVAL)
+            try:
+                await asyncio.to_thread(self._touch_heartbeat, job_id)
+            except Exception as e:
+                logger.warning(f"Failed to heartbeat sync job {job_id}: {str(e)}")
+
+    def _save_progress(self, job_id: str, progress: Dict[str, Any]):
+        """Write live progress to the job row (read by the progress event stream)"""
+        db = SessionLocal()
+        try:
+            db.query(SyncJob).filter(SyncJob.id == job_id).update(
+                {SyncJob.progress: progress, SyncJob.heartbeat_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _run_job(self, job_id: str):
+        db = SessionLocal()
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job_id))
+        try:
+            job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+            user = db.query(User).filter(User.id == job.user_id).first()
+            try:
+                if not user or not user.gmail_refresh_token:
+                    raise RuntimeError("Gmail not connected")
+                stats = await sync_user_mailbox(
+                    user, db, job.days,
+                    on_progress=lambda progress: asyncio.to_thread(self._save_progress, job_id, progress)
+                )
+                job.status = "succeeded"
+                job.stats = stats
+                job.error = None
+                job.finished_at = datetime.utcnow()
+                self.stats["succeeded"] += 1
+            except asyncio.CancelledError:
+                # Shutdown: hand the job back without counting the attempt
+                db.rollback()
+                job.status = "queued"
+                job.attempts = max(0, job.attempts - 1)
+                raise
+            except SyncInProgressError:
+                # Something outside the queue (e.g. a process running an older
+                # version) is syncing this user; run afterwards without counting the attempt
+                db.rollback()
+                job.status = "queued"
+                job.attempts = max(0, job.attempts - 1)
+                job.run_after = datetime.utcnow() + timedelta(seconds=settings.SYNC_LEASE_RETRY_DELAY)
+                self.stats["deferred"] += 1
+                logger.info(f"Sync job {job_id} deferred; user {job.user_id} is already syncing")
+            except Exception as e:
+                db.rollback()
+                job.error = str(e)
+                if job.attempts < settings.SYNC_JOB_MAX_ATTEMPTS:
+                    delay = settings.SYNC_JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+                    job.status = "queued"
+                    job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+                    self.stats["retried"] += 1
+                    logger.warning(
+                        f"Sync job {job_id} failed (attempt {job.attempts}); retrying in {delay:.0f}s: {str(e)}"
+                    )
+                else:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                    self.stats["failed"] += 1
+                    logger.error(f"Sync job {job_id} failed after {job.attempts} attempts: {str(e)}")
+            finally:
+                db.commit()
+        finally:
+            heartbeat.cancel()
+            db.close()
+
+    def _on_job_done(self, job_id: str, task: asyncio.Task):
+        self._running.pop(job_id, None)
+        finished = self._finished.pop(job_id, None)
+        if finished is not None:
+            finished.set()
+        if not task.cancelled() and task.exception():
+            logger.error(f"Sync job {job_id} crashed: {task.exception()}")
+        self.notify()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while len(self._running) < self.concurrency:
+            job_id = await asyncio.to_thread(self._claim_next)
+            if not job_id:
+                break
+            task = loop.create_task(self._run_job(job_id))
+            self._running[job_id] = task
+            task.add_done_callback(lambda t, job_id=job_id: self._on_job_done(job_id, t))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._requeue_stale)
+                await self._dispatch()
+            except Exception as e:
+                logger.error(f"Sync worker poll failed: {str(e)}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start polling for jobs on the running loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Sync worker {self.worker_id} started ({self.concurrency} concurrent jobs)")
+
+    async def stop(self):
+        """Stop polling and requeue jobs that are still running"""
+        tasks = list(self._running.values())
+        if self._task:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._wakeup = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Worker state and counters"""
+        return {
+            "worker_id": self.worker_id,
+            "running": self._task is not None and not self._task.done(),
+            "concurrency": self.concurrency,
+            "in_flight": list(self._running),
+            "leases": sync_lease.stats,
+            **self.stats,
+        }
+
+
+# Global sync worker pool instance
+sync_worker_pool = SyncWorkerPool()
+
+
+async def _serve():
+    from app.services.attachment_processor import attachment_processor
+
+    sync_worker_pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await sync_worker_pool.stop()
+        attachment_processor.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,76 @@
+"""
+Triage Pre-Scoring
+Cheap, local estimate of how urgent an email is, used to order sync work
+
+The score only decides which emails are categorized and stored first during
+a sync; the categorizer still assigns the real priority.
+"""
+from email.utils import parseaddr
+from typing import Dict, Any, Optional
+import re
+
+from app.core.config import settings
+from app.services.ai_categorizer import LOCAL_HIGH_PRIORITY_PATTERN, LOCAL_LOW_PRIORITY_PATTERN
+
+# Gmail labels that hint at urgency (positive) or bulk mail (negative)
+LABEL_WEIGHTS = {
+    "IMPORTANT": 2,
+    "STARRED": 2,
+    "UNREAD": 1,
+    "CATEGORY_UPDATES": -1,
+    "CATEGORY_FORUMS": -2,
+    "CATEGORY_SOCIAL": -2,
+    "CATEGORY_PROMOTIONS": -3,
+}
+
+URGENT_SUBJECT_WEIGHT = 4  # urgent / STAT / critical / emergency ...
+LOW_PRIORITY_SUBJECT_WEIGHT = -2  # newsletter / FYI / no action required
+PRIORITY_DOMAIN_WEIGHT = 3  # sender domain in TRIAGE_PRIORITY_DOMAINS
+INTERNAL_DOMAIN_WEIGHT = 1  # sender shares the user's domain
+AUTOMATED_SENDER_WEIGHT = -2
+
+AUTOMATED_SENDER_PATTERN = re.compile(
+    r"^(no-?reply|do-?not-?reply|newsletters?|marketing|notifications?|mailer-daemon)@", re.IGNORECASE
+)
+
+
+def sender_address(sender: str) -> str:
+    """Lower-case address from a From header ("Dr. A <a@lab.org>" -> "a@lab.org")"""
+    return parseaddr(sender or "")[1].lower()
+
+
+def _domain_matches(domain: str, candidates) -> bool:
+    return any(domain == candidate or domain.endswith("." + candidate) for candidate in candidates)
+
+
+def pre_score(email_data: Dict[str, Any], user_email: Optional[str] = None) -> int:
+    """
+    Score an email's likely urgency from its headers and labels (higher is more urgent)
+
+    Args:
+        email_data: Email dict with sender, subject and labels
+        user_email: Address of the mailbox owner; mail from the same domain scores higher
+
+    Returns:
+        Integer score; 0 is neutral
+    """
+    score = sum(LABEL_WEIGHTS.get(label, 0) for label in email_data.get('labels') or [])
+
+    subject = email_data.get('subject') or ''
+    if LOCAL_HIGH_PRIORITY_PATTERN.search(subject):
+        score += URGENT_SUBJECT_WEIGHT
+    elif LOCAL_LOW_PRIORITY_PATTERN.search(subject):
+        score += LOW_PRIORITY_SUBJECT_WEIGHT
+
+    address = sender_address(email_data.get('sender'))
+    domain = address.rpartition('@')[2]
+    if domain:
+        if _domain_matches(domain, [d.lower() for d in settings.TRIAGE_PRIORITY_DOMAINS]):
+            score += PRIORITY_DOMAIN_WEIGHT
+        user_domain = sender_address(user_email).rpartition('@')[2]
+        if user_domain and domain == user_domain:
+            score += INTERNAL_DOMAIN_WEIGHT
+    if AUTOMATED_SENDER_PATTERN.match(address):
+        score += AUTOMATED_SENDER_WEIGHT
+
+    return score
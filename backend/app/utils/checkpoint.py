@@ -0,0 +1,55 @@
+"""
+Job Checkpoint Utility
+Persist progress of long-running jobs so they can resume after a crash
+"""
+from pathlib import Path
+from typing import Dict, Any, Optional
+from datetime import datetime
+import json
+import os
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JsonCheckpoint:
+    """Small JSON checkpoint file, written atomically"""
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        """
+        Initialize checkpoint
+
+        Args:
+            name: Job name, used as the file name
+            directory: Checkpoint directory (defaults to settings.JOB_CHECKPOINT_DIR)
+        """
+        self.path = Path(directory or settings.JOB_CHECKPOINT_DIR) / f"{name}.json"
+
+    def load(self) -> Dict[str, Any]:
+        """Load saved state, or an empty dict if there is none"""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading checkpoint {self.path}: {str(e)}")
+            return {}
+
+    def save(self, state: Dict[str, Any]):
+        """Write state to a temp file and rename it over the checkpoint"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {**state, "updated_at": datetime.utcnow().isoformat()}
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Remove the checkpoint"""
+        if self.path.exists():
+            self.path.unlink()
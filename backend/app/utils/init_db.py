@@ -8,8 +8,8 @@ from pathlib import Path
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.db.database import engine, Base
-from app.db.models import EmailRecord, User, QueryHistory, EmailEmbedding
+from app.db.database import engine
+from app.db.migrations import upgrade_database
 from sqlalchemy import inspect
 import logging
 
@@ -30,9 +30,9 @@ def init_db():
         existing_tables = inspector.get_table_names()
         logger.info(f"📋 Existing tables: {existing_tables}")
         
-        # Create all tables
-        logger.info("🏗️  Creating database tables...")
-        Base.metadata.create_all(bind=engine)
+        # Apply migrations (creates all tables on an empty database)
+        logger.info("🏗️  Applying database migrations...")
+        upgrade_database()
         
         # Verify tables created
         inspector = inspect(engine)
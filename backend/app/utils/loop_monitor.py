@@ -0,0 +1,78 @@
+"""
+Event Loop Monitor
+Measure how long the asyncio event loop is blocked by synchronous work
+"""
+from collections import deque
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.utils.stats import summarize_ms
+
+logger = logging.getLogger(__name__)
+
+# Number of recent lag samples kept for percentile stats
+LAG_SAMPLE_SIZE = 2000
+
+
+class EventLoopMonitor:
+    """
+    Sample event-loop lag with a periodic timer
+
+    A task sleeps for a fixed interval and records how late it wakes up. Any
+    lateness is time the loop spent running something that did not yield.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or settings.LOOP_MONITOR_INTERVAL
+        self.samples = deque(maxlen=LAG_SAMPLE_SIZE)
+        self.blocked_seconds = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.samples.append(lag)
+            self.blocked_seconds += lag
+            if lag >= settings.LOOP_STALL_THRESHOLD:
+                self.stalls += 1
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def start(self):
+        """Start sampling on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop sampling"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        """Forget collected samples (e.g. before a measurement run)"""
+        self.samples.clear()
+        self.blocked_seconds = 0.0
+        self.stalls = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Lag percentiles, total blocked time and stall count"""
+        return {
+            "interval_ms": round(self.interval * 1000, 1),
+            "lag_ms": summarize_ms(self.samples),
+            "blocked_ms_total": round(self.blocked_seconds * 1000, 1),
+            "stalls": self.stalls,
+        }
+
+
+# Global event loop monitor instance
+loop_monitor = EventLoopMonitor()
@@ -0,0 +1,155 @@
+"""
+MIME Utilities
+Shared handling of Gmail API message payloads and conversion of raw MIME
+messages (mbox/EML files) into the same payload shape
+"""
+from datetime import datetime
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional, Callable
+import base64
+
+
+def b64url_encode(data: bytes) -> str:
+    """Base64url-encode bytes the way the Gmail API returns body data"""
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def b64url_decode(data: str) -> bytes:
+    """Decode Gmail base64url body data (padding optional)"""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def header_dict(payload: Dict[str, Any]) -> Dict[str, str]:
+    """Payload headers as a dict keyed by lower-case header name"""
+    return {h['name'].lower(): h['value'] for h in payload.get('headers', [])}
+
+
+def find_part_data(payload: Dict[str, Any], mime_type: str) -> str:
+    """Depth-first search of (nested) MIME parts for the first part of a type"""
+    for part in payload.get('parts', []):
+        if part.get('filename'):
+            continue
+        if part.get('mimeType') == mime_type:
+            data = part.get('body', {}).get('data', '')
+            if data:
+                return b64url_decode(data).decode('utf-8', errors='ignore')
+        if 'parts' in part:
+            found = find_part_data(part, mime_type)
+            if found:
+                return found
+    return ""
+
+
+def extract_body(payload: Dict[str, Any]) -> str:
+    """Extract the email body from a payload, preferring text/plain over text/html"""
+    plain = find_part_data(payload, 'text/plain')
+    if plain:
+        return plain
+
+    # HTML-only messages are converted to text by the normalization stage
+    html = find_part_data(payload, 'text/html')
+    if html:
+        return html
+
+    # Single part message
+    if 'body' in payload and 'data' in payload['body']:
+        return b64url_decode(payload['body']['data']).decode('utf-8', errors='ignore')
+
+    return ""
+
+
+def extract_attachments_info(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Extract attachment information, including attachments in nested parts"""
+    attachments = []
+
+    for part in payload.get('parts', []):
+        if part.get('filename'):
+            attachments.append({
+                'filename': part['filename'],
+                'mime_type': part['mimeType'],
+                'size': part['body'].get('size', 0),
+                'attachment_id': part['body'].get('attachmentId')
+            })
+        elif 'parts' in part:
+            attachments.extend(extract_attachments_info(part))
+
+    return attachments
+
+
+def _header_items(part: Message) -> List[Dict[str, str]]:
+    headers = []
+    for name, value in part.items():
+        try:
+            headers.append({"name": name, "value": str(value)})
+        except Exception:
+            # Undecodable header: keep what the parser stored
+            headers.append({"name": name, "value": str(part.get(name, failobj=""))})
+    return headers
+
+
+def message_to_payload(
+    message: Message,
+    attachment_id: Optional[Callable[[Message, bytes, int], Optional[str]]] = None,
+    _counter: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Convert a parsed MIME message into a Gmail API ``payload`` tree
+
+    Text parts are re-encoded as UTF-8 so payload consumers can decode every
+    body the same way. Attachment bodies are not inlined; ``attachment_id``
+    may store them and return the ID to reference (as attachments.get would).
+
+    Args:
+        message: Parsed message (or part)
+        attachment_id: Optional callback (part, data, part_number) -> attachmentId
+
+    Returns:
+        Payload dict with partId, mimeType, filename, headers, body and parts
+    """
+    counter = _counter if _counter is not None else [0]
+    part_number = counter[0]
+    counter[0] += 1
+    payload = {
+        "partId": str(part_number) if _counter is not None else "",
+        "mimeType": message.get_content_type(),
+        "filename": message.get_filename() or "",
+        "headers": _header_items(message),
+    }
+
+    if message.is_multipart():
+        payload["body"] = {"size": 0}
+        payload["parts"] = [
+            message_to_payload(part, attachment_id, counter) for part in message.get_payload()
+        ]
+        return payload
+
+    data = message.get_payload(decode=True) or b""
+    if payload["filename"]:
+        payload["body"] = {"size": len(data)}
+        stored_id = attachment_id(message, data, part_number) if attachment_id else None
+        if stored_id:
+            payload["body"]["attachmentId"] = stored_id
+        return payload
+
+    if message.get_content_maintype() == "text":
+        charset = message.get_content_charset() or "utf-8"
+        try:
+            data = data.decode(charset, errors="replace").encode("utf-8")
+        except LookupError:
+            data = data.decode("utf-8", errors="replace").encode("utf-8")
+    payload["body"] = {"size": len(data), "data": b64url_encode(data)}
+    return payload
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Date header into a naive local datetime (as GmailService stores internalDate)"""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed.tzinfo is None:
+        return parsed
+    return datetime.fromtimestamp(parsed.timestamp())
@@ -6,10 +6,32 @@ import PyPDF2
 import pdfplumber
 from typing import Dict, Any, Optional
 import logging
+import re
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 logger = logging.getLogger(__name__)
 
 
+def limit_worker_memory(max_mb: int):
+    """
+    Cap the address space of a PDF parsing worker process
+    
+    Used as a process pool initializer so a malformed or huge PDF raises
+    MemoryError in the worker instead of exhausting the host.
+    
+    Args:
+        max_mb: Memory limit in megabytes (0 disables the cap)
+    """
+    if resource is None or not max_mb:
+        return
+    limit = max_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
 class PDFParser:
     """Parse PDF attachments for email processing"""
     
@@ -139,3 +161,33 @@ class PDFParser:
         except Exception as e:
             logger.error(f"Error summarizing PDF: {str(e)}")
             return ""
+    
+    @staticmethod
+    def extract_for_ingestion(pdf_path: str, max_chars: int = 20000, summary_chars: int = 500) -> Dict[str, Any]:
+        """
+        Extract what email ingestion stores for a PDF attachment
+        
+        Runs inside a process pool worker, so it only returns small,
+        picklable values (no tables).
+        
+        Args:
+            pdf_path: Path to PDF file
+            max_chars: Maximum characters of text kept
+            summary_chars: Maximum characters in the content summary
+            
+        Returns:
+            Dictionary with text, content_summary, page_count and has_tables
+        """
+        report = PDFParser.parse_medical_report(pdf_path)
+        if report.get("error"):
+            raise RuntimeError(report["error"])
+        
+        text = re.sub(r"[ \t]+", " ", report["text"])
+        text = re.sub(r"\n{3,}", "\n\n", text).strip()[:max_chars]
+        summary = text[:summary_chars] + ("..." if len(text) > summary_chars else "")
+        return {
+            "text": text,
+            "content_summary": summary,
+            "page_count": report["page_count"],
+            "has_tables": report["has_tables"]
+        }
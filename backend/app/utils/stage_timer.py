@@ -0,0 +1,46 @@
+"""
+Stage Timer Utility
+Record per-stage latencies of a multi-stage job (e.g. one mailbox sync)
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Any
+import time
+
+from app.utils.stats import summarize_ms
+
+
+class StageTimer:
+    """Collect durations per named stage and summarize them as percentiles"""
+
+    def __init__(self):
+        self.durations: Dict[str, list] = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time the enclosed block (may contain awaits) as one occurrence of a stage
+
+        Args:
+            name: Stage name, e.g. 'list', 'fetch_full', 'categorize'
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name].append(time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        """Add an externally measured duration"""
+        self.durations[name].append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Count, total and latency percentiles per stage"""
+        return {
+            name: {
+                "count": len(values),
+                "total_ms": round(sum(values) * 1000, 2),
+                **summarize_ms(values),
+            }
+            for name, values in self.durations.items()
+        }
@@ -0,0 +1,36 @@
+"""
+Statistics Helpers
+Small percentile utilities shared by runtime metrics
+"""
+from typing import Dict, Iterable, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+
+    Args:
+        sorted_values: Values in ascending order
+        fraction: Percentile as a fraction (0.95 for p95)
+
+    Returns:
+        The percentile value, or 0.0 for an empty list
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize_ms(values: Iterable[float]) -> Dict[str, float]:
+    """Summarize durations in seconds as avg/p50/p95/p99/max milliseconds"""
+    ordered = sorted(values)
+    if not ordered:
+        return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "avg": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99": round(percentile(ordered, 0.99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
@@ -2,13 +2,16 @@
 Text Summarization Utility
 Summarize long email content using GPT
 """
-from openai import OpenAI
+from openai import AsyncOpenAI
 from app.core.config import settings
+from app.utils.text_normalizer import EmailNormalizer
+from app.services.llm_scheduler import Priority
+from app.services.llm_guard import llm_guard
 import logging
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 
 class TextSummarizer:
@@ -44,19 +47,24 @@ class TextSummarizer:
             prompt = f"""
 Summarize the following text {style_prompts.get(style, 'concisely')}:
 
-{text[:3000]}
+{EmailNormalizer.truncate_tokens(text, settings.SUMMARIZATION_MAX_TOKENS)}
 
 Summary:
 """
             
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a medical text summarization expert."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=max_length
+            response = await llm_guard.call(
+                "summarize",
+                lambda: client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "You are a medical text summarization expert."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=max_length
+                ),
+                priority=Priority.INTERACTIVE,
+                hedge=True
             )
             
             summary = response.choices[0].message.content.strip()
@@ -68,6 +76,24 @@ Summary:
             logger.error(f"Error summarizing text: {str(e)}")
             return text[:200] + "..." if len(text) > 200 else text
     
+    @staticmethod
+    async def summarize_email(email, max_length: int = 200, style: str = "concise") -> str:
+        """
+        Summarize a stored email from its normalized body
+        
+        Args:
+            email: EmailRecord (or any object with normalized_content/content)
+            max_length: Maximum length of summary in words
+            style: Summary style (concise, detailed, bullet-points)
+            
+        Returns:
+            Summarized text
+        """
+        text = email.normalized_content
+        if text is None:
+            text = EmailNormalizer.normalize(email.content or '')['text']
+        return await TextSummarizer.summarize_text(text, max_length=max_length, style=style)
+    
     @staticmethod
     async def extract_key_points(text: str, num_points: int = 5) -> list:
         """
@@ -84,19 +110,24 @@ Summary:
             prompt = f"""
 Extract the {num_points} most important points from the following text:
 
-{text[:3000]}
+{EmailNormalizer.truncate_tokens(text, settings.SUMMARIZATION_MAX_TOKENS)}
 
 Return as a JSON array of strings.
 """
             
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You extract key points from medical documents."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
+            response = await llm_guard.call(
+                "key_points",
+                lambda: client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "You extract key points from medical documents."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    response_format={"type": "json_object"}
+                ),
+                priority=Priority.INTERACTIVE,
+                hedge=True
             )
             
             import json
@@ -0,0 +1,275 @@
+"""
+Email Body Normalization Utility
+Reduce raw email bodies to the text that actually matters before it is sent
+to the categorizer, summarizer or embedder
+"""
+from html.parser import HTMLParser
+from html import unescape
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+import re
+import logging
+
+import tiktoken
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Lines that start a quoted reply chain; everything below them is dropped
+QUOTED_REPLY_MARKERS = [
+    re.compile(r"^\s*On\s.+wrote:\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*Forwarded message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^\s*_{10,}\s*$"),
+]
+
+# Outlook-style quoted headers: a "From:" line only starts a quote when more
+# header lines (Sent/To/Subject...) follow it, not in "From: the lab team ..."
+QUOTED_HEADER_START = re.compile(r"^\s*\*?From:\*?\s.+$", re.IGNORECASE)
+QUOTED_HEADER_FIELD = re.compile(r"^\s*\*?(Sent|Date|To|Cc|Subject):\*?\s", re.IGNORECASE)
+QUOTED_HEADER_WINDOW = 5  # lines after "From:" searched for the other headers
+QUOTED_HEADER_MIN_FIELDS = 2
+
+# Lines that start a signature or legal boilerplate block
+SIGNATURE_MARKERS = [
+    re.compile(r"^--\s*$"),
+    re.compile(r"^\s*Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^\s*Get Outlook for \w+", re.IGNORECASE),
+    re.compile(r"^\s*(CONFIDENTIALITY|PRIVACY)\s+NOTICE", re.IGNORECASE),
+    re.compile(r"^\s*DISCLAIMER\b", re.IGNORECASE),
+    re.compile(r"^\s*This (e-?mail|message)( and any attachments?)? (is|are|may be|contains?) (confidential|intended)", re.IGNORECASE),
+]
+
+# Sign-offs only count as a signature start when they sit near the end of the body
+SIGN_OFF_PATTERN = re.compile(
+    r"^\s*(best regards|kind regards|warm regards|regards|sincerely|thanks|thank you|best|cheers),?\s*$",
+    re.IGNORECASE
+)
+SIGN_OFF_MAX_TRAILING_LINES = 8
+
+# Lines after a sign-off must look like a name or title ("Dr. A. Shah", "Cardiology, M.D.")
+SIGNATURE_LINE_MAX_WORDS = 6
+SIGNATURE_LINE_MAX_CHARS = 60
+SENTENCE_END_PATTERN = re.compile(r"[?!]$|[a-z]{2,}\.$")
+
+HTML_DETECT_PATTERN = re.compile(r"<\s*(html|body|div|p|br|table|span)\b", re.IGNORECASE)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collect visible text from an HTML document"""
+
+    SKIP_TAGS = {"script", "style", "head", "title", "meta"}
+    BLOCK_TAGS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+        self._quote_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "blockquote":
+            # Quoted replies in HTML mail are wrapped in blockquotes
+            self._quote_depth += 1
+        if tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "blockquote" and self._quote_depth:
+            self._quote_depth -= 1
+        if tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self._quote_depth:
+            self.parts.append(data)
+
+    def get_text(self) -> str:
+        return "".join(self.parts)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tokenizer once; returns None if the BPE files are unavailable"""
+    try:
+        return tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding, falling back to estimates: {str(e)}")
+        return None
+
+
+class EmailNormalizer:
+    """Normalize email bodies for LLM and embedding input"""
+
+    @staticmethod
+    def is_html(text: str) -> bool:
+        """Heuristically detect HTML content"""
+        return bool(HTML_DETECT_PATTERN.search(text or ""))
+
+    @staticmethod
+    def html_to_text(html: str) -> str:
+        """
+        Convert HTML to plain text
+
+        Args:
+            html: HTML content
+
+        Returns:
+            Visible text without markup, scripts, styles or quoted blocks
+        """
+        extractor = _HTMLTextExtractor()
+        try:
+            extractor.feed(html)
+            extractor.close()
+            return extractor.get_text()
+        except Exception as e:
+            logger.error(f"Error converting HTML to text: {str(e)}")
+            return unescape(re.sub(r"<[^>]+>", " ", html))
+
+    @staticmethod
+    def _starts_quoted_headers(lines: List[str], i: int) -> bool:
+        """Whether line i is the "From:" line of a quoted header block"""
+        if not QUOTED_HEADER_START.match(lines[i]):
+            return False
+        following = lines[i + 1:i + 1 + QUOTED_HEADER_WINDOW]
+        return sum(1 for line in following if QUOTED_HEADER_FIELD.match(line)) >= QUOTED_HEADER_MIN_FIELDS
+
+    @staticmethod
+    def strip_quoted_reply(text: str) -> str:
+        """Drop quoted reply chains and '>'-prefixed lines"""
+        lines = text.splitlines()
+        kept = []
+        for i, line in enumerate(lines):
+            starts_quote = (
+                any(marker.match(line) for marker in QUOTED_REPLY_MARKERS)
+                or EmailNormalizer._starts_quoted_headers(lines, i)
+            )
+            if starts_quote and kept:
+                break
+            if line.lstrip().startswith(">"):
+                continue
+            kept.append(line)
+        return "\n".join(kept)
+
+    @staticmethod
+    def strip_signature(text: str) -> str:
+        """Drop signatures, mobile footers and legal disclaimers"""
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if i and any(marker.match(line) for marker in SIGNATURE_MARKERS):
+                lines = lines[:i]
+                break
+
+        # Trailing sign-off ("Regards,\nDr. Smith\nCardiology")
+        for i in range(len(lines) - 1, max(len(lines) - SIGN_OFF_MAX_TRAILING_LINES, 0) - 1, -1):
+            if i and SIGN_OFF_PATTERN.match(lines[i]) and EmailNormalizer._is_signature_block(lines[i + 1:]):
+                lines = lines[:i]
+                break
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def _is_signature_block(lines: List[str]) -> bool:
+        """Whether the lines after a sign-off are only short name/title lines"""
+        lines = [line.strip() for line in lines if line.strip()]
+        return bool(lines) and all(
+            len(line) <= SIGNATURE_LINE_MAX_CHARS
+            and len(line.split()) <= SIGNATURE_LINE_MAX_WORDS
+            and not SENTENCE_END_PATTERN.search(line)
+            for line in lines
+        )
+
+    @staticmethod
+    def collapse_whitespace(text: str) -> str:
+        """Collapse runs of spaces and blank lines"""
+        text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\xa0", " ")
+        text = re.sub(r"[ \t\f\v]+", " ", text)
+        text = re.sub(r" *\n *", "\n", text)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        """Count tokens with tiktoken (approximate if the encoding is unavailable)"""
+        if not text:
+            return 0
+        encoding = _get_encoding()
+        if encoding is None:
+            return len(text) // 4 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def truncate_tokens(text: str, max_tokens: int) -> str:
+        """
+        Truncate text to a token budget
+
+        Args:
+            text: Text to truncate
+            max_tokens: Maximum number of tokens to keep
+
+        Returns:
+            Text cut at the token boundary
+        """
+        if not text:
+            return ""
+        encoding = _get_encoding()
+        if encoding is None:
+            return text[:max_tokens * 4]
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+
+    @staticmethod
+    def normalize(content: str, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run the full normalization stage on an email body
+
+        Args:
+            content: Raw email body (plain text or HTML)
+            max_tokens: Token budget for the stored text
+
+        Returns:
+            Dict with normalized text and before/after token counts
+        """
+        content = content or ""
+        max_tokens = max_tokens or settings.NORMALIZED_MAX_TOKENS
+
+        text = EmailNormalizer.html_to_text(content) if EmailNormalizer.is_html(content) else content
+        text = EmailNormalizer.strip_quoted_reply(text)
+        text = EmailNormalizer.strip_signature(text)
+        text = EmailNormalizer.collapse_whitespace(text)
+        text = EmailNormalizer.truncate_tokens(text, max_tokens)
+
+        result = {
+            "text": text,
+            "raw_tokens": EmailNormalizer.count_tokens(content),
+            "normalized_tokens": EmailNormalizer.count_tokens(text)
+        }
+        logger.debug(f"Normalized email body: {result['raw_tokens']} -> {result['normalized_tokens']} tokens")
+        return result
+    
+    @staticmethod
+    def attachment_text(attachments: Optional[List[Dict[str, Any]]], max_tokens: int) -> str:
+        """
+        Text extracted from an email's attachments, for LLM and embedding input
+        
+        Args:
+            attachments: Attachment dicts as stored in EmailRecord.attachments
+            max_tokens: Token budget for the combined text
+            
+        Returns:
+            "filename: text" lines for attachments with extracted text
+        """
+        parts = [
+            f"{attachment.get('filename', 'attachment')}: {attachment.get('text') or attachment.get('content_summary')}"
+            for attachment in attachments or []
+            if attachment.get('text') or attachment.get('content_summary')
+        ]
+        return EmailNormalizer.truncate_tokens("\n".join(parts), max_tokens)
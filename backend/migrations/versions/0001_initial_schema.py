@@ -0,0 +1,108 @@
+"""Initial schema
+
+Tables and indexes as Base.metadata.create_all created them before
+migrations were introduced; unversioned databases are stamped at this revision
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 10:22:41.401136
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('emails',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('gmail_id', sa.String(), nullable=False),
+    sa.Column('thread_id', sa.String(), nullable=True),
+    sa.Column('sender', sa.String(), nullable=False),
+    sa.Column('recipient', sa.String(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('priority', sa.String(), nullable=True),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('entities', sa.JSON(), nullable=True),
+    sa.Column('attachments', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.Column('confidence_score', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.Column('is_deleted', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_emails_category'), 'emails', ['category'], unique=False)
+    op.create_index(op.f('ix_emails_gmail_id'), 'emails', ['gmail_id'], unique=True)
+    op.create_index(op.f('ix_emails_id'), 'emails', ['id'], unique=False)
+    op.create_index(op.f('ix_emails_priority'), 'emails', ['priority'], unique=False)
+    op.create_index(op.f('ix_emails_sender'), 'emails', ['sender'], unique=False)
+    op.create_index(op.f('ix_emails_thread_id'), 'emails', ['thread_id'], unique=False)
+    op.create_index(op.f('ix_emails_timestamp'), 'emails', ['timestamp'], unique=False)
+
+    op.create_table('email_embeddings',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('email_id', sa.String(), nullable=False),
+    sa.Column('embedding', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_email_embeddings_email_id'), 'email_embeddings', ['email_id'], unique=False)
+
+    op.create_table('query_history',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('query_text', sa.Text(), nullable=False),
+    sa.Column('results_count', sa.Integer(), nullable=True),
+    sa.Column('execution_time', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_query_history_user_id'), 'query_history', ['user_id'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('full_name', sa.String(), nullable=True),
+    sa.Column('gmail_access_token', sa.Text(), nullable=True),
+    sa.Column('gmail_refresh_token', sa.Text(), nullable=True),
+    sa.Column('gmail_token_expiry', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.Column('last_login', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+
+    op.drop_index(op.f('ix_query_history_user_id'), table_name='query_history')
+    op.drop_table('query_history')
+
+    op.drop_index(op.f('ix_email_embeddings_email_id'), table_name='email_embeddings')
+    op.drop_table('email_embeddings')
+
+    op.drop_index(op.f('ix_emails_timestamp'), table_name='emails')
+    op.drop_index(op.f('ix_emails_thread_id'), table_name='emails')
+    op.drop_index(op.f('ix_emails_sender'), table_name='emails')
+    op.drop_index(op.f('ix_emails_priority'), table_name='emails')
+    op.drop_index(op.f('ix_emails_id'), table_name='emails')
+    op.drop_index(op.f('ix_emails_gmail_id'), table_name='emails')
+    op.drop_index(op.f('ix_emails_category'), table_name='emails')
+    op.drop_table('emails')
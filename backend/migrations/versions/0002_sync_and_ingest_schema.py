@@ -0,0 +1,114 @@
+"""Sync, ingest and re-categorization schema
+
+Columns for normalized bodies, categorizer versions and incremental/push
+Gmail sync; the sync job queue and sync leases.
+
+Databases adopted from create_all may already have some of these (installs
+that ran create_all after a model gained a table or column have it), so
+existing tables, columns and indexes are left alone.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 10:30:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMAIL_COLUMNS = [
+    sa.Column('normalized_content', sa.Text(), nullable=True),
+    sa.Column('raw_token_count', sa.Integer(), nullable=True),
+    sa.Column('normalized_token_count', sa.Integer(), nullable=True),
+    sa.Column('categorizer_version', sa.String(), nullable=True),
+]
+
+USER_COLUMNS = [
+    sa.Column('gmail_history_id', sa.String(), nullable=True),
+    sa.Column('gmail_address', sa.String(), nullable=True),
+    sa.Column('gmail_watch_expiration', sa.DateTime(), nullable=True),
+]
+
+ACTIVE_SYNC_JOBS = sa.text("status IN ('queued', 'running')")
+
+
+def _existing_columns(table: str) -> set:
+    # --sql has no database to inspect; emit the full migration
+    if context.is_offline_mode():
+        return set()
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _add_missing_columns(table: str, columns) -> None:
+    existing = _existing_columns(table)
+    for column in columns:
+        if column.name not in existing:
+            op.add_column(table, column)
+
+
+def upgrade() -> None:
+    _add_missing_columns('emails', EMAIL_COLUMNS)
+    op.create_index(op.f('ix_emails_categorizer_version'), 'emails', ['categorizer_version'], unique=False, if_not_exists=True)
+
+    _add_missing_columns('users', USER_COLUMNS)
+    op.create_index(op.f('ix_users_gmail_address'), 'users', ['gmail_address'], unique=False, if_not_exists=True)
+
+    op.create_table('sync_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('source', sa.String(), nullable=True),
+    sa.Column('days', sa.Integer(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('run_after', sa.DateTime(), nullable=True),
+    sa.Column('worker_id', sa.String(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('progress', sa.JSON(), nullable=True),
+    sa.Column('stats', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_sync_jobs_run_after'), 'sync_jobs', ['run_after'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sync_jobs_status'), 'sync_jobs', ['status'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sync_jobs_user_id'), 'sync_jobs', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index('uq_sync_jobs_active_user', 'sync_jobs', ['user_id'], unique=True, if_not_exists=True, postgresql_where=ACTIVE_SYNC_JOBS, sqlite_where=ACTIVE_SYNC_JOBS)
+
+    op.create_table('sync_leases',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('holder', sa.String(), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id'),
+    if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sync_leases')
+
+    op.drop_index('uq_sync_jobs_active_user', table_name='sync_jobs')
+    op.drop_index(op.f('ix_sync_jobs_user_id'), table_name='sync_jobs')
+    op.drop_index(op.f('ix_sync_jobs_status'), table_name='sync_jobs')
+    op.drop_index(op.f('ix_sync_jobs_run_after'), table_name='sync_jobs')
+    op.drop_table('sync_jobs')
+
+    op.drop_index(op.f('ix_users_gmail_address'), table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        for column in reversed(USER_COLUMNS):
+            batch_op.drop_column(column.name)
+
+    op.drop_index(op.f('ix_emails_categorizer_version'), table_name='emails')
+    with op.batch_alter_table('emails') as batch_op:
+        for column in reversed(EMAIL_COLUMNS):
+            batch_op.drop_column(column.name)
@@ -0,0 +1,44 @@
+"""Partial indexes for email list and analytics queries
+
+List and analytics queries filter out soft-deleted emails, then sort by
+timestamp or group by category, priority or sender. Each index only covers
+live rows, matching that filter.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 10:40:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same predicate the queries use (EmailRecord.is_deleted == False), as each dialect renders it
+LIVE_EMAILS = {
+    "postgresql_where": sa.text("NOT is_deleted"),
+    "sqlite_where": sa.text("is_deleted = 0"),
+}
+
+INDEXES = [
+    ("ix_emails_live_timestamp", [sa.text("timestamp DESC")]),
+    ("ix_emails_live_category_timestamp", ["category", "timestamp"]),
+    ("ix_emails_live_priority_timestamp", ["priority", "timestamp"]),
+    ("ix_emails_live_sender", ["sender"]),
+]
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'emails', columns, unique=False, **LIVE_EMAILS)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='emails')
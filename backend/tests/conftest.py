@@ -0,0 +1,12 @@
+"""
+Test configuration
+Settings are read at import time, so point the app at a scratch SQLite
+database and checkpoint directory before any test module imports it
+"""
+import os
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+TEST_DIR = tempfile.mkdtemp(prefix="medmail-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["JOB_CHECKPOINT_DIR"] = os.path.join(TEST_DIR, "checkpoints")
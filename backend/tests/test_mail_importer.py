@@ -0,0 +1,99 @@
+"""Mail archive reading: mbox separators, mboxrd unescaping, resume offsets and Takeout headers"""
+from app.services.mail_importer import iter_mbox, iter_eml_dir, parse_raw_message
+
+TAKEOUT_ID = 1761234567890123456
+
+MBOX = (
+    f"From {TAKEOUT_ID}@xxx Mon Mar 03 09:00:00 +0000 2025\n"
+    "X-GM-THRID: 1761234567890000000\n"
+    "X-Gmail-Labels: Inbox,Important,Category Updates,Cardiology\n"
+    "From: Lab <lab@hospital.org>\n"
+    "To: dr.shah@hospital.org\n"
+    "Subject: CBC results\n"
+    "Message-ID: <cbc-1@hospital.org>\n"
+    "\n"
+    "Results attached.\n"
+    ">From the lab: values are normal.\n"
+    ">>From here on, quoting is kept.\n"
+    "From the desk of the lab manager\n"
+    "\n"
+    "From MAILER-DAEMON Tue Mar 04 10:00:00 2025\n"
+    "From: Pharmacy <rx@hospital.org>\n"
+    "Subject: Refill\n"
+    "Message-ID: <rx-2@hospital.org>\n"
+    "\n"
+    "Refill approved.\n"
+    "\n"
+    "\n"
+    "From MAILER-DAEMON Wed Mar 05 11:00:00 2025\n"
+    "From: Billing <billing@hospital.org>\n"
+    "Subject: Claim\n"
+    "Message-ID: <claim-3@hospital.org>\n"
+    "\n"
+    "Claim approved.\n"
+).encode()
+
+
+def write_mbox(tmp_path):
+    path = tmp_path / "archive.mbox"
+    path.write_bytes(MBOX)
+    return str(path)
+
+
+def test_mbox_messages_and_bodies(tmp_path):
+    messages = list(iter_mbox(write_mbox(tmp_path)))
+    assert [gmail_id for _, gmail_id, _ in messages] == [format(TAKEOUT_ID, "x"), None, None]
+
+    emails = [parse_raw_message(raw, gmail_id) for raw, gmail_id, _ in messages]
+    assert [email["subject"] for email in emails] == ["CBC results", "Refill", "Claim"]
+    # Only the first ">" of an escaped From line is removed; an unescaped one
+    # without a blank line before it is body text, not a separator
+    assert emails[0]["content"].splitlines() == [
+        "Results attached.",
+        "From the lab: values are normal.",
+        ">From here on, quoting is kept.",
+        "From the desk of the lab manager",
+    ]
+    assert emails[1]["content"].strip() == "Refill approved."
+    assert emails[2]["content"].strip() == "Claim approved."
+
+
+def test_mbox_resume_from_each_offset(tmp_path):
+    path = write_mbox(tmp_path)
+    messages = list(iter_mbox(path))
+    assert messages[-1][2] == len(MBOX)
+
+    for index, (_, _, offset) in enumerate(messages):
+        resumed = list(iter_mbox(path, offset=offset))
+        assert [raw for raw, _, _ in resumed] == [raw for raw, _, _ in messages[index + 1:]]
+        assert [end for _, _, end in resumed] == [end for _, _, end in messages[index + 1:]]
+
+
+def test_takeout_headers(tmp_path):
+    raw, gmail_id, _ = next(iter_mbox(write_mbox(tmp_path)))
+    email = parse_raw_message(raw, gmail_id)
+    assert email["gmail_id"] == format(TAKEOUT_ID, "x")
+    assert email["thread_id"] == format(1761234567890000000, "x")
+    assert email["labels"] == ["INBOX", "IMPORTANT", "CATEGORY_UPDATES", "Cardiology"]
+
+
+def test_ids_without_takeout_separator_are_stable(tmp_path):
+    _, (raw, gmail_id, _), _ = list(iter_mbox(write_mbox(tmp_path)))
+    first = parse_raw_message(raw, gmail_id)
+    assert first["gmail_id"].startswith("imp-")
+    assert parse_raw_message(raw, gmail_id)["gmail_id"] == first["gmail_id"]
+    assert first["thread_id"] is None and first["labels"] == []
+
+
+def test_eml_dir_order_and_resume(tmp_path):
+    for name, subject in [("b.eml", "Second"), ("a.eml", "First"), ("notes.json", "Ignored")]:
+        (tmp_path / name).write_bytes(f"Subject: {subject}\n\nBody\n".encode())
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "c.EML").write_bytes(b"Subject: Third\n\nBody\n")
+
+    messages = list(iter_eml_dir(str(tmp_path)))
+    assert [parse_raw_message(raw)["subject"] for raw, _, _ in messages] == ["First", "Second", "Third"]
+    assert [count for _, _, count in messages] == [1, 2, 3]
+
+    resumed = list(iter_eml_dir(str(tmp_path), skip=2))
+    assert [raw for raw, _, _ in resumed] == [messages[2][0]]
@@ -0,0 +1,102 @@
+"""Push sync: LocalNotifier notifications driven through PushSyncCoordinator"""
+import asyncio
+import uuid
+
+import pytest
+
+from app.db.database import SessionLocal
+from app.db.migrations import upgrade_database
+from app.db.models import User
+from app.services.push_sync import LocalNotifier, PushSyncCoordinator
+
+DEBOUNCE = 0.05
+
+
+class StubSync:
+    """Stands in for PushSyncCoordinator._run_sync; records calls and takes ``duration``"""
+
+    def __init__(self, duration: float = 0.0):
+        self.duration = duration
+        self.calls = []
+        self.started = asyncio.Event()
+
+    async def __call__(self, user_id: str) -> bool:
+        self.calls.append(user_id)
+        self.started.set()
+        await asyncio.sleep(self.duration)
+        return True
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    upgrade_database()
+
+
+@pytest.fixture
+def mailbox():
+    db = SessionLocal()
+    user = User(
+        email=f"push-{uuid.uuid4().hex[:8]}@example.org",
+        hashed_password="x",
+        gmail_refresh_token="refresh",
+        gmail_history_id="100"
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+def make_notifier(sync: StubSync):
+    coordinator = PushSyncCoordinator(debounce_seconds=DEBOUNCE)
+    coordinator._run_sync = sync
+    return coordinator, LocalNotifier(coordinator)
+
+
+async def settle(coordinator: PushSyncCoordinator):
+    """Wait for every pending debounced sync to finish"""
+    tasks = [state.task for state in coordinator._users.values() if state.task]
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_notifications_within_debounce_share_one_sync(mailbox):
+    sync = StubSync()
+    coordinator, notifier = make_notifier(sync)
+
+    for history_id in ("101", "102", "103"):
+        assert await notifier.publish(mailbox.email, history_id)
+    await settle(coordinator)
+
+    assert sync.calls == [mailbox.id]
+    assert coordinator.stats["coalesced"] == 2
+    assert coordinator.stats["notifications"] == 3
+
+
+@pytest.mark.asyncio
+async def test_notifications_during_sync_schedule_one_follow_up(mailbox):
+    sync = StubSync(duration=0.2)
+    coordinator, notifier = make_notifier(sync)
+
+    await notifier.publish(mailbox.email, "101")
+    await asyncio.wait_for(sync.started.wait(), timeout=1)
+    # Both arrive while the first sync runs; one more sync covers them
+    await notifier.publish(mailbox.email, "102")
+    await notifier.publish(mailbox.email, "103")
+    await settle(coordinator)
+
+    assert sync.calls == [mailbox.id, mailbox.id]
+
+
+@pytest.mark.asyncio
+async def test_notifications_at_or_before_stored_history_id_are_dropped(mailbox):
+    sync = StubSync()
+    coordinator, notifier = make_notifier(sync)
+
+    assert not await notifier.publish(mailbox.email, "90")
+    assert not await notifier.publish(mailbox.email, "100")
+    await settle(coordinator)
+
+    assert sync.calls == []
+    assert coordinator.stats["ignored"] == 2
@@ -0,0 +1,35 @@
+"""EXPLAIN checks: hot email list and analytics queries use the partial indexes"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app.db.migrations import upgrade_database
+from app.utils.check_query_plans import check_query_plans, hot_queries
+
+QUERIES = [description for description, _, _ in hot_queries(datetime.now())]
+
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    database_url = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    return {result["query"]: result for result in check_query_plans(database_url, rows=5000)}
+
+
+def test_migrations_create_partial_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    upgrade_database(engine)
+    indexes = {index["name"] for index in inspect(engine).get_indexes("emails")}
+    engine.dispose()
+    assert {
+        "ix_emails_live_timestamp",
+        "ix_emails_live_category_timestamp",
+        "ix_emails_live_priority_timestamp",
+        "ix_emails_live_sender",
+    } <= indexes
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_query_uses_partial_index(plans, query):
+    result = plans[query]
+    assert result["ok"], f"{query} should use {result['index']}; plan:\n{result['plan']}"
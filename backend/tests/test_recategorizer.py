@@ -0,0 +1,119 @@
+"""Re-categorization job: failed categorizations never overwrite stored rows"""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.database import SessionLocal
+from app.db.migrations import upgrade_database
+from app.db.models import EmailRecord
+from app.services import ai_categorizer
+from app.services.ai_categorizer import EmailCategorizer
+from app.services.llm_guard import CircuitOpenError
+from app.services.recategorizer import RecategorizationJob
+
+IDS = [f"recat-{n:02d}" for n in range(10)]
+BAD_EMAIL = IDS[2]  # fails every time (e.g. the model returns invalid JSON)
+
+
+@pytest.fixture(autouse=True)
+def emails():
+    upgrade_database()
+    db = SessionLocal()
+    db.query(EmailRecord).delete()
+    db.add_all([
+        EmailRecord(
+            id=email_id, gmail_id=email_id, sender="lab@hospital.org", subject="Results",
+            timestamp=datetime.now(), content="CBC attached", category="Lab Results",
+            summary="Stored summary", categorizer_version="1", is_deleted=False
+        )
+        for email_id in IDS
+    ])
+    db.commit()
+    db.close()
+
+
+class FakeCompletions:
+    """OpenAI chat completions stand-in; the prompt is the email id"""
+
+    def __init__(self):
+        self.outage_from = None
+
+    async def create(self, messages, **kwargs):
+        email_id = messages[-1]["content"]
+        if self.outage_from and email_id >= self.outage_from:
+            raise CircuitOpenError("Circuit open for LLM call site 'categorize'")
+        content = "not json" if email_id == BAD_EMAIL else (
+            '{"category": "Prescription", "priority": "low", "summary": "New summary", "confidence": 0.9}'
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    completions = FakeCompletions()
+
+    async def unguarded_call(name, factory, **kwargs):
+        return await factory()
+
+    monkeypatch.setattr(ai_categorizer.settings, "CATEGORIZER_MODE", "openai")
+    monkeypatch.setattr(ai_categorizer, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(ai_categorizer.llm_guard, "call", unguarded_call)
+    monkeypatch.setattr(
+        EmailCategorizer, "create_categorization_prompt", staticmethod(lambda email_data: email_data['id'])
+    )
+    return completions
+
+
+def stored_versions():
+    db = SessionLocal()
+    try:
+        return {row.id: (row.categorizer_version, row.summary) for row in db.query(EmailRecord)}
+    finally:
+        db.close()
+
+
+def run_job():
+    return asyncio.run(RecategorizationJob(batch_size=4, concurrency=1, max_rate=0).run())
+
+
+def test_failure_specific_to_one_email_is_skipped_and_reported(completions):
+    result = run_job()
+
+    assert result["completed"] and result["processed"] == len(IDS) and result["failed"] == 1
+    versions = stored_versions()
+    assert versions[BAD_EMAIL] == ("1", "Stored summary")
+    assert all(versions[email_id][0] == EmailCategorizer.PROMPT_VERSION for email_id in IDS if email_id != BAD_EMAIL)
+
+
+def test_outage_stops_before_the_failed_email_and_resumes_there(completions):
+    completions.outage_from = IDS[5]
+    result = run_job()
+
+    assert not result["completed"]
+    assert result["last_id"] == IDS[4]
+    versions = stored_versions()
+    assert all(versions[email_id] == ("1", "Stored summary") for email_id in IDS[5:])
+
+    completions.outage_from = None
+    resumed = run_job()
+
+    assert resumed["completed"] and resumed["processed"] == len(IDS) and resumed["failed"] == 1
+    assert all(stored_versions()[email_id][0] == EmailCategorizer.PROMPT_VERSION for email_id in IDS[5:])
+
+
+def test_metadata_only_emails_are_not_sent_to_the_categorizer(completions):
+    db = SessionLocal()
+    db.add(EmailRecord(
+        id="recat-metadata", gmail_id="recat-metadata", sender="deals@shop.example", subject="Sale",
+        timestamp=datetime.now(), content=None, normalized_content="50% off", category="Other",
+        priority="low", summary="50% off", categorizer_version=None, is_deleted=False
+    ))
+    db.commit()
+    db.close()
+
+    result = run_job()
+
+    assert result["processed"] == len(IDS)
+    assert stored_versions()["recat-metadata"] == (None, "50% off")
@@ -0,0 +1,38 @@
+"""Email body normalization: quoted replies and signatures"""
+from app.utils.text_normalizer import EmailNormalizer
+
+
+def normalized(body: str) -> str:
+    return EmailNormalizer.normalize(body)["text"]
+
+
+def test_quoted_outlook_header_block_is_dropped():
+    body = (
+        "Please see the report below.\n\n"
+        "From: Dr. Smith <smith@hospital.org>\nSent: Monday, March 3\nTo: Radiology\nSubject: CT results\n\n"
+        "Earlier message"
+    )
+    assert normalized(body) == "Please see the report below."
+
+
+def test_from_sentence_in_body_is_kept():
+    body = (
+        "Hi team,\nThe new results are attached.\n"
+        "From: the lab team, please review the CBC values.\nThe patient needs a follow-up."
+    )
+    assert normalized(body) == body
+
+
+def test_sign_off_followed_by_name_and_title_is_dropped():
+    body = "The claim was approved.\n\nThanks,\nDr. A. Shah\nCardiology, M.D."
+    assert normalized(body) == "The claim was approved."
+
+
+def test_sign_off_word_followed_by_content_is_kept():
+    body = "Hello,\nThanks\nThe MRI shows a small lesion that needs urgent review by neurology.\nCall me."
+    assert normalized(body) == body
+
+
+def test_sign_off_followed_by_sentence_is_kept():
+    body = "Update below.\nBest\nwe will see you soon."
+    assert normalized(body) == body